@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Sender accounts of a campaign and how recipients are shared between them
+
+accounts.ini holds one section per sender account; values in [DEFAULT]
+apply to every account:
+
+    [DEFAULT]
+    host = smtp.gmail.com
+    rate_per_minute = 10
+
+    [main]
+    email = me@gmail.com
+    password = abcd efgh ijkl mnop
+    weight = 2
+
+    [backup]
+    email = me@company.com
+    password = ...
+    host = smtp.office365.com
+    connections = 2
+"""
+import configparser
+import os
+import threading
+
+from mail_pool import DEFAULT_POOL_SIZE, DEFAULT_RECYCLE_AFTER, SMTP_HOST, SMTP_PORT
+from mail_ratelimit import DEFAULT_PER_MINUTE, DEFAULT_BURST
+
+DEFAULT_ACCOUNTS = 'accounts.ini'
+
+WEIGHTED = 'weighted'
+LEAST_LOADED = 'least-loaded'
+STRATEGIES = (WEIGHTED, LEAST_LOADED)
+
+
+class Account:
+    """One sender: credentials, SMTP server, pool size and sending quota"""
+
+    def __init__(self, email, password='', host=SMTP_HOST, port=SMTP_PORT,
+                 connections=DEFAULT_POOL_SIZE, per_minute=None, burst=None, weight=1,
+                 recycle_after=DEFAULT_RECYCLE_AFTER, name=None):
+        self.email = email
+        self.password = password
+        self.host = host
+        self.port = int(port)
+        self.connections = max(1, int(connections))
+        self.per_minute = per_minute
+        self.burst = burst
+        self.weight = max(1, int(weight))
+        self.recycle_after = recycle_after
+        self.name = name or email
+
+    def __repr__(self):
+        return '<Account %s via %s:%d>' % (self.name, self.host, self.port)
+
+
+def load_accounts(path=DEFAULT_ACCOUNTS):
+    """Reads the accounts of an accounts.ini file, in file order"""
+    parser = configparser.ConfigParser(interpolation=None)
+    with open(path, encoding='utf-8') as f:
+        parser.read_file(f)
+    accounts = []
+    for section in parser.sections():
+        values = parser[section]
+        email = values.get('email', '').strip()
+        if not email:
+            raise ValueError('Account [%s] in %s has no email' % (section, path))
+        try:
+            accounts.append(Account(
+                email, values.get('password', '').strip(),
+                host=values.get('host', SMTP_HOST).strip(),
+                port=values.getint('port', SMTP_PORT),
+                connections=values.getint('connections', DEFAULT_POOL_SIZE),
+                per_minute=values.getfloat('rate_per_minute', DEFAULT_PER_MINUTE),
+                burst=values.getint('burst', DEFAULT_BURST),
+                weight=values.getint('weight', 1),
+                recycle_after=values.getint('recycle_after', DEFAULT_RECYCLE_AFTER),
+                name=section))
+        except ValueError as e:
+            raise ValueError('Account [%s] in %s: %s' % (section, path, e))
+    if not accounts:
+        raise ValueError('No accounts configured in %s' % path)
+    return accounts
+
+
+def find_accounts(path=None):
+    """Accounts from path (or $ACCOUNTS_FILE / accounts.ini if present), else None"""
+    path = path or os.getenv('ACCOUNTS_FILE', DEFAULT_ACCOUNTS)
+    if not os.path.exists(path):
+        return None
+    return load_accounts(path)
+
+
+class AccountScheduler:
+    """Chooses the account that sends the next recipient
+
+    WEIGHTED is smooth weighted round-robin: an account with weight 3 gets
+    three recipients for every one of a weight-1 account, interleaved.
+    LEAST_LOADED picks the account with the least queued work per unit of
+    weight, as reported by load(account). Accounts paused by the rate
+    limiter (paused_for(account) > 0) are passed over while another one can
+    send, and disabled accounts (e.g. rejected credentials) are never
+    picked again.
+    """
+
+    def __init__(self, accounts, strategy=WEIGHTED, load=None, paused_for=None):
+        if strategy not in STRATEGIES:
+            raise ValueError('Unknown scheduling strategy %r' % strategy)
+        self.accounts = list(accounts)
+        self.strategy = strategy
+        self._load = load or (lambda account: 0)
+        self._paused_for = paused_for or (lambda account: 0.0)
+        self._current = dict((id(a), 0) for a in self.accounts)
+        self._disabled = set()
+        self._lock = threading.Lock()
+
+    def disable(self, account):
+        with self._lock:
+            self._disabled.add(id(account))
+
+    def active(self):
+        with self._lock:
+            return [a for a in self.accounts if id(a) not in self._disabled]
+
+    def pick(self, exclude=None):
+        """Returns the next account, or None if every account is disabled"""
+        candidates = [a for a in self.active() if a is not exclude]
+        if not candidates:
+            return None
+        paused = dict((id(a), self._paused_for(a)) for a in candidates)
+        ready = [a for a in candidates if paused[id(a)] <= 0]
+        if not ready:
+            # Hepsi beklemede: en erken açılacak hesabı seç
+            return min(candidates, key=lambda a: paused[id(a)])
+        if self.strategy == LEAST_LOADED:
+            return min(ready, key=lambda a: self._load(a) / a.weight)
+        with self._lock:
+            total = 0
+            best = None
+            for account in ready:
+                self._current[id(account)] += account.weight
+                total += account.weight
+                if best is None or self._current[id(account)] > self._current[id(best)]:
+                    best = account
+            self._current[id(best)] -= total
+            return best
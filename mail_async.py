@@ -0,0 +1,641 @@
+# -*- coding: utf-8 -*-
+"""asyncio sending engine: many SMTP sessions multiplexed on one event loop
+
+AsyncMailCampaign is a drop-in alternative to MailCampaign. Instead of one
+OS thread per connection, every session is a coroutine talking through a
+small stdlib-only SMTP client (AsyncSMTP), so hundreds of sessions across
+several relay hosts cost little more memory than a handful. The campaign
+still runs from a single caller thread (QThread, CLI), and its results
+reach the GUI the same way as the threaded engine's.
+"""
+import asyncio
+import base64
+import re
+import smtplib
+import socket
+import ssl
+
+from mail_core import MailCampaign, NoAccountError
+from mail_errors import ErrorLog
+from mail_message import StreamedMessage
+from mail_pool import DEFAULT_IDLE_CHECK, is_loopback, no_tls_error, reply_code
+from mail_render import Rendered
+
+# Aynı anda SMTP işlemi yürüten oturum sayısının üst sınırı
+DEFAULT_MAX_IN_FLIGHT = 1000
+
+THREADS = 'threads'
+ASYNC = 'async'
+ENGINES = (THREADS, ASYNC)
+
+_EOL_RE = re.compile(rb'(?:\r\n|\n|\r(?!\n))')
+_DOT_RE = re.compile(rb'(?m)^\.')
+
+
+def _quote_data(data):
+    """CRLF line endings and dot-stuffing, as smtplib does for DATA"""
+    if isinstance(data, str):
+        data = data.encode('ascii')
+    data = _DOT_RE.sub(b'..', _EOL_RE.sub(b'\r\n', data))
+    if not data.endswith(b'\r\n'):
+        data += b'\r\n'
+    return data + b'.\r\n'
+
+
+class AsyncSMTP:
+    """Minimal asyncio SMTP client: EHLO, STARTTLS, AUTH PLAIN/LOGIN, pipelined envelopes
+
+    Errors are raised as the matching smtplib exceptions, so failure
+    classification and error logging work unchanged. Like
+    SMTPConnectionPool, it insists on TLS (port 465 or STARTTLS) except
+    towards a loopback host.
+    """
+
+    def __init__(self, host, port, timeout=60, local_hostname=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.local_hostname = local_hostname or socket.getfqdn()
+        self.features = {}
+        self.reader = None
+        self.writer = None
+        self.tls = False
+
+    def has_extn(self, name):
+        return name.lower() in self.features
+
+    async def connect(self):
+        # 465 doğrudan TLS, diğer portlarda STARTTLS zorunlu (yerel sink hariç)
+        context = ssl.create_default_context() if self.port == 465 else None
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=context,
+                                        server_hostname=self.host if context else None),
+                self.timeout)
+        except asyncio.TimeoutError:
+            raise smtplib.SMTPConnectError(-1, b'Connection timed out')
+        code, msg = await self.read_reply()
+        if code != 220:
+            self.close()
+            raise smtplib.SMTPConnectError(code, msg)
+        self.tls = context is not None
+        await self.ehlo()
+        if not self.tls:
+            if self.has_extn('starttls'):
+                await self.starttls()
+            elif not is_loopback(self.host):
+                self.close()
+                raise no_tls_error(self.host)
+
+    async def ehlo(self):
+        code, msg = await self.command('EHLO %s' % self.local_hostname)
+        if code != 250:
+            code, msg = await self.command('HELO %s' % self.local_hostname)
+            if code != 250:
+                raise smtplib.SMTPHeloError(code, msg)
+        self.features = {}
+        for line in msg.decode('latin-1').split('\n')[1:]:
+            keyword, _, params = line.strip().partition(' ')
+            if keyword:
+                self.features[keyword.lower()] = params.strip()
+
+    async def starttls(self):
+        code, msg = await self.command('STARTTLS')
+        if code != 220:
+            raise smtplib.SMTPResponseException(code, msg)
+        context = ssl.create_default_context()
+        if hasattr(self.writer, 'start_tls'):
+            await self.writer.start_tls(context, server_hostname=self.host)
+        else:
+            # Python < 3.11: taşıyıcıyı yerinde TLS'e yükselt
+            loop = asyncio.get_running_loop()
+            transport = self.writer.transport
+            tls_transport = await loop.start_tls(transport, transport.get_protocol(), context,
+                                                 server_hostname=self.host)
+            self.writer._transport = tls_transport
+        self.tls = True
+        await self.ehlo()
+
+    async def login(self, user, password):
+        if not self.tls and not is_loopback(self.host):
+            raise no_tls_error(self.host)
+        if not self.has_extn('auth'):
+            raise smtplib.SMTPNotSupportedError("SMTP AUTH extension not supported by server.")
+        methods = self.features.get('auth', '').upper().split()
+        if 'PLAIN' in methods:
+            token = base64.b64encode(('\0%s\0%s' % (user, password)).encode('utf-8'))
+            code, msg = await self.command('AUTH PLAIN ' + token.decode('ascii'))
+        else:
+            code, msg = await self.command('AUTH LOGIN')
+            for value in (user, password):
+                if code != 334:
+                    break
+                code, msg = await self.command(
+                    base64.b64encode(value.encode('utf-8')).decode('ascii'))
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, msg)
+
+    async def command(self, line):
+        self.write(line)
+        await self.drain()
+        return await self.read_reply()
+
+    def write(self, line):
+        if self.writer is None:
+            raise smtplib.SMTPServerDisconnected('please run connect() first')
+        self.writer.write(line.encode('utf-8') + b'\r\n')
+
+    async def drain(self):
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            self.close()
+            raise smtplib.SMTPServerDisconnected('Connection lost: %s' % (e,))
+
+    async def read_reply(self):
+        """Returns (code, message) of one possibly multi-line reply"""
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            except (asyncio.TimeoutError, ConnectionError) as e:
+                self.close()
+                raise smtplib.SMTPServerDisconnected('Connection lost: %s' % (e,))
+            if not line:
+                self.close()
+                raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+            lines.append(line[4:].strip(b' \t\r\n'))
+            try:
+                code = int(line[:3])
+            except ValueError:
+                code = -1
+                break
+            if line[3:4] != b'-':
+                break
+        return code, b'\n'.join(lines)
+
+    async def noop(self):
+        return await self.command('NOOP')
+
+    async def sendmail(self, sender, recipients, data):
+        """One transaction to recipients; returns {recipient: (code, message)} refused
+
+        Raises like smtplib.SMTP.sendmail(). MAIL and every RCPT are
+        written in one go when the server supports PIPELINING.
+        """
+        if not isinstance(data, StreamedMessage):
+            data = _quote_data(data)
+        options = ' SIZE=%d' % len(data) if self.has_extn('size') else ''
+        lines = ['MAIL FROM:%s%s' % (smtplib.quoteaddr(sender), options)]
+        lines += ['RCPT TO:%s' % smtplib.quoteaddr(r) for r in recipients]
+        if self.has_extn('pipelining'):
+            for line in lines:
+                self.write(line)
+            await self.drain()
+            replies = [await self.read_reply() for _ in lines]
+        else:
+            replies = []
+            for line in lines:
+                replies.append(await self.command(line))
+                if replies[0][0] != 250:
+                    break
+        code, msg = replies[0]
+        if code != 250:
+            await self._abort(code)
+            raise smtplib.SMTPSenderRefused(code, msg, sender)
+        refused = dict((r, reply) for r, reply in zip(recipients, replies[1:])
+                       if reply[0] not in (250, 251))
+        if len(refused) == len(recipients):
+            await self._abort(replies[1][0])
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        code, msg = await self.command('DATA')
+        if code != 354:
+            await self._abort(code)
+            raise smtplib.SMTPDataError(code, msg)
+        if isinstance(data, StreamedMessage):
+            # Her parçadan sonra drain: yazma tamponu bir parçadan fazla büyümez
+            last = b''
+            for chunk in data.wire_chunks():
+                if len(chunk):
+                    self.writer.write(chunk)
+                    last = chunk
+                    await self.drain()
+            self.writer.write(b'.\r\n' if bytes(last[-2:]) == b'\r\n' else b'\r\n.\r\n')
+        else:
+            self.writer.write(data)
+        await self.drain()
+        code, msg = await self.read_reply()
+        if code != 250:
+            await self._abort(code)
+            raise smtplib.SMTPDataError(code, msg)
+        return refused
+
+    async def _abort(self, code):
+        if code == 421:
+            self.close()
+            return
+        try:
+            await self.command('RSET')
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    async def quit(self):
+        try:
+            await self.command('QUIT')
+        except (smtplib.SMTPException, OSError):
+            pass
+        self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class AsyncSession:
+    """A coroutine worker's SMTP session; reconnects and recycles like PooledSession"""
+
+    def __init__(self, account, timeout=60, idle_check=DEFAULT_IDLE_CHECK, reconnect_attempts=3):
+        self.account = account
+        self.timeout = timeout
+        self.idle_check = idle_check
+        self.reconnect_attempts = max(1, reconnect_attempts)
+        self.client = None
+        self.sent = 0
+        self.reconnects = 0
+        self.last_used = 0.0
+
+    async def connect(self):
+        account = self.account
+        client = AsyncSMTP(account.host, account.port, self.timeout)
+        await client.connect()
+        if account.password:
+            try:
+                await client.login(account.email, account.password)
+            except Exception:
+                client.close()
+                raise
+        self.client = client
+        self.sent = 0
+        self.last_used = asyncio.get_running_loop().time()
+        return client
+
+    async def ensure(self):
+        recycle_after = self.account.recycle_after
+        if recycle_after and self.sent >= recycle_after:
+            return await self.reconnect()
+        now = asyncio.get_running_loop().time()
+        if self.client is None:
+            return await self.reconnect()
+        if now - self.last_used > self.idle_check:
+            try:
+                code, _ = await self.client.noop()
+            except (smtplib.SMTPException, OSError):
+                code = None
+            if code != 250:
+                return await self.reconnect()
+            self.last_used = now
+        return self.client
+
+    def mark_sent(self, count=1):
+        self.sent += count
+        self.last_used = asyncio.get_running_loop().time()
+
+    async def reconnect(self):
+        await self.close()
+        delay = 1.0
+        for attempt in range(self.reconnect_attempts):
+            try:
+                await self.connect()
+                break
+            except (smtplib.SMTPAuthenticationError, smtplib.SMTPNotSupportedError):
+                raise
+            except (smtplib.SMTPException, OSError):
+                if attempt + 1 == self.reconnect_attempts:
+                    raise
+                await asyncio.sleep(delay)
+                delay *= 2
+        self.reconnects += 1
+        return self.client
+
+    async def close(self):
+        client, self.client = self.client, None
+        if client is not None:
+            await client.quit()
+
+
+class _AsyncLane:
+    """One account's sessions and work queue on the event loop"""
+
+    def __init__(self, account, sessions, render, payload, maxsize):
+        self.account = account
+        self.sessions = sessions
+        self.render = render
+        self.payload = payload
+        self.work = asyncio.Queue(maxsize=maxsize)
+        self.pending = 0
+        self.unrendered = []
+
+
+class AsyncMailCampaign(MailCampaign):
+    """MailCampaign on asyncio: same options, callbacks, journal, retries and accounts
+
+    Each account opens its connections as coroutines instead of threads, so
+    connections can be raised far beyond what a thread per session allows.
+    max_in_flight caps the transactions in progress at once across every
+    account. run() blocks the calling thread while its own event loop runs.
+    """
+
+    def __init__(self, *args, max_in_flight=DEFAULT_MAX_IN_FLIGHT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_in_flight = max(1, int(max_in_flight))
+
+    def run(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        self.progress.reset(self.progress.total)
+        self.errors = ErrorLog()
+        self._in_flight = 0
+        timings = self.timings
+
+        started = timings.start()
+        try:
+            messages = [self.compile_message(account.email) for account in self.accounts]
+        except Exception as e:
+            self.on_error(f"Message error: {str(e)}")
+            return
+        timings.stop('compile', started)
+        self._renderer = self._start_renderer()
+
+        # Her hesabın oturumları aynı anda açılır
+        self._lanes = {}
+        errors = []
+        for account, (render, payload) in zip(self.accounts, messages):
+            if account.per_minute is not None:
+                self.rate_limiter.configure(account.email, account.per_minute, account.burst)
+            sessions = [AsyncSession(account) for _ in range(account.connections)]
+            results = await asyncio.gather(*[s.connect() for s in sessions],
+                                           return_exceptions=True)
+            failed = [r for r in results if isinstance(r, BaseException)]
+            if failed:
+                await asyncio.gather(*[s.close() for s in sessions])
+                errors.append(failed[0])
+                if len(self.accounts) > 1:
+                    self.progress.note(f"Skipping account {account.name}: {str(failed[0])}")
+                continue
+            self._lanes[id(account)] = _AsyncLane(account, sessions, render, payload,
+                                                  len(sessions) * self.batch_size * 2)
+        if not self._lanes:
+            self._close_renderer()
+            if all(isinstance(e, smtplib.SMTPAuthenticationError) for e in errors):
+                self.on_error("Authentication error! Please check your email or app password.")
+            else:
+                self.on_error(f"Connection error: {str(errors[-1])}")
+            return
+        self.scheduler = self._make_scheduler()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._idle_event = asyncio.Event()
+
+        workers = [asyncio.ensure_future(self._worker(lane, session))
+                   for lane in self._lanes.values() for session in lane.sessions]
+        feeder = None
+        if self._renderer is not None:
+            # Parçalar iş süreçlerinde önceden işlenir; sınırlı kuyruk üreticiyi bekletir
+            self._rendering = asyncio.Queue(maxsize=self._renderer.max_pending)
+            feeder = asyncio.ensure_future(self._feed_rendered())
+        try:
+            for recipient in self.recipients:
+                if self.is_cancelled:
+                    break
+                if self._already_handled(recipient):
+                    continue
+                await self._enqueue_retries()
+                await self._schedule(recipient)
+
+            while not self.is_cancelled:
+                await self._enqueue_retries()
+                domain_delay = await self._dispatch()
+                await self._flush_renders()
+                if (self._in_flight == 0 and not len(self.retry_queue)
+                        and not self._domains_waiting()):
+                    break
+                delay = min((d for d in (self.retry_queue.next_delay(), domain_delay)
+                             if d is not None), default=0.5)
+                await self._wait_idle(delay)
+        finally:
+            if feeder is not None:
+                await self._rendering.put(None)
+                await feeder
+            for lane in self._lanes.values():
+                for _ in lane.sessions:
+                    await lane.work.put(None)
+            await asyncio.gather(*workers, return_exceptions=True)
+            await asyncio.gather(*[s.close() for lane in self._lanes.values()
+                                   for s in lane.sessions])
+            self._close_renderer()
+            if self.journal is not None:
+                self.journal.flush()
+            if self.suppression is not None:
+                self.suppression.flush()
+
+        self.on_finished(self.progress.sent, self.progress.failed, self.errors)
+
+    async def _enqueue(self, recipient):
+        account = self.scheduler.pick()
+        if account is None:
+            self._failed(None, recipient, NoAccountError("No sender account left to send with"))
+            return
+        lane = self._lanes[id(account)]
+        self._in_flight += 1
+        lane.pending += 1
+        if self._renderer is not None:
+            lane.unrendered.append(recipient)
+            if len(lane.unrendered) >= self._renderer.chunk_size:
+                await self._submit_renders(lane)
+            return
+        started = self.timings.start()
+        await lane.work.put(recipient)
+        self.timings.stop('enqueue', started)
+
+    async def _submit_renders(self, lane):
+        chunk, lane.unrendered = lane.unrendered, []
+        future = self._renderer.submit(lane.account.email, chunk)
+        started = self.timings.start()
+        await self._rendering.put((lane, chunk, future))
+        self.timings.stop('enqueue', started)
+
+    async def _flush_renders(self):
+        if self._renderer is None:
+            return
+        for lane in self._lanes.values():
+            if lane.unrendered:
+                await self._submit_renders(lane)
+
+    async def _feed_rendered(self):
+        """Moves rendered chunks, in submission order, into the account queues"""
+        timings = self.timings
+        while True:
+            item = await self._rendering.get()
+            if item is None:
+                return
+            lane, chunk, future = item
+            started = timings.start()
+            try:
+                if self.is_cancelled:
+                    future.cancel()
+                    raise RuntimeError("Campaign cancelled")
+                messages = await asyncio.wrap_future(future)
+            except Exception as e:
+                timings.stop('render_wait', started)
+                for recipient in chunk:
+                    if not self.is_cancelled:
+                        self._failed(lane.account, recipient, e)
+                self._settle(lane, chunk)
+                continue
+            timings.stop('render_wait', started)
+            for recipient, data in zip(chunk, messages):
+                await lane.work.put(Rendered(recipient, data))
+
+    def _settle(self, lane, batch):
+        self._in_flight -= len(batch)
+        lane.pending -= len(batch)
+        if self.domains is not None:
+            self.domains.release(batch)
+        self._idle_event.set()
+
+    async def _enqueue_retries(self):
+        for recipient in self.retry_queue.pop_due():
+            self.progress.retrying()
+            await self._schedule(recipient)
+
+    async def _schedule(self, recipient):
+        if self.domains is None:
+            await self._enqueue(recipient)
+            return
+        self.domains.add(recipient)
+        await self._dispatch(wait=self.domains.is_full())
+
+    async def _dispatch(self, wait=False):
+        domains = self.domains
+        delay = None
+        while domains is not None and not self.is_cancelled:
+            recipient, delay = domains.take()
+            if recipient is not None:
+                await self._enqueue(recipient)
+            elif wait and domains.is_full():
+                # Tek thread: clear() ile take() arasında bir gönderim bitemez
+                await self._wait_idle(delay)
+            else:
+                break
+        return delay
+
+    async def _wait_idle(self, delay=None):
+        """Waits until a delivery finishes or delay (at most 0.5 s) passes"""
+        self._idle_event.clear()
+        try:
+            await asyncio.wait_for(self._idle_event.wait(),
+                                   0.5 if delay is None else min(delay, 0.5))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self, lane, session):
+        while True:
+            recipient = await lane.work.get()
+            if recipient is None:
+                return
+            data = None
+            if isinstance(recipient, Rendered):
+                recipient, data = recipient
+            batch = [recipient]
+            while lane.payload is not None and len(batch) < self.batch_size:
+                try:
+                    recipient = lane.work.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if recipient is None:
+                    # Durdurma işaretini bu oturum için geri koy
+                    lane.work.put_nowait(None)
+                    break
+                batch.append(recipient)
+            try:
+                await self._deliver(lane, session, batch, data)
+            except Exception as e:
+                self._worker_error(batch, e)
+            finally:
+                self._settle(lane, batch)
+
+    async def _deliver(self, lane, session, batch, data=None):
+        """Sends batch over session; data is the message already rendered for batch[0]"""
+        if self.is_cancelled:
+            return
+        account = lane.account
+        if self.rate_limiter.paused_for(account.email) > 0 and self._hand_over(lane, batch):
+            return
+
+        timings = self.timings
+        started = timings.start()
+        for _ in batch:
+            while True:
+                if self.is_cancelled:
+                    return
+                delay = self.rate_limiter.reserve(account.email)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(min(delay, 0.5))
+        timings.stop('rate_wait', started)
+
+        async with self._slots:
+            try:
+                started = timings.start()
+                await session.ensure()
+                timings.stop('session', started)
+                # render_processes ile mesaj zaten iş süreçlerinde parça halinde işlendi
+                if data is None and len(batch) == 1:
+                    started = timings.start()
+                    data = lane.render(batch[0])
+                    timings.stop('render', started)
+                elif data is None:
+                    data = lane.payload
+                failures = await self._transaction(session, account.email, batch, data)
+            except smtplib.SMTPAuthenticationError as e:
+                self.scheduler.disable(account)
+                self.progress.note(f"Account {account.name} disabled: {str(e)}")
+                if self._hand_over(lane, batch):
+                    return
+                failures = dict((recipient, e) for recipient in batch)
+            except Exception as e:
+                failures = dict((recipient, e) for recipient in batch)
+
+        for recipient in batch:
+            if recipient in failures:
+                self._failed(account, recipient, failures[recipient])
+            else:
+                self._sent(account, recipient)
+
+    async def _transaction(self, session, sender, batch, data):
+        """Sends data to batch, reconnecting after a drop or 421; returns {recipient: error}"""
+        timings = self.timings
+        reconnects = 0
+        while True:
+            started = timings.start()
+            try:
+                refused = await session.client.sendmail(sender, batch, data)
+            except smtplib.SMTPRecipientsRefused as e:
+                refused = e.recipients
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+                timings.stop('smtp', started)
+                if reply_code(e) not in (None, 421):
+                    raise
+                reconnects += 1
+                if reconnects > self.max_reconnects:
+                    raise
+                started = timings.start()
+                await session.reconnect()
+                timings.stop('reconnect', started)
+                continue
+            timings.stop('smtp', started)
+            session.mark_sent()
+            return dict((recipient, smtplib.SMTPRecipientsRefused({recipient: (code, resp)}))
+                        for recipient, (code, resp) in refused.items())
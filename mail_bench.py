@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""Offline benchmarks for the sending engine
+
+Usage:
+    python mail_bench.py builder [--messages N] [--attachment-kb KB]
+    python mail_bench.py render [--messages N] [--fields N] [--processes 1,2,4]
+    python mail_bench.py e2e [--sizes 100,1000] [--attachment-kb 0,256] [--latency S]
+    python mail_bench.py domains [--messages N] [--share 0.6] [--sink-concurrency N]
+    python mail_bench.py bounces [--messages N] [--maildir] [--processes 0,1,4]
+"""
+import argparse
+import collections
+import html
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+from mail_bounces import BounceProcessor
+from mail_core import MailCampaign
+from mail_journal import CampaignJournal, SENT
+from mail_domains import DomainScheduler
+from mail_message import MessageTemplate
+from mail_ratelimit import NoRateLimit
+from mail_recipients import Recipient
+from mail_render import RenderPool
+from mail_retry import RetryQueue
+from mail_sink import SMTPSink
+from mail_suppression import SuppressionList
+from mail_template import CompiledTemplate, FIELD_RE, recipient_values
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SAMPLE_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Benchmark</title></head>
+<body>
+    <div class="container">
+        <h1>Merhaba,</h1>
+        <p>%s</p>
+    </div>
+</body>
+</html>""" % ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40)
+
+
+def legacy_build(sender, recipient, subject, content, cv_path=None):
+    """The per-recipient builder the send loop used before MessageTemplate"""
+    msg = MIMEMultipart()
+    msg['From'] = formataddr(('Gönderen', sender))
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    msg.attach(MIMEText(content, 'html', 'utf-8'))
+    if cv_path and os.path.exists(cv_path):
+        with open(cv_path, 'rb') as f:
+            cv_part = MIMEApplication(f.read(), _subtype='pdf')
+            cv_part.add_header('Content-Disposition', 'attachment',
+                               filename=os.path.basename(cv_path))
+            msg.attach(cv_part)
+    return msg.as_string()
+
+
+def make_attachment(size_kb):
+    """Writes a throwaway PDF-sized file and returns its path"""
+    if not size_kb:
+        return None
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(size_kb * 1024))
+    return path
+
+
+def rate(count, seconds):
+    return count / seconds if seconds > 0 else float('inf')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux kilobayt, macOS bayt cinsinden verir
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def bench_builder(args):
+    """Messages/sec of the legacy builder vs. the compiled MessageTemplate"""
+    sender = 'sender@example.com'
+    subject = 'Benchmark konu başlığı'
+    cv_path = make_attachment(args.attachment_kb)
+    recipients = ['user%d@example.com' % i for i in range(args.messages)]
+    try:
+        start = time.perf_counter()
+        for r in recipients:
+            legacy_build(sender, r, subject, SAMPLE_HTML, cv_path)
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        template = MessageTemplate(sender, subject, SAMPLE_HTML, [cv_path] if cv_path else [])
+        for r in recipients:
+            template.render(r)
+        compiled = time.perf_counter() - start
+    finally:
+        if cv_path:
+            os.remove(cv_path)
+
+    print("builder: %d messages, %d KB attachment" % (args.messages, args.attachment_kb))
+    print("  %-18s %12.1f msg/s" % ("legacy MIME", rate(args.messages, legacy)))
+    print("  %-18s %12.1f msg/s" % ("MessageTemplate", rate(args.messages, compiled)))
+    print("  speedup            %12.1fx" % (legacy / compiled if compiled else float('inf')))
+
+
+def bench_render(args):
+    """Personalized renders/sec: compiled template vs. a regex pass per recipient"""
+    names = ['field%d' % i for i in range(args.fields)]
+    slots = ' '.join('{{%s}}' % name for name in names)
+    text = SAMPLE_HTML.replace('<p>', '<p>Merhaba {{name}}, %s ' % slots, 1)
+    recipients = [Recipient('user%d@example.com' % i,
+                            dict([('name', 'Kullanıcı %d' % i)] + [(n, 'değer %d' % i) for n in names]))
+                  for i in range(args.messages)]
+
+    def regex_render(values):
+        return FIELD_RE.sub(lambda m: html.escape(values.get(m.group(1).lower(), '')), text)
+
+    start = time.perf_counter()
+    for r in recipients:
+        regex_render(recipient_values(r))
+    naive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled_template = CompiledTemplate(text)
+    for r in recipients:
+        compiled_template.render(recipient_values(r))
+    compiled = time.perf_counter() - start
+
+    # Kişiselleştirilmiş gövdeyle tam mesaj (base64 dahil)
+    start = time.perf_counter()
+    message = MessageTemplate('sender@example.com', 'Konu', compiled_template.render({}))
+    for r in recipients:
+        message.render(r, None, compiled_template.render(recipient_values(r)))
+    full = time.perf_counter() - start
+
+    print("render: %d recipients, %d merge fields, %d byte template"
+          % (args.messages, args.fields + 1, len(text)))
+    print("  %-18s %12.1f renders/s" % ("regex per message", rate(args.messages, naive)))
+    print("  %-18s %12.1f renders/s" % ("CompiledTemplate", rate(args.messages, compiled)))
+    print("  %-18s %12.1f msg/s" % ("full message", rate(args.messages, full)))
+
+    # Aynı tam mesaj işçi süreçlerinde; süreç başlatma süresi ölçüme dahil değil
+    for processes in [int(n) for n in args.processes.split(',') if n]:
+        with RenderPool('Konu', text, processes=processes) as pool:
+            for future in [pool.submit('sender@example.com', recipients[:1])
+                           for _ in range(processes)]:
+                future.result()
+            start = time.perf_counter()
+            futures = [pool.submit('sender@example.com', recipients[i:i + pool.chunk_size])
+                       for i in range(0, len(recipients), pool.chunk_size)]
+            for future in futures:
+                future.result()
+            pooled = time.perf_counter() - start
+        print("  %-18s %12.1f msg/s" % ("%d process%s" % (processes, '' if processes == 1 else 'es'),
+                                        rate(args.messages, pooled)))
+
+
+class TimedCampaign(MailCampaign):
+    """MailCampaign that records how long each SMTP transaction took"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def _deliver(self, lane, session, batch, data=None):
+        start = time.perf_counter()
+        super()._deliver(lane, session, batch, data)
+        elapsed = time.perf_counter() - start
+        self.latencies.extend([elapsed] * len(batch))
+
+
+def run_case(host, port, messages, attachment_kb, connections, batch_size, retry_delay):
+    """Sends one campaign to the sink; runs in a fresh process so CPU and RSS are its own"""
+    cv_path = make_attachment(attachment_kb)
+    recipients = ['user%d@example.com' % i for i in range(messages)]
+    result = {}
+    try:
+        campaign = TimedCampaign(
+            'bench@example.com', '', recipients, 'Benchmark konu başlığı', SAMPLE_HTML,
+            [cv_path] if cv_path else [], connections=connections, host=host, port=port,
+            rate_limiter=NoRateLimit(), batch_size=batch_size,
+            retry_queue=RetryQueue(retry_delay),
+            on_finished=lambda sent, failed, errors: result.update(sent=sent, failed=failed),
+            on_error=lambda message: result.update(error=message))
+        cpu = time.process_time()
+        start = time.perf_counter()
+        campaign.run()
+        result['seconds'] = time.perf_counter() - start
+        result['cpu'] = time.process_time() - cpu
+    finally:
+        if cv_path:
+            os.remove(cv_path)
+    result['p50'] = percentile(campaign.latencies, 50)
+    result['p99'] = percentile(campaign.latencies, 99)
+    result['rss_mb'] = peak_rss_mb()
+    return result
+
+
+def bench_e2e(args):
+    """Whole engine against the local SMTP sink, one process per case"""
+    sizes = [int(n) for n in args.sizes.split(',')]
+    attachments = [int(kb) for kb in args.attachment_kb.split(',')]
+    ctx = multiprocessing.get_context('spawn')
+    rows = []
+    print("e2e: %d connections, batch %d, latency %.0f ms, error rate %.1f%%"
+          % (args.connections, args.batch_size, args.latency * 1000, args.error_rate * 100))
+    print("  %8s %8s %10s %9s %9s %8s %9s %7s"
+          % ('messages', 'attachKB', 'msg/s', 'p50 ms', 'p99 ms', 'CPU s', 'RSS MB', 'failed'))
+    for attachment_kb in attachments:
+        for messages in sizes:
+            with SMTPSink(latency=args.latency, delivery_delay=args.delivery_delay,
+                          error_rate=args.error_rate, error_code=args.error_code,
+                          drop_rate=args.drop_rate, disconnect_after=args.disconnect_after,
+                          rate_limit=args.rate_limit, seed=1) as sink:
+                host, port = sink.address
+                with ctx.Pool(1) as pool:
+                    result = pool.apply(run_case, (host, port, messages, attachment_kb,
+                                                   args.connections, args.batch_size,
+                                                   args.retry_delay))
+                result['sink'] = sink.stats()
+            if 'error' in result:
+                print("  %8d %8d  error: %s" % (messages, attachment_kb, result['error']))
+                continue
+            result.update(messages=messages, attachment_kb=attachment_kb)
+            rows.append(result)
+            rss = result['rss_mb']
+            print("  %8d %8d %10.1f %9.1f %9.1f %8.2f %9s %7d"
+                  % (messages, attachment_kb, rate(result['sent'], result['seconds']),
+                     result['p50'] * 1000, result['p99'] * 1000, result['cpu'],
+                     '-' if rss is None else '%.1f' % rss, result['failed']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+
+
+def skewed_recipients(messages, share, domains, seed=1):
+    """A list where share of the addresses are at one big domain, the rest spread out"""
+    rng = random.Random(seed)
+    return ['user%d@%s' % (i, 'bigmail.example' if rng.random() < share
+                           else 'domain%d.example' % rng.randrange(domains))
+            for i in range(messages)]
+
+
+def bench_domains(args):
+    """List order vs DomainScheduler against a sink that limits each receiving domain"""
+    recipients = skewed_recipients(args.messages, args.share, args.domains)
+    print("domains: %d messages, %.0f%% to one domain, sink allows %d per domain at once"
+          % (args.messages, args.share * 100, args.sink_concurrency))
+    print("  %-22s %10s %10s %8s" % ('order', 'msg/s', 'throttled', 'failed'))
+    for label, domains in (('list order', None),
+                           ('domain scheduler', DomainScheduler(args.sink_concurrency))):
+        result = {}
+        with SMTPSink(latency=args.latency, delivery_delay=args.delivery_delay,
+                      domain_concurrency=args.sink_concurrency) as sink:
+            host, port = sink.address
+            campaign = MailCampaign(
+                'bench@example.com', '', recipients, 'Benchmark', SAMPLE_HTML,
+                connections=args.connections, host=host, port=port,
+                rate_limiter=NoRateLimit(), domains=domains,
+                retry_queue=RetryQueue(args.retry_delay, max_attempts=100),
+                on_finished=lambda sent, failed, errors: result.update(sent=sent, failed=failed),
+                on_error=lambda message: result.update(error=message))
+            start = time.perf_counter()
+            campaign.run()
+            seconds = time.perf_counter() - start
+            stats = sink.stats()
+        if 'error' in result:
+            print("  %-22s error: %s" % (label, result['error']))
+            continue
+        print("  %-22s %10.1f %10d %8d"
+              % (label, rate(result['sent'], seconds), stats['domain_throttled'],
+                 result['failed']))
+
+
+# Geri dönüş kutusundaki mesaj türleri: (action, status, diagnostic), payı
+BOUNCE_KINDS = (
+    (('failed', '5.1.1', 'smtp; 550 5.1.1 <%s>: Recipient address rejected: User unknown'), 0.55),
+    (('failed', '5.7.1', 'smtp; 550 5.7.1 Message rejected as spam'), 0.15),
+    (('delayed', '4.4.1', 'smtp; 421 4.4.1 Connection timed out'), 0.15),
+    (None, 0.15),
+)
+
+
+def bounce_message(recipient, action, status, diagnostic, sequence=0):
+    """Raw RFC 3464 delivery status notification for one recipient of a campaign"""
+    boundary = 'dsn-%08d' % sequence
+    return ('From MAILER-DAEMON Mon Jan  1 00:00:00 2024\n'
+            'From: Mail Delivery System <MAILER-DAEMON@mx.example>\n'
+            'To: bench@example.com\n'
+            'Subject: Undelivered Mail Returned to Sender\n'
+            'MIME-Version: 1.0\n'
+            'Content-Type: multipart/report; report-type=delivery-status;\n'
+            '\tboundary="%(b)s"\n'
+            '\n'
+            'This is a MIME-encapsulated message.\n'
+            '\n'
+            '--%(b)s\n'
+            'Content-Type: text/plain; charset=us-ascii\n'
+            '\n'
+            'I\'m sorry to have to inform you that your message could not\n'
+            'be delivered to one or more recipients.\n'
+            '\n'
+            '--%(b)s\n'
+            'Content-Type: message/delivery-status\n'
+            '\n'
+            'Reporting-MTA: dns; mx.example\n'
+            'Arrival-Date: Mon, 1 Jan 2024 00:00:00 +0000\n'
+            '\n'
+            'Final-Recipient: rfc822; %(r)s\n'
+            'Original-Recipient: rfc822;%(r)s\n'
+            'Action: %(a)s\n'
+            'Status: %(s)s\n'
+            'Diagnostic-Code: %(d)s\n'
+            '\n'
+            '--%(b)s\n'
+            'Content-Type: message/rfc822\n'
+            '\n'
+            'From: bench@example.com\n'
+            'To: %(r)s\n'
+            'Subject: Benchmark\n'
+            '\n'
+            '%(body)s\n'
+            '--%(b)s--\n'
+            '\n' % {'b': boundary, 'r': recipient, 'a': action, 's': status,
+                     'd': diagnostic.replace('%s', recipient),
+                     'body': 'Lorem ipsum dolor sit amet.\n' * 40}).encode('utf-8')
+
+
+def auto_reply(recipient):
+    return ('From %(r)s Mon Jan  1 00:00:00 2024\n'
+            'From: %(r)s\n'
+            'To: bench@example.com\n'
+            'Subject: Out of office\n'
+            'Content-Type: text/plain\n'
+            '\n'
+            'I am out of the office until next week.\n'
+            '\n' % {'r': recipient}).encode('utf-8')
+
+
+def write_bounces(path, messages, maildir=False, seed=1):
+    """Fixture mailbox (mbox file or Maildir) of DSNs and auto-replies
+
+    Returns (recipients, Counter of the kinds written).
+    """
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in BOUNCE_KINDS]
+    weights = [share for _, share in BOUNCE_KINDS]
+    recipients = []
+    written = collections.Counter()
+    if maildir:
+        for folder in ('new', 'cur', 'tmp'):
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+    else:
+        mbox = open(path, 'wb')
+    try:
+        for i in range(messages):
+            recipient = 'user%d@domain%d.example' % (i, i % 50)
+            recipients.append(recipient)
+            kind = rng.choices(kinds, weights)[0]
+            if kind is None:
+                data = auto_reply(recipient)
+                written['other'] += 1
+            else:
+                data = bounce_message(recipient, *kind, sequence=i)
+                written[kind[1]] += 1
+            if maildir:
+                with open(os.path.join(path, 'new', '%d.%d.bench' % (i, seed)), 'wb') as f:
+                    f.write(data)
+            else:
+                mbox.write(data)
+    finally:
+        if not maildir:
+            mbox.close()
+    return recipients, written
+
+
+def bench_bounces(args):
+    """DSN ingestion from a fixture mailbox into a journal and a suppression list"""
+    processes = [int(p) for p in args.processes.split(',') if p.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        mailbox = os.path.join(tmp, 'Bounces' if args.maildir else 'Bounces.mbox')
+        start = time.perf_counter()
+        recipients, written = write_bounces(mailbox, args.messages, args.maildir)
+        print("bounces: %d messages (%s) written in %.1fs, %s"
+              % (args.messages, 'Maildir' if args.maildir else 'mbox',
+                 time.perf_counter() - start,
+                 ', '.join('%s=%d' % item for item in sorted(written.items()))))
+        print("  %-10s %10s %10s %10s %10s %10s"
+              % ('processes', 'msg/s', 'DSNs', 'failed', 'bounced', 'suppressed'))
+        for count in processes:
+            journal = CampaignJournal(os.path.join(tmp, 'journal%d.db' % count), 'bench')
+            for recipient in recipients:
+                journal.record(recipient, SENT)
+            journal.flush()
+            suppression = SuppressionList(os.path.join(tmp, 'suppression%d.db' % count))
+            processor = BounceProcessor(journal, suppression, processes=count)
+            start = time.perf_counter()
+            stats = processor.run(mailbox)
+            seconds = time.perf_counter() - start
+            print("  %-10d %10.0f %10d %10d %10d %10d"
+                  % (count, rate(stats['messages'], seconds), stats['dsn'], stats['failed'],
+                     stats['journal'], len(suppression)))
+            journal.close()
+            suppression.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+
+    p = sub.add_parser('builder', help='compare message builders')
+    p.add_argument('--messages', type=int, default=2000)
+    p.add_argument('--attachment-kb', type=int, default=256)
+    p.set_defaults(func=bench_builder)
+
+    p = sub.add_parser('render', help='personalized template renders')
+    p.add_argument('--messages', type=int, default=20000)
+    p.add_argument('--fields', type=int, default=4, help='extra merge fields besides {{name}}')
+    p.add_argument('--processes', default='',
+                   help='comma separated RenderPool sizes to compare, e.g. 1,2,4')
+    p.set_defaults(func=bench_render)
+
+    p = sub.add_parser('e2e', help='whole engine against the local SMTP sink')
+    p.add_argument('--sizes', default='100,1000', help='comma separated list sizes')
+    p.add_argument('--attachment-kb', default='0,256', help='comma separated attachment sizes')
+    p.add_argument('--connections', type=int, default=4)
+    p.add_argument('--batch-size', type=int, default=1)
+    p.add_argument('--retry-delay', type=float, default=0.1)
+    p.add_argument('--latency', type=float, default=0.0, help='sink round-trip delay (s)')
+    p.add_argument('--delivery-delay', type=float, default=0.0)
+    p.add_argument('--error-rate', type=float, default=0.0)
+    p.add_argument('--error-code', type=int, default=550)
+    p.add_argument('--drop-rate', type=float, default=0.0)
+    p.add_argument('--disconnect-after', type=int, default=0)
+    p.add_argument('--rate-limit', type=float, default=0)
+    p.add_argument('--json', metavar='FILE', help='also write the results as JSON')
+    p.set_defaults(func=bench_e2e)
+
+    p = sub.add_parser('domains', help='list order vs per-domain scheduling')
+    p.add_argument('--messages', type=int, default=1000)
+    p.add_argument('--share', type=float, default=0.6, help='fraction sent to the big domain')
+    p.add_argument('--domains', type=int, default=40, help='number of other domains')
+    p.add_argument('--sink-concurrency', type=int, default=2,
+                   help='transactions the sink accepts at once per domain')
+    p.add_argument('--connections', type=int, default=8)
+    p.add_argument('--retry-delay', type=float, default=0.05)
+    p.add_argument('--latency', type=float, default=0.005, help='sink round-trip delay (s)')
+    p.add_argument('--delivery-delay', type=float, default=0.01)
+    p.set_defaults(func=bench_domains)
+
+    p = sub.add_parser('bounces', help='DSN ingestion from an mbox file or a Maildir')
+    p.add_argument('--messages', type=int, default=100000)
+    p.add_argument('--maildir', action='store_true', help='write a Maildir instead of an mbox')
+    p.add_argument('--processes', default='0,%d' % (os.cpu_count() or 1),
+                   help='comma separated BounceProcessor pool sizes (0: in process)')
+    p.set_defaults(func=bench_bounces)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""Delivery status notifications (RFC 3464) read from an mbox file or a Maildir
+
+Bounces come back to the sending mailbox; export it (or point at the
+Maildir) and apply them to the campaign journal and the suppression list:
+
+    python mail_bounces.py Bounces.mbox --journal campaign_journal.db
+    python mail_bounces.py ~/Maildir/.Bounces --suppression suppression.db --list
+"""
+import argparse
+import base64
+import collections
+import multiprocessing
+import mmap
+import os
+import quopri
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from mail_journal import CampaignJournal
+from mail_recipients import normalize_address
+from mail_suppression import BOUNCED, DEFAULT_SUPPRESSION, SuppressionList, is_hard_status
+
+# Bir işçi sürecine verilen mbox parçası ve Maildir dosya sayısı
+DEFAULT_CHUNK_BYTES = 8 << 20
+DEFAULT_CHUNK_FILES = 256
+# Günlüğe ve bastırma listesine tek işlemde yazılan geri dönüş sayısı
+UPDATE_BATCH = 5000
+MAILDIR_FOLDERS = ('new', 'cur')
+
+Bounce = collections.namedtuple('Bounce', ('recipient', 'action', 'status', 'diagnostic'))
+
+_HEAD_END_RE = re.compile(rb'\r?\n\r?\n')
+_BLOCK_RE = re.compile(r'\r?\n(?:[ \t]*\r?\n)+')
+_STATUS_RE = re.compile(r'\d\.\d{1,3}\.\d{1,3}')
+_BOUNDARY_RE = re.compile(r'(?i);\s*boundary\s*=\s*(?:"([^"]*)"|([^\s;]+))')
+_DSN_TYPES = ('message/delivery-status', 'message/global-delivery-status')
+
+
+def _split_head(data, start=0):
+    """(header block, offset of the body) of the entity at start"""
+    end = _HEAD_END_RE.search(data, start)
+    if end is None:
+        return data[start:], len(data)
+    return data[start:end.start()], end.end()
+
+
+def _fields(block):
+    """{lower-cased name: unfolded value} of one block of DSN fields"""
+    fields = {}
+    name = None
+    for line in block.splitlines():
+        if line[:1] in (' ', '\t'):
+            if name is not None:
+                fields[name] += ' ' + line.strip()
+        elif ':' in line:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            fields[name] = value.strip()
+    return fields
+
+
+def _headers(head):
+    """(content type, boundary, transfer encoding) of a header block
+
+    Only these three are needed, so the block is split by hand instead of
+    going through email.parser, which would be most of the parsing time.
+    """
+    fields = _fields(head.decode('latin-1'))
+    content_type = fields.get('content-type', 'text/plain')
+    boundary = _BOUNDARY_RE.search(content_type)
+    return (content_type.partition(';')[0].strip().lower(),
+            boundary and (boundary.group(1) or boundary.group(2)),
+            fields.get('content-transfer-encoding', '').strip().lower())
+
+
+def _typed_value(value):
+    """"rfc822; a@b" -> ("rfc822", "a@b")"""
+    kind, sep, value = value.partition(';')
+    if not sep:
+        return '', kind.strip()
+    return kind.strip().lower(), value.strip()
+
+
+def parse_dsn(data):
+    """Bounce per recipient of a delivery status notification, or None
+
+    data is the raw message (bytes). Only the top-level headers and the
+    MIME parts up to the message/delivery-status part are looked at; the
+    returned copy of the original message, attachments and all, is never
+    parsed. Anything that is not a multipart/report with such a part gives
+    None.
+    """
+    if data[:5] == b'From ':
+        # mbox ayırıcı satırı
+        data = data[data.find(b'\n') + 1:]
+    head, body = _split_head(data)
+    content_type, boundary, _ = _headers(head)
+    if content_type != 'multipart/report' or not boundary:
+        return None
+    delimiter = b'\n--' + boundary.encode('ascii', 'replace')
+    pos = data.find(delimiter, body - 1)
+    while pos >= 0:
+        start = data.find(b'\n', pos + len(delimiter))
+        if start < 0 or data[pos + len(delimiter):pos + len(delimiter) + 2] == b'--':
+            break
+        head, part = _split_head(data, start + 1)
+        end = data.find(delimiter, part - 1)
+        content_type, _, encoding = _headers(head)
+        if content_type in _DSN_TYPES:
+            content = data[part:end if end >= 0 else len(data)]
+            if encoding == 'base64':
+                content = base64.b64decode(content)
+            elif encoding == 'quoted-printable':
+                content = quopri.decodestring(content)
+            return _recipients(content.decode('utf-8', 'replace'))
+        pos = end
+    return None
+
+
+def _recipients(status):
+    """Bounces of the per-recipient blocks of a delivery-status body"""
+    bounces = []
+    # İlk blok mesajın kendisine, sonrakiler alıcılara ait
+    for block in _BLOCK_RE.split(status.strip())[1:]:
+        fields = _fields(block)
+        kind, address = _typed_value(fields.get('original-recipient', ''))
+        if kind != 'rfc822' or '@' not in address:
+            kind, address = _typed_value(fields.get('final-recipient', ''))
+        if '@' not in address:
+            continue
+        code = _STATUS_RE.match(fields.get('status', ''))
+        bounces.append(Bounce(normalize_address(address),
+                              fields.get('action', '').split(' ')[0].lower(),
+                              code.group(0) if code else '',
+                              _typed_value(fields.get('diagnostic-code', ''))[1]))
+    return bounces
+
+
+def _scan(messages):
+    """(messages, DSNs, failed Bounces) of an iterable of raw messages"""
+    count = dsns = 0
+    failed = []
+    for data in messages:
+        count += 1
+        bounces = parse_dsn(data)
+        if bounces is None:
+            continue
+        dsns += 1
+        failed.extend(b for b in bounces if b.action == 'failed')
+    return count, dsns, failed
+
+
+def mbox_messages(path, start=0, end=None):
+    """Raw messages of an mbox file whose "From " line starts in [start, end)
+
+    The file is mapped, not read, and only one message is copied out at a
+    time, so consecutive ranges can be scanned by different processes.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        end = size if end is None else min(end, size)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if start == 0 and mapped[:5] == b'From ':
+                pos = 0
+            else:
+                pos = mapped.find(b'\nFrom ', max(0, start - 1))
+                pos = pos + 1 if pos >= 0 else -1
+            while 0 <= pos < end:
+                following = mapped.find(b'\nFrom ', pos)
+                yield mapped[pos:following + 1 if following >= 0 else size]
+                pos = following + 1 if following >= 0 else -1
+        finally:
+            mapped.close()
+
+
+def maildir_files(path):
+    """Paths of the messages of a Maildir (new/ and cur/), as found"""
+    for folder in MAILDIR_FOLDERS:
+        with os.scandir(os.path.join(path, folder)) as entries:
+            for entry in entries:
+                if not entry.name.startswith('.') and entry.is_file():
+                    yield entry.path
+
+
+def _read_files(paths):
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            # İşlenirken başka bir istemci taşımış olabilir
+            continue
+        yield data
+
+
+def _scan_mbox(path, start, end):
+    return _scan(mbox_messages(path, start, end))
+
+
+def _scan_files(paths):
+    return _scan(_read_files(paths))
+
+
+class BounceProcessor:
+    """Applies the failed recipients of DSNs in a mailbox to a journal and a suppression list
+
+    The mailbox is cut into tasks, byte ranges of chunk_bytes for an mbox
+    file and chunk_files messages for a Maildir, which a pool of processes
+    parses (in this process when processes is 0). At most two tasks per
+    process are in flight and messages are never collected, so memory
+    stays flat whatever the size of the archive. Failures are written in
+    batches of batch_size: the journal marks the recipient's sent rows as
+    bounced (in every campaign when every_campaign is set) and hard
+    bounces (see is_hard_status) are added to the suppression list.
+    """
+
+    def __init__(self, journal=None, suppression=None, every_campaign=False, processes=None,
+                 chunk_bytes=DEFAULT_CHUNK_BYTES, chunk_files=DEFAULT_CHUNK_FILES,
+                 batch_size=UPDATE_BATCH, on_bounce=None):
+        self.journal = journal
+        self.suppression = suppression
+        self.every_campaign = every_campaign
+        self.processes = (os.cpu_count() or 1) if processes is None else max(0, processes)
+        self.chunk_bytes = max(1, int(chunk_bytes))
+        self.chunk_files = max(1, int(chunk_files))
+        self.batch_size = max(1, int(batch_size))
+        self.on_bounce = on_bounce
+        self.stats = collections.Counter()
+        self._pending = {}
+
+    def tasks(self, path):
+        """(function, args) pairs that together scan the mbox file or Maildir at path"""
+        if os.path.isdir(path):
+            chunk = []
+            for name in maildir_files(path):
+                chunk.append(name)
+                if len(chunk) >= self.chunk_files:
+                    yield _scan_files, (chunk,)
+                    chunk = []
+            if chunk:
+                yield _scan_files, (chunk,)
+        else:
+            size = os.path.getsize(path)
+            for start in range(0, size, self.chunk_bytes):
+                yield _scan_mbox, (path, start, start + self.chunk_bytes)
+
+    def results(self, path):
+        """(messages, DSNs, failed Bounces) per task, in mailbox order"""
+        if not self.processes:
+            for function, args in self.tasks(path):
+                yield function(*args)
+            return
+        # fork, açık SQLite bağlantılarıyla güvenli değil
+        with ProcessPoolExecutor(self.processes,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = collections.deque()
+            for function, args in self.tasks(path):
+                futures.append(executor.submit(function, *args))
+                if len(futures) >= self.processes * 2:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+
+    def run(self, *paths):
+        """Processes every mailbox in paths; returns the stats Counter"""
+        try:
+            for path in paths:
+                for messages, dsns, failed in self.results(path):
+                    self.stats['messages'] += messages
+                    self.stats['dsn'] += dsns
+                    for bounce in failed:
+                        self._add(bounce)
+        finally:
+            self.flush()
+            if self.suppression is not None and self.stats['suppressed']:
+                self.suppression.rebuild_index()
+        return self.stats
+
+    def _add(self, bounce):
+        self.stats['failed'] += 1
+        if self.on_bounce is not None:
+            self.on_bounce(bounce)
+        # Aynı alıcı için gelen son bildirim geçerlidir
+        self._pending[bounce.recipient.lower()] = bounce
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the failures collected so far"""
+        if not self._pending:
+            return
+        batch, self._pending = list(self._pending.values()), {}
+        details = [(b.recipient, ' '.join(filter(None, (b.status, b.diagnostic))))
+                   for b in batch]
+        if self.journal is not None:
+            self.stats['journal'] += self.journal.record_bounces(details, self.every_campaign)
+        if self.suppression is not None:
+            hard = [(recipient, BOUNCED, detail)
+                    for (recipient, detail), b in zip(details, batch) if is_hard_status(b.status)]
+            self.stats['suppressed'] += self.suppression.add_many(hard)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Apply the bounces (DSNs) of an mbox file or a Maildir to the campaign '
+                    'journal and the suppression list.')
+    parser.add_argument('mailboxes', nargs='+', metavar='MAILBOX',
+                        help='mbox file or Maildir directory')
+    parser.add_argument('--journal', metavar='FILE',
+                        help='mark bounced recipients in this campaign journal')
+    parser.add_argument('--campaign-id',
+                        help='only update this campaign of the journal (default: all campaigns)')
+    parser.add_argument('--suppression', metavar='FILE', default=DEFAULT_SUPPRESSION,
+                        help='add hard bounces to this suppression list (default: %(default)s)')
+    parser.add_argument('--no-suppression', dest='suppression', action='store_const', const=None,
+                        help='do not touch the suppression list')
+    parser.add_argument('--processes', type=int,
+                        help='parser processes (default: one per CPU, 0: none)')
+    parser.add_argument('--list', action='store_true',
+                        help='print every failed recipient (address, status, diagnostic)')
+    return parser
+
+
+def _print_bounce(bounce):
+    print('%s\t%s\t%s' % (bounce.recipient, bounce.status, bounce.diagnostic))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    for path in args.mailboxes:
+        if not os.path.exists(path):
+            print('mail_bounces: mailbox not found: %s' % path, file=sys.stderr)
+            return 2
+    journal = CampaignJournal(args.journal, args.campaign_id) if args.journal else None
+    suppression = SuppressionList(args.suppression) if args.suppression else None
+    on_bounce = _print_bounce if args.list else None
+    processor = BounceProcessor(journal, suppression, every_campaign=not args.campaign_id,
+                                processes=args.processes, on_bounce=on_bounce)
+    try:
+        stats = processor.run(*args.mailboxes)
+    except OSError as e:
+        print('mail_bounces: %s' % e, file=sys.stderr)
+        return 2
+    finally:
+        if journal is not None:
+            journal.close()
+        if suppression is not None:
+            suppression.close()
+    print('%d messages, %d DSNs, %d failed recipients, %d journal rows bounced, %d suppressed'
+          % (stats['messages'], stats['dsn'], stats['failed'], stats['journal'],
+             stats['suppressed']), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
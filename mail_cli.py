@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""Headless campaign runner: sends without a display and prints JSON lines
+
+Example:
+    python mail_cli.py --recipients list.txt --subject "Başvuru" --template mail.html --attach cv.pdf
+
+Credentials come from --email/--password or EMAIL/PASSWORD in the
+environment (a .env file is read when python-dotenv is installed).
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+
+from mail_core import MailCampaign
+from mail_pool import DEFAULT_POOL_SIZE, DEFAULT_RECYCLE_AFTER, SMTP_HOST, SMTP_PORT
+from mail_ratelimit import RateLimiter, NoRateLimit, DEFAULT_PER_MINUTE, DEFAULT_BURST
+from mail_journal import CampaignJournal, DEFAULT_JOURNAL, campaign_id
+from mail_suppression import SuppressionList
+from mail_retry import RetryQueue, DEFAULT_RETRY_DELAY, DEFAULT_MAX_ATTEMPTS
+from mail_recipients import RecipientFile, RecipientValidator, ValidatedRecipients
+from mail_accounts import load_accounts, STRATEGIES, WEIGHTED
+from mail_timing import PhaseTimings
+from mail_async import AsyncMailCampaign, ASYNC, ENGINES, THREADS, DEFAULT_MAX_IN_FLIGHT
+from mail_domains import (DomainScheduler, DEFAULT_DOMAIN_CONCURRENCY, DEFAULT_LOOKAHEAD,
+                          parse_domain_limits)
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+# Ctrl+C ile kesilen programların geleneksel çıkış kodu (128 + SIGINT)
+EXIT_CANCELLED = 130
+
+
+class JSONLinesReporter:
+    """Writes one JSON object per campaign event to a stream"""
+
+    def __init__(self, stream, total=None):
+        self.stream = stream
+        self.total = total
+        self.result = None
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        record = {'event': event}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def progress(self, done, status):
+        self.emit('progress', done=done, total=self.total, status=status)
+
+    def finished(self, successful, failed, errors):
+        self.result = 0 if failed == 0 else 1
+        self.emit('finished', successful=successful, failed=failed,
+                  errors=[dict(code=code, kind=kind, count=count, sample=sample)
+                          for code, kind, count, sample in errors.groups()])
+
+    def error(self, message):
+        self.result = 2
+        self.emit('error', message=message)
+
+
+def read_stdin():
+    """Yields one address per line from stdin"""
+    for line in sys.stdin:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Send an HTML email campaign without the desktop UI.')
+    parser.add_argument('--recipients', required=True,
+                        help="TXT (one address per line) or CSV file, '-' for stdin")
+    parser.add_argument('--column',
+                        help='CSV column holding the address, by header name or index')
+    parser.add_argument('--subject', required=True)
+    parser.add_argument('--template', required=True,
+                        help='HTML file sent as the body; {{field}} placeholders are filled '
+                             'from the CSV columns')
+    parser.add_argument('--wrap-html', action='store_true',
+                        help='wrap a bare HTML fragment in the default email layout')
+    parser.add_argument('--no-optimize-html', dest='optimize_html', action='store_false',
+                        help='send the HTML as written instead of inlining <style> rules '
+                             'and minifying whitespace')
+    parser.add_argument('--attach', action='append', default=[], metavar='FILE',
+                        help='file to attach (repeatable)')
+    parser.add_argument('--email', help='sender address (default: $EMAIL)')
+    parser.add_argument('--password', help='app password (default: $PASSWORD)')
+    parser.add_argument('--accounts', metavar='FILE',
+                        help='accounts.ini with several sender accounts to share the campaign '
+                             '(replaces --email/--password/--host/--port/--connections)')
+    parser.add_argument('--strategy', choices=STRATEGIES, default=WEIGHTED,
+                        help='how recipients are shared between accounts (default: %(default)s)')
+    parser.add_argument('--host', default=SMTP_HOST)
+    parser.add_argument('--port', type=int, default=SMTP_PORT)
+    parser.add_argument('--connections', type=int, default=DEFAULT_POOL_SIZE,
+                        help='parallel SMTP sessions (default: %(default)s)')
+    parser.add_argument('--recycle-after', type=int, default=DEFAULT_RECYCLE_AFTER,
+                        help='reconnect each session after this many messages, 0 never '
+                             '(default: %(default)s)')
+    parser.add_argument('--engine', choices=ENGINES, default=THREADS,
+                        help='one thread per SMTP session, or every session on one asyncio '
+                             'event loop (default: %(default)s)')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help='async engine: SMTP transactions in progress at once '
+                             '(default: %(default)s)')
+    parser.add_argument('--render-processes', type=int, default=0, metavar='N',
+                        help='render personalized messages in N worker processes '
+                             '(default: in the sending threads)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='recipients per SMTP transaction (Bcc) for non-personalized mail')
+    parser.add_argument('--retry-delay', type=float, default=DEFAULT_RETRY_DELAY,
+                        help='seconds before the first retry of a temporary failure, doubled '
+                             'on each attempt (default: %(default)s)')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help='attempts per recipient before a temporary failure is final '
+                             '(default: %(default)s)')
+    parser.add_argument('--rate-per-minute', type=float,
+                        help='sustained send rate, 0 disables limiting (default: $RATE_PER_MINUTE or %d)'
+                        % DEFAULT_PER_MINUTE)
+    parser.add_argument('--burst', type=int,
+                        help='token bucket burst size (default: $RATE_BURST or %d)' % DEFAULT_BURST)
+    parser.add_argument('--domain-concurrency', type=int, default=0, metavar='N',
+                        help='interleave recipient domains, at most N messages in progress per '
+                             'domain (default: send in list order)')
+    parser.add_argument('--domain-rate', type=float, default=0, metavar='PER_MINUTE',
+                        help='messages per minute to one recipient domain (default: no limit)')
+    parser.add_argument('--domain-limit', action='append', default=[],
+                        metavar='DOMAIN=N[/PER_MINUTE]',
+                        help='own concurrency and rate for one domain, e.g. gmail.com=8/600 '
+                             '(repeatable)')
+    parser.add_argument('--domain-lookahead', type=int, default=DEFAULT_LOOKAHEAD,
+                        help='recipients read ahead to interleave domains (default: %(default)s)')
+    parser.add_argument('--journal', metavar='FILE',
+                        help='record every outcome in this SQLite journal')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip recipients the journal lists as already sent')
+    parser.add_argument('--suppression', metavar='FILE',
+                        help='skip addresses on this suppression list and add hard bounces '
+                             'to it (see mail_suppression.py)')
+    parser.add_argument('--errors', metavar='FILE',
+                        help='write every failed recipient to this .csv or .json file')
+    parser.add_argument('--timings', action='store_true',
+                        help='time each phase of the send loop and print a summary to stderr '
+                             '(SIGUSR1 toggles it while running)')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write a Chrome trace JSON of every timed phase (implies --timings)')
+    parser.add_argument('--campaign-id',
+                        help='journal key (default: derived from sender, subject and template)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if load_dotenv:
+        load_dotenv()
+
+    accounts = None
+    if args.accounts:
+        try:
+            accounts = load_accounts(args.accounts)
+        except (OSError, ValueError) as e:
+            print('mail_cli: %s' % e, file=sys.stderr)
+            return 2
+    email = accounts[0].email if accounts else args.email or os.getenv('EMAIL', '')
+    password = args.password if args.password is not None else os.getenv('PASSWORD', '')
+    if not email:
+        print('mail_cli: a sender address is required (--email or $EMAIL)', file=sys.stderr)
+        return 2
+
+    try:
+        with open(args.template, encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print('mail_cli: cannot read template: %s' % e, file=sys.stderr)
+        return 2
+    for path in args.attach:
+        if not os.path.exists(path):
+            print('mail_cli: attachment not found: %s' % path, file=sys.stderr)
+            return 2
+
+    if args.resume and not args.journal:
+        args.journal = DEFAULT_JOURNAL
+    journal = None
+    if args.journal:
+        journal = CampaignJournal(
+            args.journal, args.campaign_id or campaign_id(email, args.subject, content))
+        if not args.resume:
+            journal.reset()
+    suppression = SuppressionList(args.suppression) if args.suppression else None
+
+    rate = args.rate_per_minute
+    if rate is None:
+        rate = float(os.getenv('RATE_PER_MINUTE', DEFAULT_PER_MINUTE))
+    burst = args.burst if args.burst is not None else int(os.getenv('RATE_BURST', DEFAULT_BURST))
+    rate_limiter = RateLimiter(rate, burst) if rate > 0 else NoRateLimit()
+    domains = None
+    if args.domain_concurrency or args.domain_rate or args.domain_limit:
+        try:
+            limits = parse_domain_limits(args.domain_limit)
+        except ValueError as e:
+            print('mail_cli: %s' % e, file=sys.stderr)
+            return 2
+        domains = DomainScheduler(args.domain_concurrency or DEFAULT_DOMAIN_CONCURRENCY,
+                                  args.domain_rate, limits, args.domain_lookahead)
+
+    # Alıcılar gönderim sırasında dosyadan akıtılır, hepsi belleğe alınmaz
+    if args.recipients == '-':
+        # stdin tek geçişte okunur; sayımlar kampanya sonunda raporlanır
+        validator = RecipientValidator()
+        recipients, total = validator.filter(read_stdin()), None
+    else:
+        source = RecipientFile(args.recipients, column=args.column)
+        validator = RecipientValidator(source.count())
+        validator.scan(source)
+        recipients, total = ValidatedRecipients(source, source.count()), validator.accepted
+    reporter = JSONLinesReporter(sys.stdout, total=total)
+    if total is not None:
+        reporter.emit('validated', **validator.stats())
+    kwargs = {}
+    campaign_class = MailCampaign
+    if args.engine == ASYNC:
+        campaign_class = AsyncMailCampaign
+        kwargs['max_in_flight'] = args.max_in_flight
+    campaign = campaign_class(
+        email, password, recipients, args.subject, content, args.attach,
+        connections=args.connections, rate_limiter=rate_limiter,
+        host=args.host, port=args.port, journal=journal,
+        wrap_html=args.wrap_html, batch_size=args.batch_size,
+        recycle_after=args.recycle_after, accounts=accounts, strategy=args.strategy,
+        render_processes=args.render_processes, optimize_html=args.optimize_html,
+        domains=domains, suppression=suppression,
+        timings=PhaseTimings(enabled=args.timings or bool(args.trace), trace=bool(args.trace)),
+        retry_queue=RetryQueue(args.retry_delay, max_attempts=args.max_attempts),
+        on_progress=reporter.progress, on_finished=reporter.finished,
+        on_error=reporter.error, **kwargs)
+
+    prepared = campaign.prepared_html()
+    reporter.emit('html', size=len(prepared.html.encode('utf-8')),
+                  original_size=prepared.original_size, problems=prepared.problems)
+    for problem in prepared.problems:
+        print('mail_cli: template: %s' % problem, file=sys.stderr)
+
+    # Ctrl+C / SIGTERM kampanyayı düzgünce durdurur
+    def _stop(signum, frame):
+        campaign.cancel()
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    if hasattr(signal, 'SIGUSR1'):
+        def _toggle_timings(signum, frame):
+            campaign.timings.enabled = not campaign.timings.enabled
+        signal.signal(signal.SIGUSR1, _toggle_timings)
+
+    try:
+        campaign.run()
+    finally:
+        if journal is not None:
+            journal.close()
+        if suppression is not None:
+            suppression.close()
+    summary = campaign.timings.summary()
+    if summary:
+        reporter.emit('timings', phases=campaign.timings.as_dict())
+        print(summary, file=sys.stderr)
+    if args.trace:
+        campaign.timings.write_trace(args.trace)
+    if args.errors and len(campaign.errors):
+        campaign.errors.export(args.errors)
+    campaign.errors.close()
+    if total is None:
+        reporter.emit('validated', **validator.stats())
+    if campaign.is_cancelled:
+        # SIGINT/SIGTERM ile durdurulan çalıştırma tamamlanmış sayılmaz
+        return EXIT_CANCELLED
+    return reporter.result if reporter.result is not None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,746 @@
+# -*- coding: utf-8 -*-
+"""Qt-free sending engine shared by the desktop app and the command line"""
+import html
+import os
+import queue
+import re
+import smtplib
+import threading
+
+from mail_pool import (SMTPConnectionPool, DEFAULT_POOL_SIZE, DEFAULT_RECYCLE_AFTER,
+                       SMTP_HOST, SMTP_PORT, reply_code, send_batch)
+from mail_accounts import Account, AccountScheduler, WEIGHTED
+from mail_ratelimit import RateLimiter, THROTTLE_CODES
+from mail_message import StreamedMessage, build_message
+from mail_journal import SENT, FAILED, DEFERRED
+from mail_retry import RetryQueue, classify, TRANSIENT
+from mail_errors import ErrorLog, describe
+from mail_progress import ProgressTracker
+from mail_timing import PhaseTimings
+from mail_template import CompiledTemplate
+from mail_render import RenderPool, Rendered
+from mail_html import prepare_html
+from mail_suppression import BOUNCED, is_hard_bounce
+
+
+def _noop(*args):
+    pass
+
+
+class NoAccountError(Exception):
+    """Every sender account of the campaign has been disabled"""
+
+
+class _Lane:
+    """One sender account's connection pool, work queue and compiled message"""
+    
+    def __init__(self, account, pool, render, payload, maxsize):
+        self.account = account
+        self.pool = pool
+        self.render = render
+        self.payload = payload
+        self.work = queue.Queue(maxsize=maxsize)
+        # Kuyrukta bekleyen ya da gönderilmekte olan alıcı sayısı
+        self.pending = 0
+        # İşçi süreçlerine gönderilmeyi bekleyen alıcılar
+        self.unrendered = []
+
+
+class MailCampaign:
+    """Sends one message to every recipient through pools of SMTP sessions
+
+    Progress is reported through plain callbacks so any front-end can drive
+    it: on_progress(done, status), on_finished(successful, failed, errors)
+    where errors is the campaign's ErrorLog, and on_error(message) for
+    failures that stop the whole campaign (authentication, connection).
+    With a CampaignJournal every outcome is recorded and recipients it
+    already lists as sent are skipped. With batch_size > 1 a
+    non-personalized message goes out to up to that many recipients per
+    SMTP transaction, all of them as Bcc. Transient failures (4xx, dropped
+    connections) are deferred to the retry_queue and tried again later,
+    interleaved with fresh sends; only permanent or exhausted failures count
+    as failed. Counters live in self.progress, which a GUI can sample with
+    snapshot() instead of handling a callback per message; total sizes its
+    ETA when recipients has no len().
+
+    Given a list of Account objects the recipients are sharded across
+    them (email, password, host, port and connections are then ignored):
+    each account gets its own pool and rate limit, the AccountScheduler
+    picks the account for every recipient, and work queued for an account
+    that gets throttled or loses its login is handed over to the others.
+
+    self.timings (a PhaseTimings, disabled unless one is passed in) records
+    how long each phase of the send loop takes; it can be switched on and
+    off while the campaign runs.
+
+    With render_processes > 0 personalized messages are rendered by a
+    RenderPool of that many processes, in chunks, ahead of the senders; a
+    feeder thread hands the finished bytes to the account queues in order.
+    Both queues are bounded, so a slow SMTP side stalls the producer rather
+    than piling up rendered messages.
+
+    The HTML body is preprocessed once per campaign (see mail_html): CSS
+    from <style> blocks is inlined and whitespace minified, unless
+    optimize_html is False.
+
+    With a DomainScheduler as domains, recipients pass through its
+    look-ahead buffer before reaching the account queues, so the receiving
+    domains are interleaved and each stays within its concurrency and rate
+    caps. Throttling replies to RCPT TO then slow down the recipient's
+    domain instead of the sender account.
+
+    With a SuppressionList as suppression, listed recipients are skipped
+    (counted with the skipped ones) and addresses refused with a hard
+    bounce (see is_hard_bounce) are added to it.
+    """
+
+    def __init__(self, email, password, recipients, subject, content, attachments=(),
+                 connections=DEFAULT_POOL_SIZE, rate_limiter=None,
+                 host=SMTP_HOST, port=SMTP_PORT, journal=None, wrap_html=False, batch_size=1,
+                 recycle_after=DEFAULT_RECYCLE_AFTER, retry_queue=None, total=None,
+                 accounts=None, strategy=WEIGHTED, timings=None, render_processes=0,
+                 optimize_html=True, domains=None, suppression=None, on_progress=None,
+                 on_finished=None, on_error=None):
+        if not accounts:
+            accounts = [Account(email, password, host, port, connections,
+                                recycle_after=recycle_after)]
+        self.accounts = list(accounts)
+        self.email = email or self.accounts[0].email
+        self.password = password
+        self.recipients = recipients
+        self.subject = subject
+        self.content = content
+        self.attachments = [path for path in attachments if path]
+        self.connections = connections
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.host = host
+        self.port = port
+        self.journal = journal
+        self.wrap_html = wrap_html
+        self.optimize_html = optimize_html
+        self.batch_size = max(1, int(batch_size))
+        self.recycle_after = recycle_after
+        self.strategy = strategy
+        self.on_progress = on_progress or _noop
+        self.on_finished = on_finished or _noop
+        self.on_error = on_error or _noop
+        self.retry_queue = retry_queue if retry_queue is not None else RetryQueue()
+        if total is None and hasattr(recipients, '__len__'):
+            total = len(recipients)
+        self.progress = ProgressTracker(total)
+        self.errors = ErrorLog()
+        self.timings = timings if timings is not None else PhaseTimings()
+        self.render_processes = render_processes
+        self._renderer = None
+        self.domains = domains
+        self.suppression = suppression
+        self.max_reconnects = 2
+        self.is_cancelled = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+    
+    @property
+    def successful_sends(self):
+        return self.progress.sent
+    
+    @property
+    def failed_sends(self):
+        return self.progress.failed
+    
+    @property
+    def skipped_sends(self):
+        return self.progress.skipped
+    
+    @property
+    def deferred_sends(self):
+        return self.progress.deferred
+    
+    def cancel(self):
+        self.is_cancelled = True
+    
+    def run(self):
+        self.progress.reset(self.progress.total)
+        self.errors = ErrorLog()
+        self._in_flight = 0
+        
+        timings = self.timings
+        
+        # Mesaj iskeleti kampanya ve hesap başına bir kez derlenir
+        started = timings.start()
+        try:
+            messages = [self.compile_message(account.email) for account in self.accounts]
+        except Exception as e:
+            self.on_error(f"Message error: {str(e)}")
+            return
+        timings.stop('compile', started)
+        
+        # İşçi süreçleri SMTP bağlantıları açılırken başlar
+        self._renderer = self._start_renderer()
+        
+        # Her hesap için SMTP sunucusuna paralel bağlantılar aç ve kimlik doğrula
+        self._lanes = {}
+        errors = []
+        for account, (render, payload) in zip(self.accounts, messages):
+            if account.per_minute is not None:
+                self.rate_limiter.configure(account.email, account.per_minute, account.burst)
+            try:
+                pool = SMTPConnectionPool(account.email, account.password, account.connections,
+                                          account.host, account.port,
+                                          recycle_after=account.recycle_after).open()
+            except Exception as e:
+                errors.append(e)
+                if len(self.accounts) > 1:
+                    self.progress.note(f"Skipping account {account.name}: {str(e)}")
+                continue
+            self._lanes[id(account)] = _Lane(account, pool, render, payload,
+                                             pool.size * self.batch_size * 2)
+        if not self._lanes:
+            self._close_renderer()
+            if all(isinstance(e, smtplib.SMTPAuthenticationError) for e in errors):
+                self.on_error("Authentication error! Please check your email or app password.")
+            else:
+                self.on_error(f"Connection error: {str(errors[-1])}")
+            return
+        self.scheduler = self._make_scheduler()
+        
+        # Alıcılar hesap başına sınırlı kuyruklar üzerinden worker'lara dağıtılır
+        workers = []
+        for lane in self._lanes.values():
+            for _ in range(lane.pool.size):
+                workers.append((lane, threading.Thread(target=self._worker, args=(lane,),
+                                                       daemon=True)))
+        for _, worker in workers:
+            worker.start()
+        feeder = None
+        if self._renderer is not None:
+            # İşlenmekte olan parçalar sınırlı bir kuyrukta sırayla bekler
+            self._rendering = queue.Queue(maxsize=self._renderer.max_pending)
+            feeder = threading.Thread(target=self._feed_rendered, daemon=True)
+            feeder.start()
+        
+        try:
+            for recipient in self.recipients:
+                if self.is_cancelled:
+                    break
+                
+                if self._already_handled(recipient):
+                    continue
+                
+                # Vakti gelen ertelenmiş alıcılar yeni gönderimlerin arasına karışır
+                self._enqueue_retries()
+                self._schedule(recipient)
+            
+            # Liste bitti: kalan ertelenmiş alıcıları zamanı geldikçe tekrar dene
+            while not self.is_cancelled:
+                self._enqueue_retries()
+                domain_delay = self._dispatch()
+                self._flush_renders()
+                with self._idle:
+                    if (self._in_flight == 0 and not len(self.retry_queue)
+                            and not self._domains_waiting()):
+                        break
+                    delay = min((d for d in (self.retry_queue.next_delay(), domain_delay)
+                                 if d is not None), default=0.5)
+                    self._idle.wait(min(delay, 0.5))
+        finally:
+            if feeder is not None:
+                self._rendering.put(None)
+                feeder.join()
+            self._close_renderer()
+            for lane, _ in workers:
+                lane.work.put(None)
+            for _, worker in workers:
+                worker.join()
+            for lane in self._lanes.values():
+                lane.pool.close()
+            if self.journal is not None:
+                self.journal.flush()
+            if self.suppression is not None:
+                self.suppression.flush()
+        
+        self.on_finished(self.progress.sent, self.progress.failed, self.errors)
+    
+    def _already_handled(self, recipient):
+        """Counts recipient as skipped if it was sent before or is suppressed"""
+        # Önceki çalıştırmada gönderilmiş alıcıları atla
+        if self.journal is not None and self.journal.is_done(recipient):
+            done = self.progress.add_skipped(recipient)
+            if self.on_progress is not _noop:
+                self.on_progress(done, f"Already sent: {recipient}")
+            return True
+        if self.suppression is not None and recipient in self.suppression:
+            done = self.progress.add_suppressed(recipient)
+            if self.on_progress is not _noop:
+                self.on_progress(done, f"Suppressed: {recipient}")
+            return True
+        return False
+    
+    def compile_message(self, sender=None):
+        """Compiles the campaign message; returns (render, payload)
+
+        render(recipient) gives the wire bytes for one recipient. Merge
+        fields ({{name}}, {{company}}...) in the subject or the body are
+        filled from the recipient's CSV columns. Without fields every
+        recipient gets the same pre-encoded body, and when batching is on
+        payload is that message addressed to undisclosed recipients, ready
+        to be sent to a whole batch at once. Otherwise payload is None.
+        The From header is sender (default: the campaign's email).
+        """
+        return build_message(sender or self.email, self.subject, self._message_content(),
+                             self._attachment_paths(), self.batch_size)
+    
+    def prepared_html(self):
+        """PreparedHTML of the body: CSS inlined and minified when optimize_html is on
+
+        The result is cached by content hash, so every lane, render worker
+        and front-end asking for it (e.g. to show the structure problems)
+        shares one transform.
+        """
+        content = process_html_content(self.content) if self.wrap_html else self.content
+        return prepare_html(content, inline=self.optimize_html, minify=self.optimize_html)
+    
+    def _message_content(self):
+        return self.prepared_html().html
+    
+    def _attachment_paths(self):
+        return [path for path in self.attachments if os.path.exists(path)]
+    
+    def _start_renderer(self):
+        """RenderPool for personalized mail when render_processes is set, else None"""
+        if not self.render_processes:
+            return None
+        content = self._message_content()
+        # Alan içermeyen mesaj zaten önceden kodlanmış parçaların birleştirilmesidir
+        if CompiledTemplate(content).is_static and CompiledTemplate(self.subject).is_static:
+            return None
+        return RenderPool(self.subject, content, self._attachment_paths(),
+                          self.render_processes).start()
+    
+    def _close_renderer(self):
+        renderer, self._renderer = self._renderer, None
+        if renderer is not None:
+            renderer.close()
+    
+    def _make_scheduler(self):
+        """AccountScheduler over the accounts whose sessions opened"""
+        return AccountScheduler(
+            [lane.account for lane in self._lanes.values()], self.strategy,
+            load=lambda account: self._lanes[id(account)].pending,
+            paused_for=lambda account: self.rate_limiter.paused_for(account.email))
+    
+    def _enqueue(self, recipient):
+        """Queues recipient for the account the scheduler picks"""
+        account = self.scheduler.pick()
+        if account is None:
+            self._failed(None, recipient, NoAccountError("No sender account left to send with"))
+            return
+        lane = self._lanes[id(account)]
+        with self._lock:
+            self._in_flight += 1
+            lane.pending += 1
+        if self._renderer is not None:
+            # Alıcılar parça parça işçi süreçlerine gider
+            lane.unrendered.append(recipient)
+            if len(lane.unrendered) >= self._renderer.chunk_size:
+                self._submit_renders(lane)
+            return
+        started = self.timings.start()
+        lane.work.put(recipient)
+        self.timings.stop('enqueue', started)
+    
+    def _enqueue_retries(self):
+        for recipient in self.retry_queue.pop_due():
+            self.progress.retrying()
+            self._schedule(recipient)
+    
+    def _schedule(self, recipient):
+        """Queues recipient, through the domain scheduler when there is one"""
+        if self.domains is None:
+            self._enqueue(recipient)
+            return
+        self.domains.add(recipient)
+        self._dispatch(wait=self.domains.is_full())
+    
+    def _domains_waiting(self):
+        return self.domains is not None and len(self.domains) > 0
+    
+    def _dispatch(self, wait=False):
+        """Moves the recipients whose domain has room on to the accounts
+
+        With wait, blocks until the look-ahead buffer has room again, so the
+        list is read no further ahead than that. Returns the seconds until a
+        rate-limited domain may send again (None if none is waiting on one).
+        """
+        domains = self.domains
+        delay = None
+        while domains is not None and not self.is_cancelled:
+            recipient, delay = domains.take()
+            if recipient is None:
+                if not wait or not domains.is_full():
+                    break
+                with self._idle:
+                    # Kilit altında tekrar bak: arada biten gönderimin haberi kaçmasın
+                    recipient, delay = domains.take()
+                    if recipient is None:
+                        self._idle.wait(0.5 if delay is None else min(delay, 0.5))
+                        continue
+            self._enqueue(recipient)
+        return delay
+    
+    def _settle(self, lane, batch):
+        """batch is done with: frees its in-flight and per-domain slots"""
+        with self._idle:
+            self._in_flight -= len(batch)
+            lane.pending -= len(batch)
+            if self.domains is not None:
+                self.domains.release(batch)
+            self._idle.notify()
+    
+    def _submit_renders(self, lane):
+        chunk, lane.unrendered = lane.unrendered, []
+        future = self._renderer.submit(lane.account.email, chunk)
+        # Kuyruk doluysa üretici bekler: işlenmiş mesajlar bellekte birikmez
+        started = self.timings.start()
+        self._rendering.put((lane, chunk, future))
+        self.timings.stop('enqueue', started)
+    
+    def _flush_renders(self):
+        """Sends the partly filled chunks of every account to the render pool"""
+        if self._renderer is None:
+            return
+        for lane in self._lanes.values():
+            if lane.unrendered:
+                self._submit_renders(lane)
+    
+    def _feed_rendered(self):
+        """Moves rendered chunks, in submission order, into the account queues"""
+        timings = self.timings
+        while True:
+            item = self._rendering.get()
+            if item is None:
+                return
+            lane, chunk, future = item
+            started = timings.start()
+            try:
+                if self.is_cancelled:
+                    future.cancel()
+                    raise RuntimeError("Campaign cancelled")
+                messages = future.result()
+            except Exception as e:
+                timings.stop('render_wait', started)
+                for recipient in chunk:
+                    if not self.is_cancelled:
+                        self._failed(lane.account, recipient, e)
+                self._settle(lane, chunk)
+                continue
+            timings.stop('render_wait', started)
+            for recipient, data in zip(chunk, messages):
+                lane.work.put(Rendered(recipient, data))
+    
+    def _worker(self, lane):
+        """Sends queued recipients over one pooled SMTP session of lane's account"""
+        session = lane.pool.acquire()
+        try:
+            stop = False
+            while not stop:
+                recipient = lane.work.get()
+                if recipient is None:
+                    break
+                data = None
+                if isinstance(recipient, Rendered):
+                    recipient, data = recipient
+                
+                # Aynı mesaj birden fazla alıcıya tek işlemde (Bcc) gönderilebilir
+                batch = [recipient]
+                while lane.payload is not None and len(batch) < self.batch_size:
+                    try:
+                        recipient = lane.work.get_nowait()
+                    except queue.Empty:
+                        break
+                    if recipient is None:
+                        stop = True
+                        break
+                    batch.append(recipient)
+                try:
+                    self._deliver(lane, session, batch, data)
+                except Exception as e:
+                    self._worker_error(batch, e)
+                finally:
+                    self._settle(lane, batch)
+        finally:
+            lane.pool.release(session)
+    
+    def _worker_error(self, batch, error):
+        """Records an error _deliver let through (journal or suppression list write)
+
+        The worker keeps draining its queue afterwards: a dead worker would
+        leave the producer blocked on the lane's bounded queue.
+        """
+        for recipient in batch:
+            self.errors.add(recipient, error)
+        self.progress.note(f"Error while recording results: {str(error)}")
+    
+    def _deliver(self, lane, session, batch, data=None):
+        """Sends batch over session; data is the message already rendered for batch[0]"""
+        if self.is_cancelled:
+            return
+        account = lane.account
+        
+        # Hesap kısıtlandıysa bekleme, alıcıları gönderebilecek başka bir hesaba devret
+        if self.rate_limiter.paused_for(account.email) > 0 and self._hand_over(lane, batch):
+            return
+        
+        # Hız sınırı: her alıcı için hesabın token kovasından izin al
+        timings = self.timings
+        started = timings.start()
+        allowed = all(self.rate_limiter.wait(account.email, lambda: self.is_cancelled)
+                      for _ in batch)
+        timings.stop('rate_wait', started)
+        if not allowed:
+            return
+        
+        try:
+            # Oturumu denetle: gerekirse yenile ya da yeniden bağlan
+            started = timings.start()
+            session.ensure()
+            timings.stop('session', started)
+            if len(batch) == 1:
+                # Maili gönder
+                self._send(session, account.email, batch[0], lane.render, data)
+                failures = {}
+            else:
+                failures = self._send_batch(session, account.email, batch, lane.payload)
+        except smtplib.SMTPAuthenticationError as e:
+            # Oturum yenilenirken giriş reddedildi: hesap bu kampanyada bir daha kullanılmaz
+            self.scheduler.disable(account)
+            self.progress.note(f"Account {account.name} disabled: {str(e)}")
+            if self._hand_over(lane, batch):
+                return
+            failures = dict((recipient, e) for recipient in batch)
+        except Exception as e:
+            failures = dict((recipient, e) for recipient in batch)
+        
+        for recipient in batch:
+            if recipient in failures:
+                self._failed(account, recipient, failures[recipient])
+            else:
+                self._sent(account, recipient)
+    
+    def _hand_over(self, lane, batch):
+        """Moves batch to the other accounts; False if none of them can take it
+
+        The recipients go through the retry queue without using up an
+        attempt, so the scheduler places them like any other due retry.
+        """
+        disabled = lane.account not in self.scheduler.active()
+        target = self.scheduler.pick(exclude=lane.account)
+        if target is None:
+            return False
+        if not disabled and self.rate_limiter.paused_for(target.email) > 0:
+            return False
+        for recipient in batch:
+            self.retry_queue.requeue(recipient)
+            self.progress.add_moved(recipient)
+        return True
+    
+    def _sent(self, account, recipient):
+        self.retry_queue.forget(recipient)
+        self.rate_limiter.record_success(account.email)
+        if self.domains is not None:
+            self.domains.record_success(recipient)
+        if self.journal is not None:
+            started = self.timings.start()
+            self.journal.record(recipient, SENT)
+            self.timings.stop('journal', started)
+        done = self.progress.add_sent(recipient)
+        
+        # Progress güncelle (metin yalnızca dinleyen varsa hazırlanır)
+        if self.on_progress is not _noop:
+            rate = self.rate_limiter.effective_rate(account.email)
+            self.on_progress(done, f"Sent: {recipient} ({rate} emails/min)")
+    
+    def _failed(self, account, recipient, error):
+        code = reply_code(error)
+        if code in THROTTLE_CODES:
+            if self.domains is not None and isinstance(error, smtplib.SMTPRecipientsRefused):
+                # RCPT TO'ya gelen yavaşla yanıtı alıcının alan adına aittir, hesaba değil
+                self.domains.record_throttle(recipient, code)
+            elif account is not None:
+                self.rate_limiter.record_throttle(account.email, code)
+        
+        # Geçici hatalar (4xx, kopan bağlantı) daha sonra tekrar denenir
+        if classify(error) == TRANSIENT and not self.is_cancelled:
+            delay = self.retry_queue.defer(recipient)
+            if delay is not None:
+                done = self.progress.add_deferred(recipient, delay)
+                if self.journal is not None:
+                    self.journal.record(recipient, DEFERRED, str(error))
+                if self.on_progress is not _noop:
+                    self.on_progress(done, f"Deferred: {recipient} (retry in {delay:.0f}s)")
+                return
+        
+        self.errors.add(recipient, error)
+        self.progress.add_failed(recipient)
+        if self.journal is not None:
+            self.journal.record(recipient, FAILED, str(error))
+        # Adresin kendisi reddedildiyse bir daha gönderilmez
+        if self.suppression is not None and is_hard_bounce(error):
+            code, _, message = describe(error)
+            self.suppression.add(recipient, BOUNCED, f"{code} {message}")
+    
+    def _send(self, session, sender, recipient, render, data=None):
+        """Sends one message over session, rendering it unless data is given
+
+        A dropped connection (or a 421 reply, after which the server hangs
+        up) is replaced with a freshly authenticated one and the message is
+        sent again.
+        """
+        timings = self.timings
+        if data is None:
+            started = timings.start()
+            data = render(recipient)
+            timings.stop('render', started)
+        reconnects = 0
+        while True:
+            started = timings.start()
+            try:
+                if isinstance(data, StreamedMessage):
+                    # Büyük ekler DATA sırasında diskten parça parça akıtılır
+                    send_batch(session.server, sender, [recipient], data)
+                else:
+                    session.server.sendmail(sender, recipient, data)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+                timings.stop('smtp', started)
+                if reply_code(e) not in (None, 421):
+                    raise
+                reconnects += 1
+                if reconnects > self.max_reconnects:
+                    raise
+                started = timings.start()
+                session.reconnect()
+                timings.stop('reconnect', started)
+                continue
+            timings.stop('smtp', started)
+            session.mark_sent()
+            return
+    
+    def _send_batch(self, session, sender, batch, payload):
+        """Sends payload to batch in one transaction; returns {recipient: error}
+
+        Recipients refused at RCPT TO are reported individually, so each of
+        them can be retried or failed on its own.
+        """
+        timings = self.timings
+        reconnects = 0
+        while True:
+            started = timings.start()
+            try:
+                refused = send_batch(session.server, sender, batch, payload)
+            except smtplib.SMTPRecipientsRefused as e:
+                refused = e.recipients
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+                timings.stop('smtp', started)
+                if reply_code(e) not in (None, 421):
+                    raise
+                reconnects += 1
+                if reconnects > self.max_reconnects:
+                    raise
+                started = timings.start()
+                session.reconnect()
+                timings.stop('reconnect', started)
+                continue
+            timings.stop('smtp', started)
+            session.mark_sent()
+            return dict((recipient, smtplib.SMTPRecipientsRefused({recipient: (code, resp)}))
+                        for recipient, (code, resp) in refused.items())
+
+
+_SPACES_RE = re.compile(r' {2,}')
+
+
+def text_to_html(text):
+    """Metni HTML formatına çevirir, satır sonlarını ve boşlukları korur"""
+    # HTML karakterlerini escape et
+    escaped_text = html.escape(text)
+    
+    # Satır sonlarını <br> ile değiştir
+    html_text = escaped_text.replace('\n', '<br>\n')
+    
+    # Çoklu boşlukları korumak için &nbsp; kullan
+    # 2 veya daha fazla boşluğu &nbsp; ile değiştir
+    html_text = _SPACES_RE.sub(lambda m: '&nbsp;' * len(m.group()), html_text)
+    
+    # Tab karakterlerini 4 boşlukla değiştir
+    html_text = html_text.replace('\t', '&nbsp;&nbsp;&nbsp;&nbsp;')
+    
+    # HTML yapısı ile sarmayla
+    html_content = f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            font-size: 14px;
+            line-height: 1.8;
+            color: #333;
+            margin: 20px;
+            background-color: #ffffff;
+        }}
+        .content {{
+            white-space: pre-wrap;
+            word-wrap: break-word;
+            max-width: 100%;
+        }}
+        p {{
+            margin: 0 0 10px 0;
+        }}
+        .signature {{
+            margin-top: 20px;
+            border-top: 1px solid #eee;
+            padding-top: 15px;
+        }}
+    </style>
+</head>
+<body>
+    <div class="content">{html_text}</div>
+</body>
+</html>"""
+    
+    return html_content
+
+def process_html_content(content):
+    """HTML içeriğini işler"""
+    # Eğer tam HTML yapısı yoksa, temel yapıyı ekle
+    if '<html>' not in content.lower() and '<body>' not in content.lower():
+        processed_html = f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            font-size: 14px;
+            line-height: 1.6;
+            color: #333;
+            margin: 20px;
+            background-color: #ffffff;
+        }}
+        .container {{
+            max-width: 600px;
+            margin: 0 auto;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        {content}
+    </div>
+</body>
+</html>"""
+    else:
+        processed_html = content
+    
+    return processed_html
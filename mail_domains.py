@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Per-recipient-domain concurrency and rate caps, interleaving the domains of a list"""
+import collections
+import threading
+import time
+
+from mail_ratelimit import RateLimiter, THROTTLE_CODES
+
+# Bir alan adına aynı anda gönderilmekte olan en fazla mesaj
+DEFAULT_DOMAIN_CONCURRENCY = 4
+# Alan adlarını karıştırabilmek için listeden önceden okunan alıcı sayısı
+DEFAULT_LOOKAHEAD = 10000
+
+
+def recipient_domain(recipient):
+    return str(recipient).rpartition('@')[2].lower()
+
+
+def parse_domain_limits(specs):
+    """{domain: (concurrency, per_minute or None)} from "gmail.com=4/600" style specs
+
+    specs is an iterable of specs or one comma separated string; the
+    per-minute part is optional ("outlook.com=2").
+    """
+    if isinstance(specs, str):
+        specs = specs.split(',')
+    limits = {}
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        domain, sep, value = spec.partition('=')
+        concurrency, _, per_minute = value.partition('/')
+        try:
+            if not sep or not domain.strip():
+                raise ValueError()
+            limits[domain.strip().lower()] = (int(concurrency),
+                                              float(per_minute) if per_minute else None)
+        except ValueError:
+            raise ValueError(f"Invalid domain limit {spec!r} (expected domain=N or domain=N/PER_MINUTE)")
+    return limits
+
+
+class DomainScheduler:
+    """Look-ahead buffer that releases recipients domain by domain, within caps
+
+    Lists are often dominated by one or two webmail domains; sent in input
+    order they reach those receivers in bursts and get throttled while the
+    other domains wait. add() buckets up to lookahead recipients by domain
+    and take() hands them out round-robin across the domains, skipping a
+    domain while it has concurrency messages in progress (until release())
+    or its per_minute rate is used up. limits overrides both per domain.
+
+    A throttling reply to one of a domain's recipients (record_throttle())
+    pauses that domain for backoff seconds, doubling on repeats, and halves
+    its rate, just like RateLimiter does for sender accounts; successes
+    restore it.
+    """
+
+    def __init__(self, concurrency=DEFAULT_DOMAIN_CONCURRENCY, per_minute=None, limits=None,
+                 lookahead=DEFAULT_LOOKAHEAD, backoff=30.0, clock=time.monotonic):
+        self.concurrency = max(1, int(concurrency))
+        self.per_minute = per_minute or None
+        self.lookahead = max(1, int(lookahead))
+        self.limits = dict(limits or {})
+        # Hız sınırı olmayan alan adları için yalnızca geri çekilme süresi kullanılır
+        self.rates = RateLimiter(per_minute=self.per_minute or 0, burst=self.concurrency,
+                                 backoff=backoff, clock=clock)
+        for domain, (_, domain_per_minute) in self.limits.items():
+            if domain_per_minute:
+                self.rates.configure(domain, domain_per_minute, self.concurrency)
+        self._queues = collections.OrderedDict()
+        self._active = collections.Counter()
+        self._buffered = 0
+        # Yavaşla yanıtı almış alan adları; hızları başarılı gönderimlerle geri gelir
+        self._throttled = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._buffered
+
+    def is_full(self):
+        return self._buffered >= self.lookahead
+
+    def limit(self, domain):
+        """(concurrency, per_minute or None) in force for domain"""
+        if domain in self.limits:
+            concurrency, per_minute = self.limits[domain]
+            return max(1, concurrency), per_minute or self.per_minute
+        return self.concurrency, self.per_minute
+
+    def add(self, recipient):
+        domain = recipient_domain(recipient)
+        with self._lock:
+            queue = self._queues.get(domain)
+            if queue is None:
+                queue = self._queues[domain] = collections.deque()
+            queue.append(recipient)
+            self._buffered += 1
+
+    def take(self):
+        """(recipient, None) of the next domain with room, else (None, delay)
+
+        delay is the seconds until a rate-limited or paused domain may send
+        again, or None when every waiting domain is only at its concurrency
+        cap (a release() frees it).
+        """
+        delay = None
+        with self._lock:
+            for domain, queue in self._queues.items():
+                concurrency, per_minute = self.limit(domain)
+                if self._active[domain] >= concurrency:
+                    continue
+                if per_minute:
+                    wait = self.rates.reserve(domain)
+                else:
+                    wait = self.rates.paused_for(domain)
+                if wait > 0:
+                    delay = wait if delay is None else min(delay, wait)
+                    continue
+                recipient = queue.popleft()
+                self._buffered -= 1
+                self._active[domain] += 1
+                # Sıradaki alıcı başka bir alan adından gelsin
+                if queue:
+                    self._queues.move_to_end(domain)
+                else:
+                    del self._queues[domain]
+                return recipient, None
+        return None, delay
+
+    def release(self, recipients):
+        """recipients (handed out by take()) are no longer in progress"""
+        with self._lock:
+            for recipient in recipients:
+                domain = recipient_domain(recipient)
+                self._active[domain] -= 1
+                if self._active[domain] <= 0:
+                    del self._active[domain]
+
+    def record_success(self, recipient):
+        domain = recipient_domain(recipient)
+        if domain in self._throttled:
+            self.rates.record_success(domain)
+
+    def record_throttle(self, recipient, code):
+        if code in THROTTLE_CODES:
+            domain = recipient_domain(recipient)
+            self._throttled.add(domain)
+            self.rates.record_throttle(domain, code)
+
+    def snapshot(self):
+        """{domain: (in progress, waiting)} for the domains with either"""
+        with self._lock:
+            domains = set(self._active) | set(self._queues)
+            return dict((domain, (self._active.get(domain, 0),
+                                  len(self._queues.get(domain, ()))))
+                        for domain in domains)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Structured, bounded record of the recipients a campaign could not reach"""
+import collections
+import csv
+import json
+import smtplib
+import tempfile
+import threading
+
+from mail_pool import reply_code
+
+# Bellekte tutulan kayıt sayısı; fazlası geçici dosyaya yazılır
+DEFAULT_MAX_RECORDS = 1000
+MAX_MESSAGE = 300
+SPILL_CHUNK = 1000
+
+FIELDS = ('recipient', 'code', 'kind', 'message')
+
+FailureRecord = collections.namedtuple('FailureRecord', FIELDS)
+
+
+def describe(error):
+    """Returns (reply code or None, exception class name, short message)"""
+    code = reply_code(error)
+    message = None
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        message = next(iter(error.recipients.values()))[1]
+    elif isinstance(error, smtplib.SMTPResponseException):
+        message = error.smtp_error
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', 'replace')
+    if not message:
+        message = str(error)
+    message = ' '.join(message.split())
+    return code, type(error).__name__, message[:MAX_MESSAGE]
+
+
+class ErrorLog:
+    """Per-recipient failure records plus counts by (code, error type)
+
+    Only the newest max_records records stay in memory; older ones are
+    appended to an anonymous temporary file (removed on close or exit), so
+    memory stays flat for campaigns with any number of failures while
+    nothing is thrown away. Iterating yields every record in arrival order.
+    """
+
+    def __init__(self, max_records=DEFAULT_MAX_RECORDS):
+        self.max_records = max(1, int(max_records))
+        self._records = []
+        self._counts = collections.Counter()
+        self._samples = {}
+        self._spill = None
+        self._spilled = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return self._spilled + len(self._records)
+
+    def __iter__(self):
+        with self._lock:
+            records = list(self._records)
+            spilled = self._spilled
+        offset = 0
+        while spilled:
+            # Diskteki kayıtlar parça parça okunur; yazma konumu her seferinde geri alınır
+            with self._lock:
+                self._spill.seek(offset)
+                lines = [self._spill.readline() for _ in range(min(spilled, SPILL_CHUNK))]
+                offset = self._spill.tell()
+                self._spill.seek(0, 2)
+            spilled -= len(lines)
+            for line in lines:
+                yield FailureRecord(*json.loads(line))
+        for record in records:
+            yield record
+
+    def add(self, recipient, error):
+        code, kind, message = describe(error)
+        record = FailureRecord(str(recipient), code, kind, message)
+        with self._lock:
+            key = (code, kind)
+            self._counts[key] += 1
+            self._samples.setdefault(key, message)
+            self._records.append(record)
+            if len(self._records) >= self.max_records:
+                self._spill_locked()
+        return record
+
+    def _spill_locked(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix='mail_errors_')
+        self._spill.write(b''.join(
+            json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+            for record in self._records))
+        self._spilled += len(self._records)
+        self._records = []
+
+    def groups(self):
+        """[(code, kind, count, sample message)], most frequent first"""
+        with self._lock:
+            return [(code, kind, count, self._samples[(code, kind)])
+                    for (code, kind), count in self._counts.most_common()]
+
+    def summary(self, limit=10):
+        """Human readable grouping, one line per error type"""
+        groups = self.groups()
+        lines = []
+        for code, kind, count, sample in groups[:limit]:
+            label = '%s %s' % (code, kind) if code is not None else kind
+            lines.append('%d × %s: %s' % (count, label, sample))
+        if len(groups) > limit:
+            rest = sum(count for _, _, count, _ in groups[limit:])
+            lines.append('%d more in %d other groups' % (rest, len(groups) - limit))
+        return '\n'.join(lines)
+
+    def export_csv(self, path):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for r in self:
+                writer.writerow((r.recipient, '' if r.code is None else r.code, r.kind, r.message))
+
+    def export_json(self, path):
+        """Writes {"groups": [...], "failures": [...]}, streaming the records"""
+        with open(path, 'w', encoding='utf-8') as f:
+            groups = [dict(code=code, kind=kind, count=count, sample=sample)
+                      for code, kind, count, sample in self.groups()]
+            f.write('{"groups": %s, "failures": [' % json.dumps(groups, ensure_ascii=False))
+            for i, r in enumerate(self):
+                f.write(',\n' if i else '\n')
+                f.write(json.dumps(r._asdict(), ensure_ascii=False))
+            f.write('\n]}\n')
+
+    def export(self, path):
+        """Picks CSV or JSON from the file extension"""
+        if path.lower().endswith('.json'):
+            self.export_json(path)
+        else:
+            self.export_csv(path)
+
+    def close(self):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            self._records = []
+            self._spilled = 0
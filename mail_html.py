@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""HTML body preprocessing: <style> rules inlined, whitespace minified, structure checked"""
+import collections
+import hashlib
+import re
+import threading
+from html.parser import HTMLParser
+
+# Kaç farklı içeriğin işlenmiş hali bellekte tutulur
+CACHE_SIZE = 32
+# Doğrulama raporunda gösterilen en fazla sorun sayısı
+MAX_PROBLEMS = 20
+
+PreparedHTML = collections.namedtuple('PreparedHTML', ('html', 'problems', 'original_size'))
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_STYLE_BLOCK_RE = re.compile(r'<style\b([^>]*)>(.*?)</style\s*>', re.S | re.I)
+# Yorumlar, etiketler ve aradaki metin; öznitelik değerlerindeki '>' etiketi bitirmez
+_TOKEN_RE = re.compile(
+    r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<![^>]*>|<\?[^>]*>'
+    r'|<(/?)([A-Za-z][\w:-]*)((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>', re.S)
+_ATTR_RE = re.compile(r'([^\s"\'=<>/]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s"\'>]+))?')
+_SIMPLE_SELECTOR_RE = re.compile(r'^([A-Za-z][\w-]*|\*)?((?:[.#][\w-]+)*)$')
+_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*|(:)\s+')
+_PRE_RULE_RE = re.compile(r'white-space\s*:\s*(?:pre|break-spaces)', re.I)
+
+# İçeriği olduğu gibi korunan elemanlar
+PRESERVE_TAGS = frozenset(('pre', 'textarea', 'script', 'style'))
+# İçeriği etiket olarak ayrıştırılmayan elemanlar
+RAW_TEXT_TAGS = frozenset(('textarea', 'script', 'style'))
+VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                       'meta', 'param', 'source', 'track', 'wbr'))
+# Kapanış etiketi yazılmayabilen elemanlar (HTML5 kuralları)
+OPTIONAL_END_TAGS = frozenset(('p', 'li', 'dt', 'dd', 'tr', 'td', 'th', 'thead', 'tbody',
+                               'tfoot', 'option', 'colgroup', 'caption', 'head', 'body', 'html'))
+# Çevresindeki boşluk görünmeyen blok elemanlar
+BLOCK_TAGS = frozenset(('html', 'head', 'body', 'title', 'meta', 'link', 'style', 'script',
+                        'div', 'p', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th',
+                        'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br', 'hr',
+                        'center', 'blockquote', 'section', 'header', 'footer', 'article',
+                        'nav', 'dl', 'dt', 'dd', 'form', 'caption', 'colgroup', 'col'))
+
+
+def _attributes(text):
+    """[(name, raw value or None)] of a start tag's attribute text"""
+    return [(m.group(1), m.group(2)) for m in _ATTR_RE.finditer(text)]
+
+
+def _unquote(value):
+    if value and value[0] in '"\'' and value[-1] == value[0]:
+        return value[1:-1]
+    return value or ''
+
+
+def _declarations(text):
+    """Ordered {property: value} of a CSS declaration block"""
+    result = collections.OrderedDict()
+    for declaration in text.split(';'):
+        name, sep, value = declaration.partition(':')
+        name = name.strip().lower()
+        value = _SPACE_RE.sub(' ', value).strip()
+        if sep and name and value:
+            result.pop(name, None)
+            result[name] = value
+    return result
+
+
+def _split_rules(css):
+    """Top-level (prelude, body) pairs of a stylesheet; at-rules keep their whole body"""
+    rules = []
+    depth = 0
+    start = 0
+    prelude = None
+    for i, ch in enumerate(css):
+        if ch == '{':
+            if depth == 0:
+                prelude = css[start:i].strip()
+                start = i + 1
+            depth += 1
+        elif ch == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                rules.append((prelude, css[start:i]))
+                start = i + 1
+        elif ch == ';' and depth == 0:
+            # @import, @charset gibi gövdesiz kurallar
+            statement = css[start:i].strip()
+            if statement:
+                rules.append((statement, None))
+            start = i + 1
+    return rules
+
+
+class _Rule:
+    """One inlinable simple selector with its declarations"""
+    __slots__ = ('tag', 'ids', 'classes', 'specificity', 'order', 'declarations')
+
+    def __init__(self, selector, order, declarations):
+        m = _SIMPLE_SELECTOR_RE.match(selector)
+        tag, rest = m.group(1), m.group(2)
+        self.tag = tag.lower() if tag and tag != '*' else None
+        parts = re.findall(r'[.#][\w-]+', rest)
+        self.ids = [p[1:] for p in parts if p[0] == '#']
+        self.classes = [p[1:] for p in parts if p[0] == '.']
+        self.specificity = (len(self.ids), len(self.classes), 1 if self.tag else 0)
+        self.order = order
+        self.declarations = declarations
+
+    def matches(self, tag, element_id, classes):
+        if self.tag is not None and self.tag != tag:
+            return False
+        if self.ids and self.ids != [element_id]:
+            return False
+        return all(c in classes for c in self.classes)
+
+
+def _parse_stylesheet(css, rules):
+    """Appends css's inlinable rules to rules; returns the css that must stay in <style>"""
+    kept = []
+    for prelude, body in _split_rules(_CSS_COMMENT_RE.sub('', css)):
+        if body is None:
+            kept.append(prelude + ';')
+        elif prelude.startswith('@'):
+            kept.append('%s{%s}' % (prelude, body))
+        else:
+            declarations = _declarations(body)
+            if not declarations:
+                continue
+            rest = []
+            for selector in prelude.split(','):
+                selector = selector.strip()
+                if selector and _SIMPLE_SELECTOR_RE.match(selector):
+                    rules.append(_Rule(selector, len(rules), declarations))
+                elif selector:
+                    # :hover, alt seçiciler vb. satır içine taşınamaz
+                    rest.append(selector)
+            if rest:
+                kept.append('%s{%s}' % (','.join(rest), body))
+    return '\n'.join(kept)
+
+
+def _format_style(declarations):
+    # Öznitelik çift tırnakla yazılır; değerlerdeki çift tırnak tek tırnağa çevrilir
+    return ';'.join('%s:%s' % (name, value.replace('"', "'"))
+                    for name, value in declarations.items())
+
+
+def inline_css(content):
+    """Moves <style> rules with simple selectors into each element's style attribute
+
+    Many email clients drop <style> blocks, so rules on tags, classes and
+    ids (body, .container, td.cell, #footer) are written onto the matching
+    elements. Rules the element already sets inline keep the inline value.
+    At-rules (@media, @font-face) and selectors that cannot be inlined
+    (pseudo-classes, combinators) stay in the <style> block.
+    """
+    rules = []
+
+    def _strip_style(m):
+        kept = _parse_stylesheet(m.group(2), rules)
+        return '<style%s>%s</style>' % (m.group(1), kept) if kept.strip() else ''
+    content = _STYLE_BLOCK_RE.sub(_strip_style, content)
+    if not rules:
+        return content
+    rules.sort(key=lambda rule: (rule.specificity, rule.order))
+
+    def _apply(m):
+        closing, tag, attrs = m.group(1), m.group(2), m.group(3)
+        if closing or tag is None:
+            return m.group(0)
+        attributes = _attributes(attrs)
+        values = dict((name.lower(), _unquote(value)) for name, value in attributes)
+        classes = values.get('class', '').split()
+        matched = [rule for rule in rules
+                   if rule.matches(tag.lower(), values.get('id'), classes)]
+        if not matched:
+            return m.group(0)
+        style = collections.OrderedDict()
+        for rule in matched:
+            for name, value in rule.declarations.items():
+                style.pop(name, None)
+                style[name] = value
+        for name, value in _declarations(values.get('style', '')).items():
+            style.pop(name, None)
+            style[name] = value
+        self_closing = attrs.rstrip().endswith('/')
+        parts = ['<', tag]
+        for name, value in attributes:
+            if name.lower() == 'style':
+                continue
+            parts.append(' %s=%s' % (name, value) if value is not None else ' ' + name)
+        parts.append(' style="%s"' % _format_style(style))
+        parts.append(' />' if self_closing else '>')
+        return ''.join(parts)
+    return _TOKEN_RE.sub(_apply, content)
+
+
+def minify_css(css):
+    css = _CSS_COMMENT_RE.sub('', css)
+    css = _SPACE_RE.sub(' ', css)
+    return _CSS_PUNCT_RE.sub(lambda m: m.group(1) or m.group(2), css).replace(';}', '}').strip()
+
+
+def _preserves_whitespace(tag, attrs, inherited):
+    """Whether whitespace is significant inside the element; white-space is inherited"""
+    if tag in PRESERVE_TAGS:
+        return True
+    style = dict((name.lower(), _unquote(value)) for name, value in _attributes(attrs))
+    value = _declarations(style.get('style', '')).get('white-space', '').lower()
+    if not value or value.split()[0] in ('inherit', 'unset'):
+        return inherited
+    # pre / pre-wrap / pre-line / break-spaces
+    return value.startswith(('pre', 'break-spaces'))
+
+
+def minify_html(content):
+    """Collapses whitespace and drops comments without changing what is displayed
+
+    Runs of whitespace become one space (a newline when the run had one,
+    to keep lines short), and whitespace between block-level tags goes
+    away. <pre>, <textarea>, scripts and elements styled white-space: pre*
+    (and everything inside them) are left untouched; conditional comments
+    (<!--[if mso]>) are kept. When a <style> rule left after inlining sets
+    white-space: pre*, no text is collapsed, since any element may match it.
+    """
+    out = []
+    # Açık elemanlar: (etiket, boşluk korunuyor mu); white-space alt elemanlara geçer
+    stack = []
+    pos = 0
+    previous_block = True
+    keep_text = any(_PRE_RULE_RE.search(m.group(2)) for m in _STYLE_BLOCK_RE.finditer(content))
+
+    def _preserving():
+        return bool(stack) and stack[-1][1]
+
+    def _text(text, next_block):
+        if keep_text or _preserving():
+            return text
+        collapsed = _SPACE_RE.sub(lambda m: '\n' if '\n' in m.group() else ' ', text)
+        if previous_block:
+            collapsed = collapsed.lstrip()
+        if next_block:
+            collapsed = collapsed.rstrip()
+        return collapsed
+
+    for m in _TOKEN_RE.finditer(content):
+        if m.start() < pos:
+            # <script>, <style>, <textarea> içeriği zaten yazıldı
+            continue
+        token = m.group(0)
+        closing, tag = m.group(1), m.group(2)
+        name = tag.lower() if tag else None
+        is_comment = token.startswith('<!--')
+        preserving = _preserving()
+        if is_comment and not preserving and not token.startswith('<!--[if') \
+                and not token.startswith('<!--<![endif'):
+            out.append(_text(content[pos:m.start()], False))
+            pos = m.end()
+            continue
+        is_block = name in BLOCK_TAGS if name else not is_comment
+        out.append(_text(content[pos:m.start()], is_block))
+        pos = m.end()
+        if name is None:
+            out.append(token)
+        elif closing:
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == name:
+                    del stack[i:]
+                    break
+            out.append(token)
+        else:
+            attrs = m.group(3)
+            if preserving:
+                out.append(token)
+            else:
+                out.append('<%s%s>' % (tag, _SPACE_RE.sub(' ', attrs)) if attrs.strip()
+                           else '<%s>' % tag)
+            if name in RAW_TEXT_TAGS:
+                # İçerikteki '<' etiket sayılmaz; kapanışa kadar olduğu gibi yazılır
+                end = content.lower().find('</' + name, m.end())
+                if end > 0:
+                    raw = content[m.end():end]
+                    out.append(minify_css(raw) if name == 'style' and not preserving else raw)
+                    pos = end
+            elif name not in VOID_TAGS and not attrs.rstrip().endswith('/'):
+                if name in OPTIONAL_END_TAGS and stack and stack[-1][0] == name:
+                    # <p>...<p>: önceki kendiliğinden kapanır
+                    stack.pop()
+                stack.append((name, _preserves_whitespace(name, attrs, _preserving())))
+        previous_block = is_block
+    out.append(_text(content[pos:], True))
+    return ''.join(out).strip()
+
+
+class _StructureChecker(HTMLParser):
+    """Finds tags closed without being opened and tags left open"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.problems = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, self.getpos()[0]))
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                for open_tag, line in self.stack[i + 1:]:
+                    if open_tag not in OPTIONAL_END_TAGS:
+                        self.problems.append('line %d: <%s> is not closed before </%s>'
+                                             % (line, open_tag, tag))
+                del self.stack[i:]
+                return
+        self.problems.append('line %d: </%s> has no matching <%s>'
+                             % (self.getpos()[0], tag, tag))
+
+    def finish(self):
+        self.close()
+        for tag, line in self.stack:
+            if tag not in OPTIONAL_END_TAGS:
+                self.problems.append('line %d: <%s> is never closed' % (line, tag))
+        return self.problems
+
+
+def validate_html(content):
+    """Human-readable structure problems of content (empty list when none)"""
+    problems = _StructureChecker()
+    problems.feed(content)
+    problems = problems.finish()
+    if content.count('{{') != content.count('}}'):
+        problems.append('unbalanced merge field braces ({{ and }})')
+    if len(problems) > MAX_PROBLEMS:
+        problems = problems[:MAX_PROBLEMS] + ['... and %d more' % (len(problems) - MAX_PROBLEMS)]
+    return problems
+
+
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def prepare_html(content, inline=True, minify=True):
+    """PreparedHTML of content: CSS inlined, minified and checked, cached by content hash
+
+    The send loop compiles the message once per sender and the render pool
+    once per worker, so the result is memoized on a hash of the content
+    and the options: each campaign pays for the transform once.
+    """
+    key = (hashlib.sha1(content.encode('utf-8')).digest(), inline, minify)
+    with _cache_lock:
+        prepared = _cache.get(key)
+        if prepared is not None:
+            _cache.move_to_end(key)
+            return prepared
+    result = content
+    if inline:
+        result = inline_css(result)
+    if minify:
+        result = minify_html(result)
+    prepared = PreparedHTML(result, validate_html(content), len(content.encode('utf-8')))
+    with _cache_lock:
+        _cache[key] = prepared
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return prepared
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Crash-safe record of which recipients a campaign has already reached"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+DEFAULT_JOURNAL = 'campaign_journal.db'
+SENT = 'sent'
+FAILED = 'failed'
+DEFERRED = 'deferred'
+# Kabul edilip sonradan geri dönen (DSN) gönderim
+BOUNCED = 'bounced'
+
+
+def campaign_id(email, subject, content):
+    """Stable id for a campaign, so a re-run of the same mail finds its journal"""
+    digest = hashlib.sha1()
+    for part in (email, subject, content):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class CampaignJournal:
+    """Per-recipient delivery status, group-committed to SQLite in WAL mode
+
+    record() only appends to an in-memory batch; the batch is written in a
+    single transaction (one fsync) once flush_every records are pending or
+    flush_interval seconds have passed. A crash therefore loses at most one
+    batch, and those recipients are simply sent again on resume. Recipients
+    already marked as sent (or bounced since) are loaded into a set for O(1)
+    lookups.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL, campaign=None, flush_every=200, flush_interval=1.0):
+        self.path = path
+        self.campaign = campaign or 'default'
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=FULL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS deliveries ('
+            ' campaign TEXT NOT NULL, recipient TEXT NOT NULL,'
+            ' status TEXT NOT NULL, detail TEXT, updated REAL NOT NULL,'
+            ' PRIMARY KEY (campaign, recipient)) WITHOUT ROWID')
+        self._sent = set(r for (r,) in self._db.execute(
+            'SELECT recipient FROM deliveries WHERE campaign = ? AND status IN (?, ?)',
+            (self.campaign, SENT, BOUNCED)))
+
+    def __len__(self):
+        return len(self._sent)
+
+    def is_done(self, recipient):
+        """True if recipient was already sent this campaign"""
+        return recipient in self._sent
+
+    def record(self, recipient, status, detail=''):
+        with self._lock:
+            if status == SENT:
+                self._sent.add(recipient)
+            self._pending.append((self.campaign, recipient, status, detail, time.time()))
+            if (len(self._pending) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        # Tek işlem = tek fsync (group commit)
+        self._db.execute('BEGIN')
+        try:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO deliveries (campaign, recipient, status, detail, updated)'
+                ' VALUES (?, ?, ?, ?, ?)', batch)
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def record_bounces(self, bounces, every_campaign=False):
+        """Marks sent recipients of (recipient, detail) pairs as bounced
+
+        Only this campaign's rows change unless every_campaign is set. The
+        pairs are written in one transaction; recipients match
+        case-insensitively. Returns the number of rows updated.
+        """
+        now = time.time()
+        query = ('UPDATE deliveries SET status = ?, detail = ?, updated = ?'
+                 ' WHERE recipient = ? COLLATE NOCASE AND status = ?')
+        if every_campaign:
+            rows = [(BOUNCED, detail, now, recipient, SENT) for recipient, detail in bounces]
+        else:
+            query += ' AND campaign = ?'
+            rows = [(BOUNCED, detail, now, recipient, SENT, self.campaign)
+                    for recipient, detail in bounces]
+        with self._lock:
+            self._flush_locked()
+            # Geri dönenler alıcı adresiyle aranır; indeks ilk kullanımda oluşturulur
+            self._db.execute('CREATE INDEX IF NOT EXISTS deliveries_recipient'
+                             ' ON deliveries (recipient COLLATE NOCASE)')
+            changes = self._db.total_changes
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany(query, rows)
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return self._db.total_changes - changes
+
+    def reset(self):
+        """Forgets everything recorded for this campaign"""
+        with self._lock:
+            self._pending = []
+            self._sent.clear()
+            self._db.execute('DELETE FROM deliveries WHERE campaign = ?', (self.campaign,))
+
+    def close(self):
+        self.flush()
+        self._db.close()
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import stat
+import tempfile
+import threading
+import uuid
+from email.base64mime import body_encode
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+from mail_template import CompiledTemplate, recipient_values
+
+# Toplu gönderimde alıcılar gizli kalır (Bcc), To başlığı boş grup olur
+BATCH_TO = 'undisclosed-recipients:;'
+
+# Bu boyuttan büyük ekler bellekte tutulmaz: diskte kodlanır, DATA sırasında parça parça okunur
+STREAM_THRESHOLD = 1024 * 1024
+STREAM_CHUNK = 256 * 1024
+ENCODED_DIR = os.path.join(tempfile.gettempdir(), 'mail_attachments')
+# 57 baytlık girdi 76 karakterlik bir base64 satırı olur
+_ENCODE_STEP = 57 * 1024
+_DOT_RE = re.compile(rb'(?m)^\.')
+
+
+_encoded_dir = None
+
+
+def encoded_dir():
+    """The directory for encoded attachments, private to the current user
+
+    On POSIX it is ENCODED_DIR-<uid>, created 0700; if that name exists
+    but is not a directory owned by us with no group/other access, a
+    fresh private directory is used instead, since files found there
+    are trusted as already encoded.
+    """
+    global _encoded_dir
+    if _encoded_dir is None:
+        if not hasattr(os, 'getuid'):
+            # Windows: geçici dizin zaten kullanıcıya özel
+            os.makedirs(ENCODED_DIR, exist_ok=True)
+            _encoded_dir = ENCODED_DIR
+        else:
+            path = '%s-%d' % (ENCODED_DIR, os.getuid())
+            try:
+                os.mkdir(path, 0o700)
+            except FileExistsError:
+                pass
+            info = os.lstat(path)
+            if (not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid()
+                    or info.st_mode & 0o077):
+                path = tempfile.mkdtemp(prefix='mail_attachments-')
+            _encoded_dir = path
+    return _encoded_dir
+
+
+class EncodedAttachment:
+    """Base64 form of a large attachment, kept in a file on disk and read through mmap
+
+    The encoded file is named after the source's path, mtime and size, so
+    the render pool's worker processes and later campaigns map the same
+    file instead of encoding again; unpickling one reopens that file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._map = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, source, key):
+        """Encodes source (whose AttachmentCache key is key) unless already on disk"""
+        directory = encoded_dir()
+        prefix = hashlib.sha1(key[0].encode('utf-8')).hexdigest()
+        path = os.path.join(directory, '%s-%d-%d.b64' % (prefix, key[1], key[2]))
+        if not os.path.exists(path):
+            # Kaynak mmap ile okunur; ne dosya ne kodlanmış hali bütün olarak belleğe alınır.
+            # Geçici dosya '.' ile başlar: aşağıdaki temizlik başka yazıcıların dosyalarına dokunmaz
+            tmp = os.path.join(directory, '.%s.tmp' % uuid.uuid4().hex)
+            try:
+                with open(source, 'rb') as src, open(tmp, 'wb') as out:
+                    if key[2]:
+                        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                            for i in range(0, len(data), _ENCODE_STEP):
+                                out.write(base64.encodebytes(data[i:i + _ENCODE_STEP])
+                                          .replace(b'\n', b'\r\n'))
+                os.replace(tmp, path)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            # Aynı dosyanın eski sürümlerinin (tamamlanmış) kodlamalarını sil
+            stale = re.compile(re.escape(prefix) + r'-\d+-\d+\.b64\Z')
+            for name in os.listdir(directory):
+                if stale.match(name) and name != os.path.basename(path):
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass
+        return open_encoded(path)
+
+    def chunks(self, size=STREAM_CHUNK):
+        """Yields the encoded bytes as memoryview slices of the mapping"""
+        if not self.size:
+            return
+        with self._lock:
+            if self._map is None:
+                with open(self.path, 'rb') as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        for i in range(0, self.size, size):
+            yield view[i:i + size]
+
+    def __len__(self):
+        return self.size
+
+    def __reduce__(self):
+        return open_encoded, (self.path,)
+
+
+_encoded = {}
+_encoded_lock = threading.Lock()
+
+
+def open_encoded(path):
+    """The process-wide EncodedAttachment for an encoded file"""
+    with _encoded_lock:
+        entry = _encoded.get(path)
+        if entry is None:
+            entry = _encoded[path] = EncodedAttachment(path)
+        return entry
+
+
+class StreamedMessage:
+    """A rendered message whose large attachments stay in their encoded files
+
+    segments are the message in order: bytes, and EncodedAttachment
+    objects shared by every message of the campaign, so only the
+    recipient's own headers and body are held per message in flight.
+    """
+
+    __slots__ = ('segments', 'size')
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.size = sum(len(segment) for segment in segments)
+
+    def __len__(self):
+        return self.size
+
+    def __bytes__(self):
+        return b''.join(bytes(chunk) for segment in self.segments
+                        for chunk in (segment.chunks() if isinstance(segment, EncodedAttachment)
+                                      else (segment,)))
+
+    def wire_chunks(self, size=STREAM_CHUNK):
+        """The DATA body in chunks, dot-stuffed; attachments come straight from the mapping
+
+        Every bytes segment starts a line (or with CRLF), and base64 has
+        no '.', so stuffing the bytes segments alone is enough.
+        """
+        for segment in self.segments:
+            if isinstance(segment, EncodedAttachment):
+                yield from segment.chunks(size)
+            else:
+                yield _DOT_RE.sub(b'..', segment)
+
+
+class CachedAttachment:
+    """One attachment, read and base64-encoded a single time
+
+    Attachments larger than STREAM_THRESHOLD get a placeholder part with
+    marker as its payload; encoded holds the real content on disk.
+    """
+
+    def __init__(self, path, part, encoded=None, marker=None):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.part = part
+        self.encoded = encoded
+        self.marker = marker
+
+
+class AttachmentCache:
+    """Encodes each attachment once per campaign
+
+    Entries are keyed by path, mtime and size so that a file edited on disk
+    between campaigns is picked up again instead of served stale.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def key(self, path):
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        """Returns the CachedAttachment for path, encoding it on first use"""
+        key = self.key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = (self.encode_streamed(path, key) if key[2] > STREAM_THRESHOLD
+                         else CachedAttachment(path, self.encode(path)))
+                # Aynı dosyanın eski sürümlerini at
+                for old in [k for k in self._entries if k[0] == key[0]]:
+                    del self._entries[old]
+                self._entries[key] = entry
+        return entry
+
+    def encode(self, path, data=None):
+        """Builds the base64 MIME part for path"""
+        ctype, _ = mimetypes.guess_type(path)
+        subtype = ctype.split('/', 1)[1] if ctype and ctype.startswith('application/') else 'octet-stream'
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        part = MIMEApplication(data, _subtype=subtype)
+        part.add_header('Content-Disposition', 'attachment',
+                        filename=os.path.basename(path))
+        return part
+
+    def encode_streamed(self, path, key):
+        """Encodes a large attachment to disk; the part only carries a marker"""
+        marker = 'attachment-%s' % uuid.uuid4().hex
+        part = self.encode(path, b'')
+        part.set_payload(marker)
+        return CachedAttachment(path, part, EncodedAttachment.create(path, key), marker)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Varsayılan, süreç genelinde paylaşılan önbellek
+attachment_cache = AttachmentCache()
+
+
+class MessageTemplate:
+    """A message compiled once per campaign and rendered as wire-ready bytes
+
+    The full multipart message (headers, attachments, boundary) is
+    serialized a single time with placeholders for the recipient, the
+    subject and the HTML body. render() only splices the pre-encoded pieces
+    back together, so no email.generator work is done per send. Subject and
+    body can be overridden per recipient for personalized mail; only those
+    overrides are encoded again. With attachments above STREAM_THRESHOLD
+    render() returns a StreamedMessage instead of bytes.
+    """
+
+    def __init__(self, sender, subject, html_content, attachments=(),
+                 sender_name='Gönderen'):
+        token = uuid.uuid4().hex
+        to_marker = '%s@placeholder.invalid' % token
+        subject_marker = 'subject-%s' % token
+        body_marker = 'body-%s' % token
+
+        msg = MIMEMultipart()
+        msg['From'] = formataddr((sender_name, sender))
+        msg['To'] = to_marker
+        msg['Subject'] = subject_marker
+        body = MIMEText('', 'html', 'utf-8')
+        body.set_payload(body_marker)
+        msg.attach(body)
+        entries = [attachment_cache.get(path) for path in attachments]
+        for entry in entries:
+            msg.attach(entry.part)
+
+        raw = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+        head, rest = raw.split(to_marker.encode('ascii'), 1)
+        after_to, rest = rest.split(subject_marker.encode('ascii'), 1)
+        after_subject, tail = rest.split(body_marker.encode('ascii'), 1)
+        self._head = head
+        self._after_to = after_to
+        self._after_subject = after_subject
+        self._tail = tail
+        # Büyük eklerin yeri işaretle bölünür; içerikleri diskteki kodlanmış dosyadan gelir
+        self._segments = None
+        streamed = [entry for entry in entries if entry.encoded is not None]
+        if streamed:
+            self._segments = [tail]
+            for entry in streamed:
+                before, after = self._segments.pop().split(entry.marker.encode('ascii'), 1)
+                self._segments += [before, entry.encoded, after]
+        self._subject = self.encode_subject(subject)
+        self._body = self.encode_body(html_content)
+
+    @staticmethod
+    def encode_subject(subject):
+        """RFC 2047 encodes the subject exactly as msg.as_string() used to"""
+        subject = subject.replace('\r', ' ').replace('\n', ' ')
+        try:
+            subject.encode('ascii')
+            charset = 'us-ascii'
+        except UnicodeEncodeError:
+            charset = 'utf-8'
+        header = Header(subject, charset, header_name='Subject')
+        return header.encode(linesep='\r\n').encode('ascii')
+
+    @staticmethod
+    def encode_body(html_content):
+        """Base64 body of the text/html part, in 76 character CRLF lines"""
+        return body_encode(html_content.encode('utf-8'), 76, '\r\n').encode('ascii')
+
+    def render(self, recipient, subject=None, html_content=None):
+        """Returns the message for recipient as CRLF-terminated bytes (or a StreamedMessage)"""
+        if '\r' in recipient or '\n' in recipient:
+            raise ValueError('Invalid recipient address: %r' % recipient)
+        subject = self._subject if subject is None else self.encode_subject(subject)
+        body = self._body if html_content is None else self.encode_body(html_content)
+        if self._segments is not None:
+            head = b''.join((self._head, recipient.encode('utf-8'), self._after_to,
+                             subject, self._after_subject, body, self._segments[0]))
+            return StreamedMessage([head] + self._segments[1:])
+        return b''.join((self._head, recipient.encode('utf-8'), self._after_to,
+                         subject, self._after_subject, body, self._tail))
+
+
+def build_message(sender, subject, content, attachments=(), batch_size=1):
+    """Compiles a campaign message; returns (render, payload)
+
+    render(recipient) gives the wire bytes for one recipient, with the
+    merge fields of subject and content filled from its CSV columns.
+    Without fields every recipient gets the same pre-encoded body, and
+    when batch_size > 1 payload is that message addressed to undisclosed
+    recipients, ready to be sent to a whole batch at once. Otherwise
+    payload is None.
+    """
+    body = CompiledTemplate(content)
+    subject = CompiledTemplate(subject, escape=False)
+    template = MessageTemplate(sender, subject.render({}), body.render({}), attachments)
+
+    if body.is_static and subject.is_static:
+        payload = template.render(BATCH_TO) if batch_size > 1 else None
+        return template.render, payload
+
+    def render(recipient):
+        values = recipient_values(recipient)
+        return template.render(
+            recipient,
+            None if subject.is_static else subject.render(values),
+            None if body.is_static else body.render(values))
+    return render, None
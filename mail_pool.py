@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+import queue
+import smtplib
+import threading
+import time
+
+from mail_message import StreamedMessage
+
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 587
+DEFAULT_POOL_SIZE = 4
+# Gmail bir oturumda ~100 mesajdan sonra bağlantıyı kesebiliyor
+DEFAULT_RECYCLE_AFTER = 100
+# Bu kadar saniye boşta kalan oturum kullanılmadan önce NOOP ile denetlenir
+DEFAULT_IDLE_CHECK = 30
+
+
+def is_loopback(host):
+    """True for localhost and loopback addresses, e.g. the local mail_sink
+
+    Only these may be used without STARTTLS: traffic to them never crosses
+    a network where the EHLO reply could be stripped.
+    """
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host.lower() == 'localhost'
+
+
+def no_tls_error(host):
+    return smtplib.SMTPNotSupportedError(
+        f"{host} does not offer STARTTLS; refusing to send credentials and mail in cleartext")
+
+
+class PooledSession:
+    """A worker's handle on one pooled connection
+
+    The SMTP object behind it can be swapped: ensure() replaces a session
+    that has sent recycle_after messages or fails a NOOP after sitting idle,
+    and reconnect() replaces one that dropped mid-send. Workers should
+    always go through .server rather than keep the SMTP object.
+    """
+
+    def __init__(self, pool, server):
+        self.pool = pool
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+        self.reconnects = 0
+
+    def ensure(self):
+        """Returns a live SMTP session, recycling or reconnecting if needed"""
+        pool = self.pool
+        if pool.recycle_after and self.sent >= pool.recycle_after:
+            return self.reconnect()
+        if time.monotonic() - self.last_used > pool.idle_check:
+            try:
+                code, _ = self.server.noop()
+            except (smtplib.SMTPException, OSError):
+                code = None
+            if code != 250:
+                return self.reconnect()
+            self.last_used = time.monotonic()
+        return self.server
+
+    def mark_sent(self, count=1):
+        self.sent += count
+        self.last_used = time.monotonic()
+
+    def reconnect(self):
+        """Drops the current session and opens a freshly authenticated one
+
+        Retries with a short exponential backoff; the last error is raised
+        if the server stays unreachable.
+        """
+        _quietly_close(self.server)
+        delay = 1.0
+        for attempt in range(self.pool.reconnect_attempts):
+            try:
+                self.server = self.pool.connect()
+                break
+            except (smtplib.SMTPAuthenticationError, smtplib.SMTPNotSupportedError):
+                raise
+            except (smtplib.SMTPException, OSError):
+                if attempt + 1 == self.pool.reconnect_attempts:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+        self.sent = 0
+        self.last_used = time.monotonic()
+        self.reconnects += 1
+        return self.server
+
+
+class SMTPConnectionPool:
+    """Keeps a fixed number of authenticated SMTP sessions for worker threads
+
+    Sessions are handed out as PooledSession objects, which transparently
+    reconnect after a drop and recycle themselves every recycle_after
+    messages (0 disables recycling).
+    """
+
+    def __init__(self, email, password, size=DEFAULT_POOL_SIZE,
+                 host=SMTP_HOST, port=SMTP_PORT, timeout=60,
+                 recycle_after=DEFAULT_RECYCLE_AFTER, idle_check=DEFAULT_IDLE_CHECK,
+                 reconnect_attempts=3):
+        self.email = email
+        self.password = password
+        self.size = max(1, int(size))
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.recycle_after = recycle_after
+        self.idle_check = idle_check
+        self.reconnect_attempts = max(1, reconnect_attempts)
+        self._idle = queue.Queue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Opens one authenticated SMTP session
+
+        STARTTLS is mandatory unless the host is a loopback address (see
+        is_loopback); a server that does not offer it is refused with
+        SMTPNotSupportedError before the password is sent.
+        """
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.ehlo()
+        if server.has_extn('starttls'):
+            server.starttls()
+            server.ehlo()
+        elif not is_loopback(self.host):
+            _quietly_close(server)
+            raise no_tls_error(self.host)
+        if self.password:
+            server.login(self.email, self.password)
+        return server
+
+    def open(self):
+        """Opens every session of the pool in parallel
+
+        TLS handshakes are the slow part, so they run side by side. The first
+        error (e.g. SMTPAuthenticationError) is re-raised after the rest of
+        the pool has been closed.
+        """
+        errors = []
+
+        def _open_one():
+            try:
+                session = PooledSession(self, self.connect())
+            except Exception as e:
+                errors.append(e)
+                return
+            with self._lock:
+                self._all.append(session)
+            self._idle.put(session)
+
+        openers = [threading.Thread(target=_open_one, daemon=True) for _ in range(self.size)]
+        for t in openers:
+            t.start()
+        for t in openers:
+            t.join()
+
+        if errors:
+            self.close()
+            raise errors[0]
+        return self
+
+    def acquire(self):
+        """Borrows an idle PooledSession, blocking until one is free"""
+        return self._idle.get()
+
+    def release(self, session):
+        """Returns a borrowed session to the pool"""
+        self._idle.put(session)
+
+    @property
+    def reconnects(self):
+        """Total number of reconnects and recycles across the pool"""
+        with self._lock:
+            return sum(session.reconnects for session in self._all)
+
+    def close(self):
+        """Closes every session, ignoring already dropped sockets"""
+        with self._lock:
+            sessions, self._all = self._all, []
+        for session in sessions:
+            _quietly_close(session.server)
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _quietly_close(server):
+    """QUITs (or just closes) a session that may already be dead"""
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+def reply_code(exc):
+    """Returns the SMTP reply code carried by an smtplib exception, or None"""
+    code = getattr(exc, 'smtp_code', None)
+    if code is None and isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [c for c, _ in exc.recipients.values()]
+        code = codes[0] if codes else None
+    return code
+
+
+def send_batch(server, sender, recipients, msg):
+    """Delivers msg to many recipients in one MAIL FROM / RCPT TO / DATA transaction
+
+    When the server advertises PIPELINING the envelope commands are written
+    back to back and their replies read afterwards, saving one round-trip
+    per recipient. Like sendmail(), returns {recipient: (code, message)}
+    for the recipients the server refused. msg may be a StreamedMessage.
+    """
+    streamed = isinstance(msg, StreamedMessage)
+    pipelining = server.has_extn('pipelining')
+    if not pipelining and not streamed:
+        return server.sendmail(sender, recipients, msg)
+
+    options = ''
+    if server.has_extn('size'):
+        options = ' SIZE=%d' % len(msg)
+    if pipelining:
+        server.putcmd('mail', 'FROM:%s%s' % (smtplib.quoteaddr(sender), options))
+        for recipient in recipients:
+            server.putcmd('rcpt', 'TO:%s' % smtplib.quoteaddr(recipient))
+        code, resp = server.getreply()
+        replies = [server.getreply() for _ in recipients]
+    else:
+        server.ehlo_or_helo_if_needed()
+        code, resp = server.mail(sender, [options.strip()] if options else [])
+        replies = [server.rcpt(recipient) for recipient in recipients] if code == 250 else []
+
+    if code != 250:
+        _abort(server, code)
+        raise smtplib.SMTPSenderRefused(code, resp, sender)
+    refused = dict((recipient, reply) for recipient, reply in zip(recipients, replies)
+                   if reply[0] not in (250, 251))
+    if len(refused) == len(recipients):
+        _abort(server, replies[0][0])
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = send_data(server, msg) if streamed else server.data(msg)
+    if code != 250:
+        _abort(server, code)
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+def send_data(server, msg):
+    """DATA for a StreamedMessage: chunks go to the socket without joining the message"""
+    server.putcmd('data')
+    code, resp = server.getreply()
+    if code != 354:
+        raise smtplib.SMTPDataError(code, resp)
+    last = b''
+    for chunk in msg.wire_chunks():
+        if len(chunk):
+            server.send(chunk)
+            last = chunk
+    server.send(b'.\r\n' if bytes(last[-2:]) == b'\r\n' else b'\r\n.\r\n')
+    return server.getreply()
+
+
+def _abort(server, code):
+    """Resets the transaction, or closes the session after a 421 reply"""
+    if code == 421:
+        server.close()
+    else:
+        try:
+            server.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Campaign counters that front-ends sample at their own pace"""
+import collections
+import queue
+import threading
+import time
+
+# Arayüzün ilerlemeyi okuma aralığı (10 Hz)
+PROGRESS_INTERVAL_MS = 100
+# Anlık hız bu kadar saniyelik pencereden hesaplanır
+RATE_WINDOW = 10.0
+
+# Alıcı başına durum baytı (RecipientList.statuses)
+ROW_PENDING, ROW_SENT, ROW_FAILED, ROW_SKIPPED, ROW_DEFERRED, ROW_SUPPRESSED = range(6)
+ROW_STATUS_NAMES = ('Pending', 'Sent', 'Failed', 'Already sent', 'Deferred', 'Suppressed')
+
+ProgressSnapshot = collections.namedtuple('ProgressSnapshot', (
+    'version', 'done', 'sent', 'failed', 'skipped', 'deferred', 'total', 'queued',
+    'rate', 'eta', 'status'))
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return '--'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '%dh%02dm' % (seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return '%dm%02ds' % (seconds // 60, seconds % 60)
+    return '%ds' % seconds
+
+
+class ProgressTracker:
+    """Thread-safe sent/failed/skipped/deferred counters of one campaign
+
+    Workers only bump integers and remember the latest event; nothing is
+    formatted or published per message. snapshot() builds a consistent
+    view on demand, with the throughput (emails/min) measured over the last
+    RATE_WINDOW seconds of snapshots and an ETA when the total is known.
+
+    When statuses (a bytearray, e.g. RecipientList.statuses) is set, the
+    outcome of every recipient that carries a row number is also written
+    to statuses[row] as one of the ROW_* codes.
+    """
+
+    def __init__(self, total=None, clock=time.monotonic, statuses=None):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.statuses = statuses
+        self.reset(total)
+
+    def reset(self, total=None):
+        with self._lock:
+            self.total = total
+            self.sent = 0
+            self.failed = 0
+            self.skipped = 0
+            self.deferred = 0
+            self.version = 0
+            self._last = ('', ())
+            self._samples = collections.deque([(self._clock(), 0)])
+
+    @property
+    def done(self):
+        return self.sent + self.failed + self.skipped
+
+    def _event(self, status, args):
+        self.version += 1
+        self._last = (status, args)
+        return self.sent + self.failed + self.skipped
+
+    def _mark(self, recipient, code):
+        row = getattr(recipient, 'row', None)
+        if row is not None and self.statuses is not None:
+            self.statuses[row] = code
+
+    def add_sent(self, recipient):
+        """Counts one delivery; returns the number of finished recipients"""
+        with self._lock:
+            self.sent += 1
+            self._mark(recipient, ROW_SENT)
+            return self._event('Sent: %s', (recipient,))
+
+    def add_failed(self, recipient):
+        with self._lock:
+            self.failed += 1
+            self._mark(recipient, ROW_FAILED)
+            return self._event('Failed: %s', (recipient,))
+
+    def add_skipped(self, recipient):
+        with self._lock:
+            self.skipped += 1
+            self._mark(recipient, ROW_SKIPPED)
+            return self._event('Already sent: %s', (recipient,))
+
+    def add_suppressed(self, recipient):
+        """Counts a recipient on the suppression list as skipped"""
+        with self._lock:
+            self.skipped += 1
+            self._mark(recipient, ROW_SUPPRESSED)
+            return self._event('Suppressed: %s', (recipient,))
+
+    def add_deferred(self, recipient, delay):
+        with self._lock:
+            self.deferred += 1
+            self._mark(recipient, ROW_DEFERRED)
+            return self._event('Deferred: %s (retry in %.0fs)', (recipient, delay))
+
+    def add_moved(self, recipient):
+        """recipient left a throttled or disabled account for another one"""
+        with self._lock:
+            self.deferred += 1
+            self._mark(recipient, ROW_DEFERRED)
+            return self._event('Moved to another account: %s', (recipient,))
+
+    def note(self, status):
+        """Shows status without changing any counter"""
+        with self._lock:
+            self._event(status, ())
+
+    def retrying(self, count=1):
+        """Deferred recipients went back into the send queue"""
+        with self._lock:
+            self.deferred -= count
+            self.version += 1
+
+    def snapshot(self):
+        now = self._clock()
+        with self._lock:
+            done = self.sent + self.failed + self.skipped
+            samples = self._samples
+            if samples[-1][1] != done or now - samples[-1][0] >= 1.0:
+                samples.append((now, done))
+            while len(samples) > 2 and now - samples[1][0] >= RATE_WINDOW:
+                samples.popleft()
+            status, args = self._last
+            snap = (self.version, done, self.sent, self.failed, self.skipped,
+                    self.deferred, self.total)
+        start, start_done = samples[0]
+        elapsed = now - start
+        per_second = (done - start_done) / elapsed if elapsed > 0 else 0.0
+        total = snap[-1]
+        queued = max(0, total - done) if total is not None else snap[5]
+        eta = queued / per_second if total is not None and per_second > 0 else None
+        return ProgressSnapshot(*snap, queued=queued, rate=per_second * 60, eta=eta,
+                                status=status % args if args else status)
+
+
+class EventQueue:
+    """Carries campaign callbacks from the sending thread to the GUI thread
+
+    wrap(handler) returns a callback that only queues its arguments, so it
+    is safe to call from a worker thread or an event loop; dispatch(), run
+    from the GUI timer, calls the queued handlers in order on its own
+    thread.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def wrap(self, handler):
+        def callback(*args):
+            self._queue.put((handler, args))
+        return callback
+
+    def dispatch(self):
+        """Runs every queued callback; returns how many ran"""
+        count = 0
+        while True:
+            try:
+                handler, args = self._queue.get_nowait()
+            except queue.Empty:
+                return count
+            handler(*args)
+            count += 1
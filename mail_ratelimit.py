@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import collections
+import threading
+import time
+
+# Gmail için eski "her 10 e-postada 1 dakika bekle" kuralına denk varsayılanlar
+DEFAULT_PER_MINUTE = 10
+DEFAULT_BURST = 10
+# Sunucunun "yavaşla" dediği geçici yanıt kodları
+THROTTLE_CODES = (421, 450, 451, 452)
+
+
+class TokenBucket:
+    """Classic token bucket: sustained rate in tokens/second plus a burst size"""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self._clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Takes a token; returns 0 on success or the seconds until one is due"""
+        with self._lock:
+            self._refill(self._clock())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (1 - self.tokens) / self.rate
+
+    def drain(self):
+        with self._lock:
+            self._refill(self._clock())
+            self.tokens = 0.0
+
+
+class _AccountState:
+    def __init__(self, per_minute, burst, clock):
+        self.per_minute = float(per_minute)
+        self.bucket = TokenBucket(per_minute / 60.0, burst, clock)
+        self.backoff_level = 0
+        self.paused_until = 0.0
+        self.sent = collections.deque()
+        self.throttled = 0
+
+
+class RateLimiter:
+    """Per-account token buckets that adapt to the server's throttling replies
+
+    Every account starts at per_minute with the given burst, unless it was
+    given its own quota with configure(). A throttling reply
+    (421/450/451/452) halves that account's rate and pauses it with
+    exponential backoff; each later success adds back a tenth of the
+    configured rate until it is reached again.
+    """
+
+    def __init__(self, per_minute=DEFAULT_PER_MINUTE, burst=DEFAULT_BURST,
+                 backoff=30.0, max_backoff=900.0, min_per_minute=1.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.per_minute = float(per_minute)
+        self.burst = burst
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.min_per_minute = min(float(min_per_minute), self.per_minute)
+        self._clock = clock
+        self._sleep = sleep
+        self._accounts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, account):
+        with self._lock:
+            state = self._accounts.get(account)
+            if state is None:
+                state = _AccountState(self.per_minute, self.burst, self._clock)
+                self._accounts[account] = state
+            return state
+
+    def configure(self, account, per_minute=None, burst=None):
+        """Gives account its own quota instead of the limiter-wide default"""
+        state = _AccountState(self.per_minute if per_minute is None else per_minute,
+                              self.burst if burst is None else burst, self._clock)
+        with self._lock:
+            self._accounts[account] = state
+
+    def paused_for(self, account):
+        """Seconds account stays paused after a throttling reply (0 if not paused)"""
+        return max(0.0, self._state(account).paused_until - self._clock())
+
+    def reserve(self, account):
+        """Takes a send permit without blocking; returns 0 or the seconds to wait first"""
+        state = self._state(account)
+        delay = state.paused_until - self._clock()
+        if delay > 0:
+            return delay
+        return state.bucket.try_acquire()
+
+    def wait(self, account, is_cancelled=None):
+        """Blocks until account may send; returns False if cancelled meanwhile"""
+        while True:
+            if is_cancelled and is_cancelled():
+                return False
+            delay = self.reserve(account)
+            if delay <= 0:
+                return True
+            # İptal edilebilmesi için kısa adımlarla bekle
+            self._sleep(min(delay, 0.5))
+
+    def record_success(self, account):
+        state = self._state(account)
+        now = self._clock()
+        with self._lock:
+            state.sent.append(now)
+            state.backoff_level = 0
+            bucket = state.bucket
+            configured = state.per_minute / 60.0
+            if bucket.rate < configured:
+                bucket.rate = min(configured, bucket.rate + configured / 10.0)
+
+    def record_throttle(self, account, code):
+        """Backs the account off after a throttling reply from the server"""
+        if code not in THROTTLE_CODES:
+            return
+        state = self._state(account)
+        with self._lock:
+            state.throttled += 1
+            state.backoff_level += 1
+            pause = min(self.max_backoff, self.backoff * 2 ** (state.backoff_level - 1))
+            state.paused_until = max(state.paused_until, self._clock() + pause)
+            bucket = state.bucket
+            floor = min(self.min_per_minute, state.per_minute) / 60.0
+            bucket.rate = max(floor, bucket.rate / 2.0)
+        bucket.drain()
+
+    def effective_rate(self, account):
+        """Messages actually sent by account during the last minute"""
+        state = self._state(account)
+        cutoff = self._clock() - 60.0
+        with self._lock:
+            while state.sent and state.sent[0] < cutoff:
+                state.sent.popleft()
+            return len(state.sent)
+
+    def snapshot(self, account=None):
+        """Current limiter state, per account, for display in the progress UI"""
+        accounts = [account] if account is not None else list(self._accounts)
+        now = self._clock()
+        result = {}
+        for name in accounts:
+            state = self._state(name)
+            result[name] = {
+                'configured_per_minute': state.per_minute,
+                'allowed_per_minute': state.bucket.rate * 60.0,
+                'effective_per_minute': self.effective_rate(name),
+                'paused_for': max(0.0, state.paused_until - now),
+                'throttled': state.throttled,
+            }
+        return result
+
+
+class NoRateLimit(RateLimiter):
+    """Rate limiter that never waits, e.g. for a local test server"""
+
+    def __init__(self, **kwargs):
+        super().__init__(per_minute=0, burst=1, **kwargs)
+
+    def reserve(self, account):
+        return 0.0
+
+    def wait(self, account, is_cancelled=None):
+        return not (is_cancelled and is_cancelled())
+
+    def record_throttle(self, account, code):
+        pass
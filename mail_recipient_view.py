@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Recipient panel model: a QTableView over a RecipientList, loaded in the background"""
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from mail_recipients import RecipientList
+from mail_progress import (ROW_STATUS_NAMES, ROW_PENDING, ROW_SENT, ROW_FAILED, ROW_DEFERRED,
+                           ROW_SUPPRESSED)
+
+# Yükleme sırasında tabloya kaç satırda bir haber verilir
+LOAD_BATCH = 20000
+# Arama kutusunda yazmayı bitirmek için beklenen süre
+SEARCH_DELAY_MS = 250
+
+STATUS_COLORS = {
+    ROW_PENDING: '#7f8c8d',
+    ROW_SENT: '#27ae60',
+    ROW_FAILED: '#e74c3c',
+    ROW_DEFERRED: '#e67e22',
+    ROW_SUPPRESSED: '#8e44ad',
+}
+
+
+class RecipientLoader(QThread):
+    """Validates addresses from a file or pasted text into a RecipientList"""
+    rows_loaded = pyqtSignal(int)
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, recipient_list, source):
+        super().__init__()
+        self.recipient_list = recipient_list
+        self.source = source
+        self.is_cancelled = False
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def run(self):
+        batch = []
+        try:
+            for address in self.recipient_list.validator.filter(self.source):
+                if self.is_cancelled:
+                    return
+                batch.append(address)
+                if len(batch) >= LOAD_BATCH:
+                    self.rows_loaded.emit(self.recipient_list.extend(batch))
+                    batch = []
+            self.rows_loaded.emit(self.recipient_list.extend(batch))
+        except (OSError, ValueError) as e:
+            self.load_failed.emit(str(e))
+
+
+class RecipientSearch(QThread):
+    """Runs RecipientList.search() off the GUI thread"""
+    found = pyqtSignal(int, object)
+
+    def __init__(self, recipient_list, generation, text, status, count):
+        super().__init__()
+        self.recipient_list = recipient_list
+        self.args = (text, status, count)
+        self.generation = generation
+
+    def run(self):
+        self.found.emit(self.generation, self.recipient_list.search(*self.args))
+
+
+class RecipientTableModel(QAbstractTableModel):
+    """Email and live send status of every row of a RecipientList
+
+    Only the rows the view paints are ever read, so the table stays fast
+    with a million recipients. grow() announces rows as a loader appends
+    them; set_filter() shows the rows matching a search text and/or status,
+    computed in a RecipientSearch thread after typing pauses;
+    refresh_statuses() repaints the status column while a campaign runs.
+    """
+    COLUMNS = ("Email", "Status")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.recipient_list = RecipientList()
+        self._rows = 0
+        self._view = None
+        self._filter = ('', None)
+        self._generation = 0
+        # Çalışan arama thread'leri bitene kadar referansta tutulur
+        self._searches = set()
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(SEARCH_DELAY_MS)
+        self._search_timer.timeout.connect(self._start_search)
+        self._colors = dict((code, QColor(color)) for code, color in STATUS_COLORS.items())
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._view) if self._view is not None else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def list_row(self, row):
+        return self._view[row] if self._view is not None else row
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.list_row(index.row())
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return self.recipient_list[row]
+            return ROW_STATUS_NAMES[self.recipient_list.statuses[row]]
+        if role == Qt.ForegroundRole and index.column() == 1:
+            return self._colors.get(self.recipient_list.statuses[row])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return str(self.list_row(section) + 1)
+
+    def set_list(self, recipient_list):
+        """Shows another (possibly still empty) list"""
+        self.beginResetModel()
+        self.recipient_list = recipient_list
+        self._rows = len(recipient_list)
+        self._view = None
+        self._generation += 1
+        self.endResetModel()
+        if self._filter != ('', None):
+            self._search_timer.start()
+
+    def grow(self, count):
+        """count rows of the list are now readable"""
+        if count <= self._rows:
+            return
+        if self._view is None:
+            self.beginInsertRows(QModelIndex(), self._rows, count - 1)
+            self._rows = count
+            self.endInsertRows()
+        else:
+            self._rows = count
+            self._search_timer.start()
+
+    def set_filter(self, text, status=None):
+        """Shows only rows containing text and/or in status (None: any)"""
+        self._filter = (text.strip(), status)
+        self._search_timer.start()
+
+    def _start_search(self):
+        text, status = self._filter
+        self._generation += 1
+        if not text and status is None:
+            self._show(None)
+            return
+        # Eski aramanın sonucu gelirse kuşak numarasından tanınır ve atılır
+        search = RecipientSearch(self.recipient_list, self._generation, text, status, self._rows)
+        search.found.connect(self._found)
+        search.finished.connect(lambda: self._searches.discard(search))
+        self._searches.add(search)
+        search.start()
+
+    def _found(self, generation, rows):
+        if generation == self._generation:
+            self._show(rows)
+
+    def _show(self, rows):
+        self.beginResetModel()
+        self._view = rows
+        self.endResetModel()
+
+    def refresh_statuses(self):
+        """Repaints the status column; the view only redraws visible rows"""
+        rows = self.rowCount()
+        if rows:
+            self.dataChanged.emit(self.index(0, 1), self.index(rows - 1, 1),
+                                  [Qt.DisplayRole, Qt.ForegroundRole])
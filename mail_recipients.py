@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""Recipient sources that stream addresses from disk instead of loading them"""
+import array
+import csv
+import hashlib
+import itertools
+import math
+import os
+import re
+
+# Sayım için okunan blok boyutu
+COUNT_CHUNK = 1 << 20
+# Bu sayının üzerindeki listelerde tekrar kontrolü Bloom filtresiyle yapılır
+BLOOM_THRESHOLD = 1000000
+VALIDATION_BATCH = 1024
+
+EMAIL_RE = re.compile(
+    r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}")
+
+
+def field_key(name):
+    """Merge field name for a CSV header: "First Name" -> first_name"""
+    return re.sub(r'[\s-]+', '_', name.strip().lower())
+
+
+class Recipient(str):
+    """An address that also carries the merge fields of its CSV row
+
+    row is the recipient's position in the validated list, when the
+    front-end tracks a status per row.
+    """
+
+    __slots__ = ('fields', 'row')
+
+    def __new__(cls, address, fields=None, row=None):
+        self = super().__new__(cls, address)
+        self.fields = fields or {}
+        self.row = row
+        return self
+
+
+def numbered(recipients):
+    """Yields recipients as Recipient objects carrying their row number"""
+    for row, recipient in enumerate(recipients):
+        yield Recipient(recipient, getattr(recipient, 'fields', None), row)
+
+
+class RecipientFile:
+    """Lazily yields the addresses of a TXT (one per line) or CSV file
+
+    Values are yielded as found (blank ones skipped); run them through a
+    RecipientValidator to normalize, validate and de-duplicate. Only one
+    line is held in memory at a time, so lists with millions of rows can be
+    fed straight into MailCampaign. For CSV files the address column is
+    chosen by header name or zero-based index; by default the first column
+    whose header mentions "mail" is used (or the first column when there is
+    no header row). CSV rows with a header are yielded as Recipient objects
+    carrying the other columns as merge fields.
+    """
+
+    def __init__(self, path, column=None, delimiter=None, encoding='utf-8-sig'):
+        self.path = path
+        self.column = column
+        self.encoding = encoding
+        self.is_csv = os.path.splitext(path)[1].lower() in ('.csv', '.tsv')
+        self.delimiter = delimiter or ('\t' if path.lower().endswith('.tsv') else ',')
+
+    def __iter__(self):
+        if self.is_csv:
+            return self._iter_csv()
+        return self._iter_txt()
+
+    def _iter_txt(self):
+        with open(self.path, encoding=self.encoding, errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+
+    def _iter_csv(self):
+        with open(self.path, encoding=self.encoding, errors='replace', newline='') as f:
+            reader = csv.reader(f, delimiter=self.delimiter)
+            first = next(reader, None)
+            if first is None:
+                return
+            index, has_header = self.resolve_column(first)
+            if not has_header:
+                value = first[index].strip() if index < len(first) else ''
+                if value:
+                    yield value
+                for row in reader:
+                    if index < len(row):
+                        value = row[index].strip()
+                        if value:
+                            yield value
+                return
+            keys = [field_key(name) for name in first]
+            for row in reader:
+                if index < len(row):
+                    value = row[index].strip()
+                    if value:
+                        yield Recipient(value, dict(zip(keys, row)))
+
+    def resolve_column(self, first_row):
+        """Returns (column index, whether first_row is a header)"""
+        has_header = not any('@' in cell for cell in first_row)
+        column = self.column
+        if isinstance(column, str) and column.isdigit():
+            column = int(column)
+        if isinstance(column, int):
+            return column, has_header
+        if column is not None:
+            names = [cell.strip().lower() for cell in first_row]
+            if not has_header or column.strip().lower() not in names:
+                raise ValueError('Column %r not found in %s' % (column, self.path))
+            return names.index(column.strip().lower()), True
+        if has_header:
+            for i, cell in enumerate(first_row):
+                if 'mail' in cell.lower():
+                    return i, True
+        return 0, has_header
+
+    def count(self):
+        """Cheap upper bound of the number of recipients, for sizing progress
+
+        Counts line breaks in binary chunks without decoding anything, so it
+        runs at disk speed. Blank lines, a CSV header and invalid rows are
+        included in the number.
+        """
+        lines = 0
+        last = b'\n'
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(COUNT_CHUNK)
+                if not chunk:
+                    break
+                lines += chunk.count(b'\n')
+                last = chunk[-1:]
+        if last != b'\n':
+            lines += 1
+        return lines
+
+
+
+def normalize_address(value):
+    """Strips decorations ("Name <a@b>", mailto:) and lower-cases the domain"""
+    value = value.strip()
+    if '<' in value or ':' in value:
+        if value.endswith('>') and '<' in value:
+            value = value[value.rindex('<') + 1:-1].strip()
+        if value[:7].lower() == 'mailto:':
+            value = value[7:]
+    at = value.rfind('@')
+    if at < 0:
+        return value
+    return value[:at + 1] + value[at + 1:].lower()
+
+
+class BloomFilter:
+    """Fixed-size probabilistic set for de-duplicating very large lists
+
+    Uses about 1.8 bytes per expected item at a 0.1% false positive rate; a
+    false positive makes a fresh address look like a duplicate.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, int(capacity))
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item):
+        """Adds item; returns True if it was (probably) present already"""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        bits = self.bits
+        present = True
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % self.size
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                present = False
+                bits[pos >> 3] |= mask
+        return present
+
+
+class RecipientValidator:
+    """Normalizes, validates and de-duplicates a stream of addresses
+
+    Addresses are processed in batches with a precompiled matcher. Lists
+    expected to be larger than bloom_threshold are de-duplicated with a
+    BloomFilter instead of an exact set to keep memory flat. Rejected and
+    duplicate addresses are counted in invalid / duplicates.
+    """
+
+    def __init__(self, expected=0, bloom_threshold=BLOOM_THRESHOLD, batch_size=VALIDATION_BATCH):
+        self.batch_size = batch_size
+        self.accepted = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self._bloom = BloomFilter(expected) if expected > bloom_threshold else None
+        self._seen = set()
+
+    def filter(self, addresses):
+        """Yields the valid, first-seen addresses of the input"""
+        match = EMAIL_RE.fullmatch
+        seen = self._seen
+        bloom_add = self._bloom.add if self._bloom is not None else None
+        it = iter(addresses)
+        while True:
+            batch = list(itertools.islice(it, self.batch_size))
+            if not batch:
+                return
+            normalized = list(map(normalize_address, batch))
+            valid = [i for i, a in enumerate(normalized) if len(a) <= 254 and match(a)]
+            self.invalid += len(normalized) - len(valid)
+            for i in valid:
+                address = normalized[i]
+                key = address.lower()
+                if bloom_add is not None:
+                    duplicate = bloom_add(key)
+                else:
+                    duplicate = key in seen
+                    seen.add(key)
+                if duplicate:
+                    self.duplicates += 1
+                    continue
+                self.accepted += 1
+                original = batch[i]
+                if isinstance(original, Recipient):
+                    # Birleştirme alanlarını normalize edilmiş adrese taşı
+                    address = Recipient(address, original.fields)
+                yield address
+
+    def scan(self, addresses):
+        """Runs the whole input through filter() and returns the counts"""
+        for _ in self.filter(addresses):
+            pass
+        return self.stats()
+
+    def stats(self):
+        return {'accepted': self.accepted, 'invalid': self.invalid,
+                'duplicates': self.duplicates}
+
+
+class ValidatedRecipients:
+    """Re-iterable view of a recipient source through a fresh RecipientValidator"""
+
+    def __init__(self, source, expected=0):
+        self.source = source
+        self.expected = expected
+        self.validator = None
+
+    def __iter__(self):
+        self.validator = RecipientValidator(self.expected)
+        return self.validator.filter(self.source)
+
+
+class RecipientList:
+    """Compact append-only list of validated addresses with a status byte per row
+
+    Backs the GUI's recipient panel. The addresses live in one UTF-8 blob
+    with an offset array (about 30 bytes per row instead of a str object
+    each), so a million rows stay small. A loader thread may extend() while
+    another thread reads the rows it has already been told about. The
+    validator is kept so that later additions are de-duplicated against
+    the whole list. statuses is written by the campaign's ProgressTracker.
+    """
+
+    def __init__(self, validator=None):
+        self.validator = validator or RecipientValidator()
+        self.statuses = bytearray()
+        self._blob = bytearray()
+        self._offsets = array.array('Q', [0])
+        self._folded = None
+        self._has_upper = False
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        return self._blob[self._offsets[row]:self._offsets[row + 1] - 1].decode('utf-8')
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def extend(self, addresses):
+        """Appends already validated addresses; returns the new length"""
+        blob = self._blob
+        offsets = self._offsets
+        added = 0
+        for address in addresses:
+            data = address.encode('utf-8')
+            if not self._has_upper and data != data.lower():
+                self._has_upper = True
+            blob += data
+            blob += b'\n'
+            offsets.append(len(blob))
+            added += 1
+        self.statuses += bytes(added)
+        return len(self)
+
+    def add(self, addresses):
+        """Validates raw addresses against the list and appends the new ones"""
+        return self.extend(self.validator.filter(addresses))
+
+    def reset_statuses(self):
+        self.statuses[:] = bytes(len(self.statuses))
+
+    def search(self, text='', status=None, count=None):
+        """Rows (array of ints) among the first count whose address contains text
+
+        The match is case-insensitive; status restricts it to rows in that
+        state. The blob is scanned with bytearray.find and the row numbers
+        come from counting line breaks between hits, all in C.
+        """
+        count = len(self) if count is None else min(count, len(self))
+        end = self._offsets[count]
+        statuses = self.statuses
+        rows = array.array('L')
+        needle = text.strip().lower().encode('utf-8')
+        if not needle:
+            if status is None:
+                rows.extend(range(count))
+            else:
+                table = bytes(1 if i == status else 0 for i in range(256))
+                rows.extend(itertools.compress(range(count), statuses[:count].translate(table)))
+            return rows
+        blob = self._blob
+        if self._has_upper:
+            # Büyük harf içeren listelerde aramak için küçük harfli kopya (gerektikçe güncellenir)
+            if self._folded is None or len(self._folded) < end:
+                self._folded = blob[:end].lower()
+            blob = self._folded
+        find = blob.find
+        newlines = blob.count
+        row = last = 0
+        pos = find(needle, 0, end)
+        while pos >= 0:
+            row += newlines(b'\n', last, pos)
+            if status is None or statuses[row] == status:
+                rows.append(row)
+            last = find(b'\n', pos) + 1
+            row += 1
+            pos = find(needle, last, end)
+        return rows
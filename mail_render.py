@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Personalized messages rendered in worker processes, off the sending threads"""
+import collections
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from mail_message import build_message
+
+# Bir işçi sürecine tek seferde gönderilen alıcı sayısı
+DEFAULT_CHUNK_SIZE = 32
+
+Rendered = collections.namedtuple('Rendered', ('recipient', 'data'))
+
+# İşçi süreçlerindeki kampanya bilgisi ve gönderici başına derlenmiş mesajlar
+_spec = None
+_renderers = {}
+
+
+def _init_worker(subject, content, attachments):
+    global _spec
+    _spec = (subject, content, attachments)
+    _renderers.clear()
+
+
+def _render_chunk(sender, recipients):
+    render = _renderers.get(sender)
+    if render is None:
+        subject, content, attachments = _spec
+        render = _renderers[sender] = build_message(sender, subject, content, attachments)[0]
+    return [render(recipient) for recipient in recipients]
+
+
+class RenderPool:
+    """Process pool that turns recipients into wire-ready message bytes
+
+    Each worker compiles the campaign message once per sender and then
+    renders whole chunks of recipients, so merge fields, subject encoding
+    and base64 run on every core instead of under the sending threads'
+    GIL. max_pending bounds the chunks submitted but not yet handed to the
+    senders: submit() callers are expected to block on a queue of that size,
+    which keeps rendered messages waiting in memory to a fixed amount.
+    """
+
+    def __init__(self, subject, content, attachments=(), processes=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, max_pending=None):
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.chunk_size = max(1, int(chunk_size))
+        self.max_pending = max_pending or self.processes * 2
+        self._spec = (subject, content, list(attachments))
+        self._executor = None
+
+    def start(self):
+        # fork, çalışan SMTP thread'leri ve açık soketlerle güvenli değil
+        self._executor = ProcessPoolExecutor(
+            self.processes, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=self._spec)
+        return self
+
+    def submit(self, sender, recipients):
+        """Future of the rendered bytes of recipients, in order"""
+        return self._executor.submit(_render_chunk, sender, list(recipients))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Failure classification and the deferred-retry queue"""
+import heapq
+import itertools
+import smtplib
+import socket
+import threading
+import time
+
+from mail_pool import reply_code
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+DEFAULT_RETRY_DELAY = 60.0
+DEFAULT_MAX_RETRY_DELAY = 3600.0
+DEFAULT_MAX_ATTEMPTS = 4
+
+
+def classify(error):
+    """TRANSIENT for 4xx replies and network trouble, PERMANENT otherwise
+
+    5xx replies (unknown user, rejected content...) will not succeed on a
+    later attempt; 4xx replies (greylisting, mailbox busy, rate limits) and
+    dropped or timed out connections usually do.
+    """
+    code = reply_code(error)
+    if code is not None:
+        return TRANSIENT if 400 <= code < 500 else PERMANENT
+    if isinstance(error, (smtplib.SMTPServerDisconnected, socket.timeout, OSError)):
+        return TRANSIENT
+    return PERMANENT
+
+
+class RetryQueue:
+    """Transiently failed recipients, ordered by their next attempt time
+
+    Attempt n is scheduled delay * 2**(n-1) seconds later (capped at
+    max_delay). defer() returns None once a recipient has used up
+    max_attempts, meaning the failure should be treated as final.
+    """
+
+    def __init__(self, delay=DEFAULT_RETRY_DELAY, max_delay=DEFAULT_MAX_RETRY_DELAY,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, clock=time.monotonic):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._heap = []
+        self._attempts = {}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def attempts(self, recipient):
+        """Failed attempts recorded so far for recipient"""
+        with self._lock:
+            return self._attempts.get(recipient, 0)
+
+    def defer(self, recipient):
+        """Schedules another attempt; returns the delay, or None if exhausted"""
+        with self._lock:
+            attempt = self._attempts.get(recipient, 0) + 1
+            if attempt >= self.max_attempts:
+                self._attempts.pop(recipient, None)
+                return None
+            self._attempts[recipient] = attempt
+            delay = min(self.max_delay, self.delay * 2 ** (attempt - 1))
+            heapq.heappush(self._heap, (self._clock() + delay, next(self._order), recipient))
+            return delay
+
+    def requeue(self, recipient):
+        """Makes recipient due right away without counting an attempt"""
+        with self._lock:
+            heapq.heappush(self._heap, (self._clock(), next(self._order), recipient))
+
+    def forget(self, recipient):
+        """Drops the attempt count once recipient has been delivered"""
+        with self._lock:
+            self._attempts.pop(recipient, None)
+
+    def pop_due(self):
+        """Removes and returns every recipient whose retry time has come"""
+        now = self._clock()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def next_delay(self):
+        """Seconds until the next retry is due, or None when the queue is empty"""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - self._clock())
@@ -1,205 +1,105 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
-import smtplib
-import time
-import html
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from email.header import Header
-from email.utils import formataddr
+import re
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, 
     QTextEdit, QPushButton, QFileDialog, QMessageBox, 
     QProgressBar, QFrame, QGridLayout, QScrollArea,
-    QApplication, QSizePolicy, QSpacerItem
+    QApplication, QSizePolicy, QSpacerItem, QCheckBox,
+    QTableView, QHeaderView, QComboBox, QAbstractItemView
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont, QPixmap, QIcon
 from dotenv import load_dotenv
+from mail_core import MailCampaign, text_to_html, process_html_content
+from mail_html import prepare_html
+from mail_domains import DomainScheduler, DEFAULT_DOMAIN_CONCURRENCY, parse_domain_limits
+from mail_pool import DEFAULT_POOL_SIZE, DEFAULT_RECYCLE_AFTER
+from mail_ratelimit import RateLimiter, DEFAULT_PER_MINUTE, DEFAULT_BURST
+from mail_journal import CampaignJournal, DEFAULT_JOURNAL, campaign_id
+from mail_suppression import SuppressionList, DEFAULT_SUPPRESSION
+from mail_recipients import (RecipientFile, RecipientList, RecipientValidator,
+                             ValidatedRecipients, numbered)
+from mail_recipient_view import RecipientLoader, RecipientTableModel
+from mail_progress import PROGRESS_INTERVAL_MS, ROW_STATUS_NAMES, EventQueue, format_eta
+from mail_accounts import find_accounts, DEFAULT_ACCOUNTS, WEIGHTED
+from mail_timing import PhaseTimings
+from mail_async import AsyncMailCampaign, ASYNC, THREADS, DEFAULT_MAX_IN_FLIGHT
 
 class EmailSendingThread(QThread):
     """E-posta gönderme işlemini arka planda yapar"""
-    progress_updated = pyqtSignal(int, str)
-    finished_signal = pyqtSignal(int, int, str)
+    finished_signal = pyqtSignal(int, int, object)
     error_signal = pyqtSignal(str)
     
-    def __init__(self, email, password, recipients, subject, content, cv_path=None, is_html=False):
+    def __init__(self, email, password, recipients, subject, content, cv_path=None, is_html=False,
+                 connections=DEFAULT_POOL_SIZE, rate_limiter=None, journal=None, batch_size=1,
+                 recycle_after=DEFAULT_RECYCLE_AFTER, total=None, accounts=None,
+                 strategy=WEIGHTED, timings=None, engine=THREADS,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, render_processes=0, statuses=None,
+                 optimize_html=True, domains=None, suppression=None):
         super().__init__()
-        self.email = email
-        self.password = password
-        self.recipients = recipients
-        self.subject = subject
-        self.content = content
         self.cv_path = cv_path
         self.is_html = is_html
-        self.is_cancelled = False
+        # Kampanya olayları kuyruğa yazılır, arayüz zamanlayıcısı kendi thread'inde işler
+        self.events = EventQueue()
+        kwargs = {}
+        campaign_class = MailCampaign
+        if engine == ASYNC:
+            campaign_class = AsyncMailCampaign
+            kwargs['max_in_flight'] = max_in_flight
+        # Gönderim motoru Qt'den bağımsızdır, burada sadece sinyallere bağlanır
+        self.campaign = campaign_class(
+            email, password, recipients, subject, content, [cv_path],
+            connections=connections, rate_limiter=rate_limiter, journal=journal,
+            batch_size=batch_size, recycle_after=recycle_after, total=total,
+            accounts=accounts, strategy=strategy, timings=timings,
+            render_processes=render_processes, optimize_html=optimize_html, domains=domains,
+            suppression=suppression, on_finished=self.events.wrap(self.finished_signal.emit),
+            on_error=self.events.wrap(self.error_signal.emit), **kwargs)
+        # Alıcı tablosundaki durum sütunu doğrudan kampanya sayaçlarından yazılır
+        self.campaign.progress.statuses = statuses
+    
+    @property
+    def is_cancelled(self):
+        return self.campaign.is_cancelled
+    
+    @property
+    def progress(self):
+        """The campaign's ProgressTracker, sampled by the GUI timer"""
+        return self.campaign.progress
     
     def cancel(self):
-        self.is_cancelled = True
+        self.campaign.cancel()
     
     def run(self):
-        successful_sends = 0
-        failed_sends = 0
-        error_message = ""
-        
-        try:
-            # Gmail SMTP sunucusuna bağlan
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            
-            # Kimlik doğrulama
-            server.login(self.email, self.password)
-            
-            for i, recipient in enumerate(self.recipients):
-                if self.is_cancelled:
-                    break
-                
-                try:
-                    # Her 10 e-postada bir 1 dakika bekle (rate limiting)
-                    if i > 0 and i % 10 == 0:
-                        for j in range(60):
-                            if self.is_cancelled:
-                                break
-                            time.sleep(1)
-                    
-                    # HTML formatında mesaj oluştur
-                    msg = MIMEMultipart()
-                    msg['From'] = formataddr(('Gönderen', self.email))
-                    msg['To'] = recipient
-                    msg['Subject'] = self.subject
-                    
-                    # HTML içeriği aynen kullan
-                    html_content = self.content
-                    
-                    text_part = MIMEText(html_content, 'html', 'utf-8')
-                    msg.attach(text_part)
-                    
-                    # CV dosyası varsa ekle
-                    if self.cv_path and os.path.exists(self.cv_path):
-                        with open(self.cv_path, 'rb') as f:
-                            cv_part = MIMEApplication(f.read(), _subtype='pdf')
-                            cv_part.add_header('Content-Disposition', 'attachment', 
-                                                   filename=os.path.basename(self.cv_path))
-                            msg.attach(cv_part)
-                    
-                    # Maili gönder
-                    server.sendmail(self.email, recipient, msg.as_string())
-                    successful_sends += 1
-                    
-                    # Progress güncelle
-                    self.progress_updated.emit(i + 1, f"Sent: {recipient}")
-                    
-                except Exception as e:
-                    failed_sends += 1
-                    error_message += f"Error ({recipient}): {str(e)}\n"
-                    continue
-            
-            server.quit()
-            self.finished_signal.emit(successful_sends, failed_sends, error_message)
-            
-        except smtplib.SMTPAuthenticationError:
-            self.error_signal.emit("Authentication error! Please check your email or app password.")
-        except Exception as e:
-            self.error_signal.emit(f"Connection error: {str(e)}")
+        self.campaign.run()
     
     def text_to_html(self, text):
         """Metni HTML formatına çevirir, satır sonlarını ve boşlukları korur"""
-        # HTML karakterlerini escape et
-        escaped_text = html.escape(text)
-        
-        # Satır sonlarını <br> ile değiştir
-        html_text = escaped_text.replace('\n', '<br>\n')
-        
-        # Çoklu boşlukları korumak için &nbsp; kullan
-        import re
-        # 2 veya daha fazla boşluğu &nbsp; ile değiştir
-        html_text = re.sub(r' {2,}', lambda m: '&nbsp;' * len(m.group()), html_text)
-        
-        # Tab karakterlerini 4 boşlukla değiştir
-        html_text = html_text.replace('\t', '&nbsp;&nbsp;&nbsp;&nbsp;')
-        
-        # HTML yapısı ile sarmayla
-        html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            font-size: 14px;
-            line-height: 1.8;
-            color: #333;
-            margin: 20px;
-            background-color: #ffffff;
-        }}
-        .content {{
-            white-space: pre-wrap;
-            word-wrap: break-word;
-            max-width: 100%;
-        }}
-        p {{
-            margin: 0 0 10px 0;
-        }}
-        .signature {{
-            margin-top: 20px;
-            border-top: 1px solid #eee;
-            padding-top: 15px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="content">{html_text}</div>
-</body>
-</html>"""
-        
-        return html_content
+        return text_to_html(text)
     
     def process_html_content(self, content):
         """HTML içeriğini işler"""
-        # Eğer tam HTML yapısı yoksa, temel yapıyı ekle
-        if '<html>' not in content.lower() and '<body>' not in content.lower():
-            processed_html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            font-size: 14px;
-            line-height: 1.6;
-            color: #333;
-            margin: 20px;
-            background-color: #ffffff;
-        }}
-        .container {{
-            max-width: 600px;
-            margin: 0 auto;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        {content}
-    </div>
-</body>
-</html>"""
-        else:
-            processed_html = content
-        
-        return processed_html
+        return process_html_content(content)
 
 class ModernMailSender(QWidget):
     def __init__(self):
         super().__init__()
         self.cv_path = None
+        self.recipients_file = None
         self.email_thread = None
+        self.recipient_loader = None
+        self.journal = None
+        self.suppression = None
+        self.accounts = None
+        self.timings = None
         self.content_mode = 'html'  # Sadece HTML modu
+        # İlerleme her mesajda değil, sabit aralıklarla okunur
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(PROGRESS_INTERVAL_MS)
+        self.progress_timer.timeout.connect(self.update_progress)
+        self.progress_version = -1
         self.init_ui()
         self.load_settings()
         
@@ -279,15 +179,82 @@ class ModernMailSender(QWidget):
         recipients_frame = self.create_section_frame("Recipients List")
         recipients_layout = QVBoxLayout()
         
-        recipients_label = QLabel("Email addresses (one per line):")
+        recipients_label = QLabel("Email addresses:")
         recipients_label.setStyleSheet("color: #2c3e50; background-color: transparent;")
         recipients_layout.addWidget(recipients_label)
         
-        self.recipients_input = QTextEdit()
-        self.recipients_input.setPlaceholderText("example1@gmail.com\nexample2@gmail.com\nexample3@gmail.com")
-        self.recipients_input.setMaximumHeight(120)
-        self.style_text_input(self.recipients_input)
-        recipients_layout.addWidget(self.recipients_input)
+        # Adres ekleme: yazılan adresler ya da panodaki liste (arka planda yüklenir)
+        recipients_add_layout = QHBoxLayout()
+        self.recipients_input = QLineEdit()
+        self.recipients_input.setPlaceholderText("example1@gmail.com, example2@gmail.com")
+        self.recipients_input.returnPressed.connect(self.add_recipients)
+        self.style_input(self.recipients_input)
+        recipients_add_layout.addWidget(self.recipients_input)
+        
+        self.add_recipients_btn = QPushButton("Add")
+        self.add_recipients_btn.clicked.connect(self.add_recipients)
+        self.style_button(self.add_recipients_btn, "#27ae60")
+        recipients_add_layout.addWidget(self.add_recipients_btn)
+        
+        self.paste_recipients_btn = QPushButton("Paste List")
+        self.paste_recipients_btn.clicked.connect(self.paste_recipients)
+        self.style_button(self.paste_recipients_btn, "#3498db")
+        recipients_add_layout.addWidget(self.paste_recipients_btn)
+        recipients_layout.addLayout(recipients_add_layout)
+        
+        # Arama ve durum filtresi
+        recipients_filter_layout = QHBoxLayout()
+        self.recipients_search = QLineEdit()
+        self.recipients_search.setPlaceholderText("Search recipients...")
+        self.recipients_search.textChanged.connect(self.filter_recipients)
+        self.style_input(self.recipients_search)
+        recipients_filter_layout.addWidget(self.recipients_search)
+        
+        self.recipients_status_filter = QComboBox()
+        self.recipients_status_filter.addItem("All", None)
+        for code, name in enumerate(ROW_STATUS_NAMES):
+            self.recipients_status_filter.addItem(name, code)
+        self.recipients_status_filter.currentIndexChanged.connect(self.filter_recipients)
+        recipients_filter_layout.addWidget(self.recipients_status_filter)
+        recipients_layout.addLayout(recipients_filter_layout)
+        
+        # Sanal tablo: yalnızca görünen satırlar okunur, milyon satırda da akıcı kalır
+        self.recipient_model = RecipientTableModel(self)
+        self.recipients_table = QTableView()
+        self.recipients_table.setModel(self.recipient_model)
+        self.recipients_table.setMinimumHeight(220)
+        self.recipients_table.setWordWrap(False)
+        self.recipients_table.setAlternatingRowColors(True)
+        self.recipients_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.recipients_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        rows_header = self.recipients_table.verticalHeader()
+        rows_header.setSectionResizeMode(QHeaderView.Fixed)
+        rows_header.setDefaultSectionSize(24)
+        columns_header = self.recipients_table.horizontalHeader()
+        columns_header.setSectionResizeMode(0, QHeaderView.Stretch)
+        columns_header.setSectionResizeMode(1, QHeaderView.Fixed)
+        columns_header.resizeSection(1, 110)
+        recipients_layout.addWidget(self.recipients_table)
+        
+        self.recipients_count_label = QLabel("0 recipients")
+        self.recipients_count_label.setStyleSheet("color: #7f8c8d; background-color: transparent;")
+        recipients_layout.addWidget(self.recipients_count_label)
+        
+        # Büyük listeler için dosyadan akış (CSV/TXT)
+        recipients_file_layout = QHBoxLayout()
+        self.recipients_file_label = QLabel("Or load a CSV/TXT list file")
+        recipients_file_layout.addWidget(self.recipients_file_label)
+        
+        recipients_file_btn = QPushButton("Load List File")
+        recipients_file_btn.clicked.connect(self.select_recipients_file)
+        self.style_button(recipients_file_btn, "#3498db")
+        recipients_file_layout.addWidget(recipients_file_btn)
+        
+        recipients_file_clear_btn = QPushButton("Remove List")
+        recipients_file_clear_btn.clicked.connect(self.clear_recipients)
+        self.style_button(recipients_file_clear_btn, "#e74c3c")
+        recipients_file_layout.addWidget(recipients_file_clear_btn)
+        recipients_layout.addLayout(recipients_file_layout)
         
         recipients_frame.setLayout(recipients_layout)
         content_layout.addWidget(recipients_frame)
@@ -308,7 +275,10 @@ class ModernMailSender(QWidget):
         content_mail_layout.addLayout(subject_layout)
         
         # Minimal helper text (no icons)
-        helper_label = QLabel("Paste your HTML email below. It will be sent exactly as written.")
+        # Metin ayarlar okununca OPTIMIZE_HTML'e göre yazılır
+        self.helper_label = helper_label = QLabel()
+        helper_label.setWordWrap(True)
+        helper_label.setTextFormat(Qt.PlainText)
         helper_label.setStyleSheet("""
             QLabel {
                 font-size: 12px;
@@ -388,6 +358,12 @@ class ModernMailSender(QWidget):
         self.status_label.setStyleSheet("color: #7f8c8d; font-style: italic;")
         send_layout.addWidget(self.status_label)
         
+        # Aşama süreleri: gönderim sırasında da açılıp kapatılabilir
+        self.timings_check = QCheckBox("Record timings")
+        self.timings_check.setStyleSheet("color: #7f8c8d; background-color: transparent;")
+        self.timings_check.toggled.connect(self.toggle_timings)
+        send_layout.addWidget(self.timings_check)
+        
         # Send button
         self.send_btn = QPushButton("Send Emails")
         self.send_btn.clicked.connect(self.send_emails)
@@ -568,6 +544,103 @@ class ModernMailSender(QWidget):
         self.cv_label.setText("No CV selected")
         self.cv_label.setStyleSheet("color: #7f8c8d;")
     
+    def select_recipients_file(self):
+        """Selects a recipient list file that is streamed while sending"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Recipient List", "", "Recipient Lists (*.csv *.tsv *.txt)")
+        
+        if file_path:
+            try:
+                source = RecipientFile(file_path)
+                rows = source.count()
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "Recipients Error", f"Cannot read list file:\n{e}")
+                return
+            self.recipients_file = source
+            self.set_recipients_editable(False)
+            self.recipients_file_label.setText(f"List: {os.path.basename(file_path)} (~{rows} rows)")
+            self.recipients_file_label.setStyleSheet("color: #27ae60; font-weight: bold;")
+            # Gönderimde dosya aynı doğrulayıcı ayarlarıyla tekrar akıtılır, satır sırası aynı kalır
+            self.load_recipients(RecipientList(RecipientValidator(rows)), source)
+    
+    def clear_recipients(self):
+        """Empties the recipient list and removes the list file"""
+        self.stop_loading_recipients()
+        self.recipients_file = None
+        self.set_recipients_editable(True)
+        self.recipients_file_label.setText("Or load a CSV/TXT list file")
+        self.recipients_file_label.setStyleSheet("color: #7f8c8d;")
+        self.recipient_model.set_list(RecipientList())
+        self.update_recipient_count()
+    
+    def set_recipients_editable(self, enabled):
+        """Typed and pasted addresses are only added to lists that are not a file"""
+        self.recipients_input.setEnabled(enabled)
+        self.add_recipients_btn.setEnabled(enabled)
+        self.paste_recipients_btn.setEnabled(enabled)
+    
+    def add_recipients(self):
+        """Adds the typed addresses to the list"""
+        addresses = [a for a in re.split(r'[\s,;]+', self.recipients_input.text()) if a]
+        if not addresses or self.is_loading_recipients():
+            return
+        self.recipient_model.grow(self.recipient_model.recipient_list.add(addresses))
+        self.recipients_input.clear()
+        self.update_recipient_count()
+    
+    def paste_recipients(self):
+        """Adds the clipboard's addresses (one per line) in the background"""
+        text = QApplication.clipboard().text()
+        if not text.strip() or self.is_loading_recipients():
+            return
+        self.load_recipients(self.recipient_model.recipient_list,
+                             (line for line in text.splitlines() if line.strip()))
+    
+    def load_recipients(self, recipient_list, source):
+        """Shows recipient_list and fills it from source on a loader thread"""
+        self.stop_loading_recipients()
+        self.recipient_model.set_list(recipient_list)
+        loader = RecipientLoader(recipient_list, source)
+        # Eski bir yükleyicinin geç gelen sinyalleri yeni listeye uygulanmaz
+        loader.rows_loaded.connect(lambda count, loader=loader: self.recipients_loaded(loader, count))
+        loader.load_failed.connect(self.recipients_load_failed)
+        loader.finished.connect(self.update_recipient_count)
+        self.recipient_loader = loader
+        loader.start()
+        self.update_recipient_count()
+    
+    def stop_loading_recipients(self):
+        if self.recipient_loader is not None:
+            self.recipient_loader.cancel()
+            self.recipient_loader.wait()
+            self.recipient_loader = None
+    
+    def is_loading_recipients(self):
+        return self.recipient_loader is not None and self.recipient_loader.isRunning()
+    
+    def recipients_loaded(self, loader, count):
+        if loader is self.recipient_loader:
+            self.recipient_model.grow(count)
+            self.update_recipient_count()
+    
+    def recipients_load_failed(self, message):
+        QMessageBox.warning(self, "Recipients Error", f"Cannot read the recipient list:\n{message}")
+    
+    def update_recipient_count(self):
+        """Shows how many addresses were accepted and skipped"""
+        stats = self.recipient_model.recipient_list.validator.stats()
+        text = f"{stats['accepted']} recipients"
+        if stats['invalid'] or stats['duplicates']:
+            text += f"  •  skipped {stats['invalid']} invalid, {stats['duplicates']} duplicates"
+        if self.is_loading_recipients():
+            text += "  •  loading..."
+        self.recipients_count_label.setText(text)
+    
+    def filter_recipients(self, *args):
+        """Applies the search text and status filter to the recipient table"""
+        self.recipient_model.set_filter(self.recipients_search.text(),
+                                        self.recipients_status_filter.currentData())
+    
     def get_html_placeholder(self):
         """Returns HTML placeholder text"""
         return """Paste your HTML email template here.
@@ -660,6 +733,8 @@ class ModernMailSender(QWidget):
             "1. Paste your HTML template in the editor above.\n"
             "2. Enter recipients and the email subject.\n"
             "3. Start sending emails.\n\n"
+            "With a CSV list, {{column}} placeholders such as {{first_name}} or {{company|there}} "
+            "are filled from each recipient's row.\n"
             "Your HTML is sent as you provide it using encrypted SMTP."
         )
         instructions.setStyleSheet("""
@@ -689,46 +764,105 @@ class ModernMailSender(QWidget):
         # Input validation
         email = self.email_input.text().strip()
         password = self.password_input.text().strip()
-        recipients_text = self.recipients_input.toPlainText().strip()
+        if self.accounts:
+            # Hesaplar accounts.ini dosyasından gelir
+            email, password = self.accounts[0].email, self.accounts[0].password
+        recipient_list = self.recipient_model.recipient_list
         subject = self.subject_input.text().strip()
         content = self.content_input.toPlainText().strip()
         
-        if not all([email, password, recipients_text, subject, content]):
+        has_recipients = len(recipient_list) > 0 or self.recipients_file is not None
+        if not all([email, password or self.accounts, has_recipients, subject, content]):
             QMessageBox.warning(self, "Missing Information", 
                 "Please fill in all required fields!")
             return
         
-        # Extract email addresses
-        recipients = [line.strip() for line in recipients_text.split('\n') 
-                     if line.strip() and '@' in line]
+        if self.is_loading_recipients():
+            QMessageBox.information(self, "Recipients Loading",
+                "The recipient list is still loading, please wait a moment.")
+            return
         
-        if not recipients:
+        # Adresler yüklenirken doğrulandı; tekrar ayrıştırmaya gerek yok
+        stats = recipient_list.validator.stats()
+        total = len(recipient_list)
+        if self.recipients_file is not None:
+            # Dosya listesi gönderim sırasında tekrar akıtılır, satırlar tablo ile aynı sırada gelir
+            recipients = numbered(ValidatedRecipients(self.recipients_file,
+                                                      self.recipients_file.count()))
+        else:
+            recipients = numbered(recipient_list)
+        recipient_list.reset_statuses()
+        self.recipient_model.refresh_statuses()
+        
+        if not total:
             QMessageBox.warning(self, "Recipients Error", 
                 "No valid email addresses found!")
             return
         
+        skipped = ""
+        if stats['invalid'] or stats['duplicates']:
+            skipped = (f"\n\nSkipped {stats['invalid']} invalid and "
+                       f"{stats['duplicates']} duplicate addresses.")
+        
+        # Şablon bir kez işlenir; kampanya aynı sonucu önbellekten alır
+        problems = prepare_html(content, self.optimize_html, self.optimize_html).problems
+        if problems:
+            skipped += "\n\nThe HTML template looks broken:\n" + "\n".join(problems[:5])
+        
         # Ask for confirmation
         reply = QMessageBox.question(self, "Confirmation", 
-            f"Are you sure you want to send emails to {len(recipients)} people?",
+            f"Are you sure you want to send emails to {total} people?{skipped}",
                 QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         
         if reply == QMessageBox.No:
             return
         
+        # Kampanya günlüğü: yarıda kalan gönderim kaldığı yerden devam edebilir
+        self.journal = CampaignJournal(DEFAULT_JOURNAL, campaign_id(email, subject, content))
+        if len(self.journal):
+            resume = QMessageBox.question(self, "Resume Campaign",
+                f"{len(self.journal)} recipients already received this email in a previous run.\n"
+                f"Skip them and continue where it stopped?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if resume == QMessageBox.No:
+                self.journal.reset()
+        # Abonelikten çıkanlar ve kalıcı hata veren adresler atlanır
+        self.suppression = SuppressionList(self.suppression_file)
+        
         # Update UI
         self.send_btn.setEnabled(False)
         self.cancel_btn.setVisible(True)
         self.progress_bar.setVisible(True)
-        self.progress_bar.setMaximum(len(recipients))
+        self.progress_bar.setMaximum(total)
         self.progress_bar.setValue(0)
         self.status_label.setText("Initializing email campaign...")
         
+        self.timings = PhaseTimings(self.timings_check.isChecked(), trace=bool(self.trace_file))
+        
+        domains = None
+        if self.domain_concurrency or self.domain_rate or self.domain_limits:
+            domains = DomainScheduler(self.domain_concurrency or DEFAULT_DOMAIN_CONCURRENCY,
+                                      self.domain_rate, self.domain_limits)
+        
         # Start thread (always HTML mode)
         self.email_thread = EmailSendingThread(
-            email, password, recipients, subject, content, self.cv_path, True)
-        self.email_thread.progress_updated.connect(self.update_progress)
+            email, password, recipients, subject, content, self.cv_path, True,
+            rate_limiter=RateLimiter(self.rate_per_minute, self.rate_burst),
+            journal=self.journal, batch_size=self.batch_size,
+            recycle_after=self.recycle_after, total=total,
+            accounts=self.accounts, strategy=self.strategy, timings=self.timings,
+            engine=self.engine, max_in_flight=self.max_in_flight,
+            render_processes=self.render_processes, statuses=recipient_list.statuses,
+            optimize_html=self.optimize_html, domains=domains, suppression=self.suppression)
+        self.progress_version = -1
+        self.progress_timer.start()
         self.email_thread.finished_signal.connect(self.sending_finished)
         self.email_thread.error_signal.connect(self.sending_error)
+        self.email_thread.finished.connect(self.dispatch_events)
+        # Eski kampanyanın thread'i iptalden sonra biterken yenisinin dosyalarını kapatmamalı
+        self.email_thread.finished.connect(
+            lambda journal=self.journal, suppression=self.suppression:
+                self.close_journal(journal, suppression))
         self.email_thread.start()
     
     def cancel_sending(self):
@@ -737,30 +871,95 @@ class ModernMailSender(QWidget):
             self.email_thread.cancel()
         self.reset_ui()
     
-    def update_progress(self, value, status):
-        """Updates progress bar"""
-        self.progress_bar.setValue(value)
-        self.status_label.setText(status)
+    def dispatch_events(self):
+        """Delivers the campaign's queued finished/error events on the GUI thread"""
+        if self.email_thread:
+            self.email_thread.events.dispatch()
+    
+    def update_progress(self):
+        """Updates progress bar from the latest campaign snapshot"""
+        if not self.email_thread:
+            return
+        self.dispatch_events()
+        # İptal edilen kampanyanın sonucu beklenirken çubuk gizlidir, boşuna çizilmez
+        if not self.progress_timer.isActive() or not self.progress_bar.isVisible():
+            return
+        snap = self.email_thread.progress.snapshot()
+        if snap.version == self.progress_version:
+            return
+        self.progress_version = snap.version
+        self.progress_bar.setValue(snap.done)
+        # Durum sütunu aynı zamanlayıcıyla tazelenir; tablo yalnızca görünen satırları çizer
+        self.recipient_model.refresh_statuses()
+        counts = (f"✅ {snap.sent}  ❌ {snap.failed}  ⏳ {snap.queued} queued"
+                  f"  •  {snap.rate:.0f} emails/min  •  ETA {format_eta(snap.eta)}")
+        if snap.deferred:
+            counts += f"  •  {snap.deferred} deferred"
+        self.status_label.setText(f"{counts}\n{snap.status}")
     
-    def sending_finished(self, successful, failed, error_msg):
+    def sending_finished(self, successful, failed, errors):
         """Called when sending is completed"""
+        self.progress_timer.stop()
+        self.recipient_model.refresh_statuses()
         self.reset_ui()
         
+        timing_summary = self.timings.summary() if self.timings else ""
+        if timing_summary:
+            timing_summary = f"\n\nTime per phase:\n{timing_summary}"
+            if self.trace_file:
+                try:
+                    self.timings.write_trace(self.trace_file)
+                except OSError as e:
+                    timing_summary += f"\n\nCannot write trace {self.trace_file}: {e}"
+        
         if failed == 0:
             QMessageBox.information(self, "Success", 
-                f"All emails sent successfully! ({successful} emails)")
+                f"All emails sent successfully! ({successful} emails){timing_summary}")
         else:
-            QMessageBox.warning(self, "Partial Success", 
+            # Hatalar türe göre gruplanır; tam liste dışa aktarılabilir
+            box = QMessageBox(QMessageBox.Warning, "Partial Success",
                 f"Sending result:\n"
                 f"✅ Successful: {successful} emails\n"
                 f"❌ Failed: {failed} emails\n\n"
-                f"Error details:\n{error_msg[:500]}{'...' if len(error_msg) > 500 else ''}")
+                f"Errors by type:\n{errors.summary()}{timing_summary}", QMessageBox.Ok, self)
+            export_btn = box.addButton("Export Errors...", QMessageBox.ActionRole)
+            box.exec_()
+            if box.clickedButton() is export_btn:
+                self.export_errors(errors)
+        errors.close()
+    
+    def toggle_timings(self, checked):
+        """Turns phase timing on or off, also for a campaign that is running"""
+        if self.timings is not None:
+            self.timings.enabled = checked
+    
+    def export_errors(self, errors):
+        """Saves every failed recipient with its error to a CSV or JSON file"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Errors", "failed_recipients.csv", "CSV (*.csv);;JSON (*.json)")
+        if not file_path:
+            return
+        try:
+            errors.export(file_path)
+        except OSError as e:
+            QMessageBox.warning(self, "Export Error", f"Cannot write {file_path}:\n{e}")
     
     def sending_error(self, error_msg):
         """Called when sending error occurs"""
+        self.progress_timer.stop()
+        self.recipient_model.refresh_statuses()
         self.reset_ui()
         QMessageBox.critical(self, "Error", f"An error occurred while sending emails:\n\n{error_msg}")
     
+    def close_journal(self, journal, suppression):
+        """Flushes and closes the journal and suppression list of a finished thread"""
+        journal.close()
+        suppression.close()
+        if self.journal is journal:
+            self.journal = None
+        if self.suppression is suppression:
+            self.suppression = None
+    
     def reset_ui(self):
         """Resets UI to initial state"""
         self.send_btn.setEnabled(True)
@@ -774,7 +973,56 @@ class ModernMailSender(QWidget):
         load_dotenv()
         saved_email = os.getenv('EMAIL', '')
         saved_password = os.getenv('PASSWORD', '')
+        # Sağlayıcı kotasına göre ayarlanabilir gönderim hızı
+        self.rate_per_minute = float(os.getenv('RATE_PER_MINUTE', DEFAULT_PER_MINUTE))
+        self.rate_burst = int(os.getenv('RATE_BURST', DEFAULT_BURST))
+        # Kişiselleştirilmemiş mailde bir SMTP işlemindeki alıcı sayısı (Bcc)
+        self.batch_size = int(os.getenv('BATCH_SIZE', 1))
+        # Uzun kampanyalarda SMTP oturumu bu kadar mesajdan sonra yenilenir
+        self.recycle_after = int(os.getenv('RECYCLE_AFTER', DEFAULT_RECYCLE_AFTER))
+        # Birden fazla gönderici hesabı: alıcılar hesaplar arasında paylaştırılır
+        self.strategy = os.getenv('SCHEDULING', WEIGHTED)
+        # Aşama süreleri ve isteğe bağlı Chrome trace dosyası
+        self.timings_check.setChecked(os.getenv('TIMINGS', '') in ('1', 'true', 'yes'))
+        self.trace_file = os.getenv('TRACE_FILE', '') or None
+        # Gönderim motoru: oturum başına thread ya da tek asyncio döngüsü
+        self.engine = os.getenv('ENGINE', THREADS)
+        self.max_in_flight = int(os.getenv('MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT))
+        # Kişiselleştirilmiş mesajları işleyen süreç sayısı (0: gönderim thread'lerinde)
+        self.render_processes = int(os.getenv('RENDER_PROCESSES', 0))
+        # HTML gövdesi: <style> kuralları satır içine alınır, boşluklar küçültülür
+        self.optimize_html = os.getenv('OPTIMIZE_HTML', '1') not in ('0', 'false', 'no')
+        if self.optimize_html:
+            self.helper_label.setText(
+                "Paste your HTML email below. Before sending, <style> rules are inlined and "
+                "whitespace is minified (set OPTIMIZE_HTML=0 in .env to send it exactly as written).")
+        else:
+            self.helper_label.setText(
+                "Paste your HTML email below. It will be sent exactly as written.")
+        # Alıcı alan adı başına eşzamanlılık ve hız sınırı (0: liste sırasıyla gönder)
+        self.domain_concurrency = int(os.getenv('DOMAIN_CONCURRENCY', 0))
+        self.domain_rate = float(os.getenv('DOMAIN_RATE', 0))
+        try:
+            self.domain_limits = parse_domain_limits(os.getenv('DOMAIN_LIMITS', ''))
+        except ValueError as e:
+            self.domain_limits = {}
+            QMessageBox.warning(self, "Settings Error", f"DOMAIN_LIMITS: {e}")
+        # Hiç gönderilmeyecek adresler (abonelikten çıkanlar, kalıcı hatalar)
+        self.suppression_file = os.getenv('SUPPRESSION_FILE', DEFAULT_SUPPRESSION)
+        try:
+            self.accounts = find_accounts()
+        except (OSError, ValueError) as e:
+            self.accounts = None
+            QMessageBox.warning(self, "Accounts Error",
+                f"Cannot read {os.getenv('ACCOUNTS_FILE', DEFAULT_ACCOUNTS)}:\n{e}")
         
+        if self.accounts:
+            self.email_input.setText(", ".join(a.email for a in self.accounts))
+            self.email_input.setEnabled(False)
+            self.password_input.setEnabled(False)
+            self.password_input.setPlaceholderText(
+                f"{len(self.accounts)} accounts from {os.getenv('ACCOUNTS_FILE', DEFAULT_ACCOUNTS)}")
+            return
         if saved_email:
             self.email_input.setText(saved_email)
         if saved_password:
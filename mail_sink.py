@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in SMTP server for testing and benchmarking without Gmail
+
+Accepts any login and throws every message away. Latency, refused
+recipients, throttling replies, dropped connections and per-recipient-domain
+limits can be injected to see how the sending engine copes:
+
+    python mail_sink.py --port 2525 --latency 0.02 --error-rate 0.01 --disconnect-after 100
+    python mail_sink.py --port 2525 --domain-concurrency 2 --domain-rate 20
+    python mail_cli.py --host 127.0.0.1 --port 2525 --password "" ...
+"""
+import argparse
+import collections
+import json
+import random
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+from mail_ratelimit import TokenBucket
+
+ERROR_TEXT = {
+    421: b'4.7.0 Try again later, closing connection',
+    450: b'4.2.1 Mailbox busy, try again later',
+    451: b'4.7.1 Too many messages, slow down',
+    # Alan adı sınırları için ayrı metin: istemci günlüklerinde ayırt edilebilsin
+    'domain': b'4.7.0 Too many messages for this domain, try again later',
+    452: b'4.5.3 Too many recipients',
+    550: b'5.1.1 No such user',
+    552: b'5.2.2 Mailbox full',
+    554: b'5.7.1 Message rejected',
+}
+
+
+class _Disconnect(Exception):
+    pass
+
+
+class _SessionHandler(socketserver.BaseRequestHandler):
+    """One SMTP conversation; commands may arrive pipelined"""
+
+    def setup(self):
+        self.sink = self.server.sink
+        self.pending = []
+        self.lines = self._read_lines()
+        # Bu işlemde alıcısı olan alan adları (eşzamanlılık sınırı için)
+        self.domains = set()
+
+    def finish(self):
+        self.end_transaction()
+
+    def end_transaction(self):
+        if self.domains:
+            self.sink._leave_domains(self.domains)
+            self.domains = set()
+
+    def handle(self):
+        sink = self.sink
+        sink._count('connections')
+        self.reply(220, b'mail_sink ESMTP ready')
+        sender, recipients, delivered = None, [], 0
+        try:
+            for line in self.lines:
+                verb, _, arg = line.partition(b' ')
+                verb = verb.upper()
+                if verb in (b'EHLO', b'HELO'):
+                    sender, recipients = None, []
+                    self.end_transaction()
+                    if verb == b'HELO':
+                        self.reply(250, b'mail_sink')
+                    else:
+                        self.reply(250, b'mail_sink', b'PIPELINING', b'8BITMIME',
+                                   b'SIZE 52428800', b'AUTH PLAIN LOGIN')
+                elif verb == b'AUTH':
+                    self.auth(arg)
+                elif verb == b'MAIL':
+                    if sink.disconnect_after and delivered >= sink.disconnect_after:
+                        # Gmail gibi: oturum başına mesaj sınırı dolunca bağlantıyı kapat
+                        sink._count('disconnects')
+                        self.reply(421, ERROR_TEXT[421])
+                        raise _Disconnect()
+                    if sink.bucket is not None and sink.bucket.try_acquire() > 0:
+                        sink._count('throttled')
+                        code = sink.throttle_code
+                        self.reply(code, ERROR_TEXT.get(code, b'Slow down'))
+                        if code == 421:
+                            raise _Disconnect()
+                        continue
+                    sender, recipients = arg, []
+                    self.end_transaction()
+                    self.reply(250, b'2.1.0 OK')
+                elif verb == b'RCPT':
+                    if sender is None:
+                        self.reply(503, b'5.5.1 MAIL first')
+                    elif sink.error_rate and sink.random() < sink.error_rate:
+                        sink._count('rejected')
+                        self.reply(sink.error_code, ERROR_TEXT.get(sink.error_code, b'Rejected'))
+                    elif not self.enter_domain(arg):
+                        sink._count('domain_throttled')
+                        self.reply(sink.domain_throttle_code, ERROR_TEXT['domain'])
+                    else:
+                        recipients.append(arg)
+                        self.reply(250, b'2.1.5 OK')
+                elif verb == b'DATA':
+                    if not recipients:
+                        self.reply(503, b'5.5.1 RCPT first')
+                        continue
+                    self.reply(354, b'End data with <CR><LF>.<CR><LF>')
+                    size = self.read_data()
+                    if sink.drop_rate and sink.random() < sink.drop_rate:
+                        sink._count('disconnects')
+                        raise _Disconnect()
+                    if sink.delivery_delay:
+                        time.sleep(sink.delivery_delay)
+                    sink._delivered(len(recipients), size)
+                    delivered += 1
+                    sender, recipients = None, []
+                    self.end_transaction()
+                    self.reply(250, b'2.0.0 OK queued')
+                elif verb == b'RSET':
+                    sender, recipients = None, []
+                    self.end_transaction()
+                    self.reply(250, b'2.0.0 OK')
+                elif verb == b'NOOP':
+                    self.reply(250, b'2.0.0 OK')
+                elif verb == b'QUIT':
+                    self.reply(221, b'2.0.0 Bye')
+                    self.flush()
+                    return
+                else:
+                    self.reply(502, b'5.5.2 Command not implemented')
+        except (_Disconnect, OSError):
+            pass
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def enter_domain(self, arg):
+        """Counts this transaction against the recipient's domain; False if over a limit"""
+        sink = self.sink
+        if not (sink.domain_concurrency or sink.domain_rate):
+            return True
+        address = arg.partition(b':')[2].strip(b' <>').split(b'>')[0]
+        domain = address.rpartition(b'@')[2].lower()
+        if domain in self.domains:
+            return True
+        if not sink._enter_domain(domain):
+            return False
+        self.domains.add(domain)
+        return True
+
+    def auth(self, arg):
+        mechanism, _, initial = arg.partition(b' ')
+        mechanism = mechanism.upper()
+        if mechanism == b'PLAIN':
+            if not initial:
+                self.reply(334, b'')
+                next(self.lines, None)
+        elif mechanism == b'LOGIN':
+            if not initial:
+                self.reply(334, b'VXNlcm5hbWU6')
+                next(self.lines, None)
+            self.reply(334, b'UGFzc3dvcmQ6')
+            next(self.lines, None)
+        else:
+            self.reply(504, b'5.5.4 Unrecognized authentication type')
+            return
+        self.reply(235, b'2.7.0 Authentication successful')
+
+    def read_data(self):
+        size = 0
+        for line in self.lines:
+            if line == b'.':
+                return size
+            size += len(line) + 2
+        raise _Disconnect()
+
+    def reply(self, code, *lines):
+        lines = lines or (b'',)
+        for i, text in enumerate(lines):
+            sep = b' ' if i == len(lines) - 1 else b'-'
+            self.pending.append(b'%d%s%s\r\n' % (code, sep, text))
+
+    def flush(self):
+        if not self.pending:
+            return
+        # Gecikme tur başına bir kez uygulanır: pipelining ile gelen komutlar tek turda yanıtlanır
+        if self.sink.latency:
+            time.sleep(self.sink.latency)
+        data, self.pending = b''.join(self.pending), []
+        self.request.sendall(data)
+
+    def _read_lines(self):
+        """Yields CRLF-terminated lines, answering only when the client waits"""
+        sock = self.request
+        rest = b''
+        while True:
+            self.flush()
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            lines = (rest + chunk).split(b'\r\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Yüzlerce eşzamanlı bağlantı açan istemciler için geniş kabul kuyruğu
+    request_queue_size = 1024
+
+
+class SMTPSink:
+    """Threaded SMTP server on localhost with injectable misbehaviour
+
+    latency is the round-trip delay added before each batch of replies,
+    delivery_delay the processing time per message. error_rate of the
+    recipients are refused with error_code, drop_rate of the messages end
+    with the connection cut before the final reply, and disconnect_after
+    closes each connection with 421 after that many messages. rate_limit
+    (messages per second, server-wide) answers MAIL with throttle_code once
+    exceeded.
+
+    Receiving domains can be limited too, as big webmail providers do:
+    domain_concurrency caps the transactions open at once, across all
+    connections, that have a recipient in the same domain, and domain_rate
+    the recipients per second of one domain. Recipients over either limit
+    are answered with domain_throttle_code at RCPT TO.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, delivery_delay=0.0,
+                 error_rate=0.0, error_code=550, drop_rate=0.0, disconnect_after=0,
+                 rate_limit=0, throttle_code=451, domain_concurrency=0, domain_rate=0,
+                 domain_throttle_code=450, seed=None):
+        self.latency = latency
+        self.delivery_delay = delivery_delay
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.drop_rate = drop_rate
+        self.disconnect_after = disconnect_after
+        self.throttle_code = throttle_code
+        self.bucket = TokenBucket(rate_limit, rate_limit) if rate_limit else None
+        self.domain_concurrency = domain_concurrency
+        self.domain_rate = domain_rate
+        self.domain_throttle_code = domain_throttle_code
+        self._domain_open = collections.Counter()
+        self._domain_buckets = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('connections', 'messages', 'recipients', 'bytes',
+                                     'rejected', 'throttled', 'domain_throttled',
+                                     'disconnects'), 0)
+        self._server = _Server((host, port), _SessionHandler)
+        self._server.sink = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _delivered(self, recipients, size):
+        with self._lock:
+            self._stats['messages'] += 1
+            self._stats['recipients'] += recipients
+            self._stats['bytes'] += size
+
+    def _enter_domain(self, domain):
+        with self._lock:
+            if self.domain_concurrency and self._domain_open[domain] >= self.domain_concurrency:
+                return False
+            if self.domain_rate:
+                bucket = self._domain_buckets.get(domain)
+                if bucket is None:
+                    bucket = self._domain_buckets[domain] = TokenBucket(self.domain_rate,
+                                                                        self.domain_rate)
+                if bucket.try_acquire() > 0:
+                    return False
+            self._domain_open[domain] += 1
+            return True
+
+    def _leave_domains(self, domains):
+        with self._lock:
+            for domain in domains:
+                self._domain_open[domain] -= 1
+                if self._domain_open[domain] <= 0:
+                    del self._domain_open[domain]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.1}, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever(poll_interval=0.1)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Local SMTP sink for tests and benchmarks.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525, help='0 picks a free port')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every reply round trip')
+    parser.add_argument('--delivery-delay', type=float, default=0.0,
+                        help='seconds spent accepting each message')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of recipients refused with --error-code')
+    parser.add_argument('--error-code', type=int, default=550)
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='fraction of messages whose connection is cut before the reply')
+    parser.add_argument('--disconnect-after', type=int, default=0,
+                        help='close each connection with 421 after this many messages')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='messages/second accepted server-wide before throttling')
+    parser.add_argument('--throttle-code', type=int, default=451)
+    parser.add_argument('--domain-concurrency', type=int, default=0,
+                        help='transactions open at once per recipient domain before throttling')
+    parser.add_argument('--domain-rate', type=float, default=0,
+                        help='recipients/second accepted per recipient domain before throttling')
+    parser.add_argument('--domain-throttle-code', type=int, default=450)
+    parser.add_argument('--seed', type=int)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sink = SMTPSink(args.host, args.port, args.latency, args.delivery_delay,
+                    args.error_rate, args.error_code, args.drop_rate, args.disconnect_after,
+                    args.rate_limit, args.throttle_code, args.domain_concurrency,
+                    args.domain_rate, args.domain_throttle_code, args.seed)
+
+    def _stop(signum, frame):
+        raise KeyboardInterrupt()
+    signal.signal(signal.SIGTERM, _stop)
+
+    host, port = sink.address
+    print('listening on %s:%d' % (host, port), flush=True)
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink._server.server_close()
+    print(json.dumps(sink.stats()), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""Addresses that must never be mailed again: unsubscribes, hard bounces, complaints
+
+The list lives in SQLite (suppression.db). Lookups go through a sorted file
+of 64-bit address hashes next to it (suppression.db.idx), read through
+mmap, so a list with millions of entries opens instantly and costs no
+Python objects per entry:
+
+    python mail_suppression.py import unsubscribed.csv --reason unsubscribed
+    python mail_suppression.py export suppression.csv
+    python mail_suppression.py check someone@example.com
+"""
+import argparse
+import array
+import bisect
+import csv
+import hashlib
+import itertools
+import mmap
+import os
+import re
+import smtplib
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+from mail_recipients import EMAIL_RE, RecipientFile, normalize_address
+
+DEFAULT_SUPPRESSION = 'suppression.db'
+UNSUBSCRIBED = 'unsubscribed'
+BOUNCED = 'bounced'
+COMPLAINED = 'complained'
+MANUAL = 'manual'
+REASONS = (UNSUBSCRIBED, BOUNCED, COMPLAINED, MANUAL)
+
+# Adresin kendisini reddeden kalıcı yanıtlar (bilinmeyen kullanıcı, kapalı kutu)
+HARD_BOUNCE_CODES = (550, 551, 553)
+_ENHANCED_STATUS_RE = re.compile(r'^\s*(5\.\d{1,3}\.\d{1,3})\b')
+
+IMPORT_BATCH = 10000
+# İndeks dosyası: başlık, 2**16 kovanın başlangıçları, sıralı anahtarlar
+_MAGIC = b'MSUPIDX' + (b'L' if sys.byteorder == 'little' else b'B')
+_HEADER = struct.Struct('=8sqq')
+_BUCKETS = 1 << 16
+
+
+def address_key(address):
+    """Signed 64-bit hash of the normalized, lower-cased address"""
+    data = normalize_address(address).lower().encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=True)
+
+
+def _bucket(key):
+    # İşaretli anahtarlarda üst 16 bit sıralamayla aynı yönde artar
+    return (key >> 48) + (_BUCKETS >> 1)
+
+
+def is_hard_status(status):
+    """True for an enhanced status code ("5.1.1") that condemns the address itself
+
+    5.1.x (bad mailbox or domain) and 5.2.1 (mailbox disabled) do; 5.2.2
+    (mailbox full) or 5.7.x (policy, spam) say nothing about the address.
+    """
+    parts = status.split('.')
+    return len(parts) == 3 and parts[0] == '5' and (parts[1] == '1' or parts[1:] == ['2', '1'])
+
+
+def is_hard_bounce(error):
+    """True for a permanent refusal of the address itself at RCPT TO
+
+    An enhanced status code in the reply decides when present (see
+    is_hard_status); without one, 550/551/553 count.
+    """
+    if not isinstance(error, smtplib.SMTPRecipientsRefused) or not error.recipients:
+        return False
+    code, message = next(iter(error.recipients.values()))
+    if not 500 <= code < 600:
+        return False
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', 'replace')
+    status = _ENHANCED_STATUS_RE.match(message or '')
+    if status:
+        return is_hard_status(status.group(1))
+    return code in HARD_BOUNCE_CODES
+
+
+class _Index:
+    """Read-only view of an index file: bucket offsets plus sorted keys, via mmap"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise
+        view = memoryview(self._map)
+        magic, self.generation, self.count = _HEADER.unpack_from(view)
+        start = _HEADER.size
+        end = start + (_BUCKETS + 1) * 8
+        if magic != _MAGIC or len(view) != end + self.count * 8:
+            view.release()
+            self.close()
+            raise ValueError('Not a suppression index: %s' % path)
+        self._view = view
+        self.offsets = view[start:end].cast('q')
+        self.keys = view[end:].cast('q')
+
+    def __contains__(self, key):
+        b = _bucket(key)
+        keys = self.keys
+        lo, hi = self.offsets[b], self.offsets[b + 1]
+        i = bisect.bisect_left(keys, key, lo, hi)
+        return i < hi and keys[i] == key
+
+    @staticmethod
+    def write(path, generation, keys):
+        """Writes sorted keys (an array('q')) as an index file, atomically"""
+        offsets = array.array('q', (bisect.bisect_left(keys, (b - (_BUCKETS >> 1)) << 48)
+                                    for b in range(_BUCKETS)))
+        offsets.append(len(keys))
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, generation, len(keys)))
+                offsets.tofile(f)
+                keys.tofile(f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def close(self):
+        for view in ('offsets', 'keys', '_view'):
+            if getattr(self, view, None) is not None:
+                getattr(self, view).release()
+                setattr(self, view, None)
+        self._map.close()
+        self._file.close()
+
+
+class SuppressionList:
+    """Persistent set of addresses excluded from every campaign
+
+    Entries (address, reason, detail, time added) are kept in SQLite, which
+    is the source of truth and what export() reads. Membership tests use
+    an index file of sorted 64-bit address hashes, bucketed by their top
+    16 bits and read through mmap: a lookup is one hash and a binary search
+    over a handful of keys, with no per-entry memory. The index is rebuilt
+    from the database when it is older than the last change (checked on
+    open) and after import_addresses(). Addresses added in between are
+    also held in a small in-memory set. Like CampaignJournal, add() only
+    queues the entry and batches are written in one transaction.
+
+    Addresses match case-insensitively. A 64-bit hash collision could
+    suppress an unrelated address, with odds around 1 in 10**12 per lookup
+    for a list of ten million.
+    """
+
+    def __init__(self, path=DEFAULT_SUPPRESSION, flush_every=200):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.flush_every = flush_every
+        self._pending = []
+        self._added = set()
+        self._removed = set()
+        self._index = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS suppressed ('
+            ' address TEXT PRIMARY KEY, key INTEGER NOT NULL,'
+            ' reason TEXT NOT NULL, detail TEXT, added REAL NOT NULL) WITHOUT ROWID')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+        self._open_index()
+
+    def _generation(self):
+        return self._db.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def _open_index(self):
+        generation = self._generation()
+        try:
+            index = _Index(self.index_path)
+        except (OSError, ValueError):
+            index = None
+        if index is not None and index.generation != generation:
+            index.close()
+            index = None
+        if index is None:
+            keys = array.array('q', sorted(k for (k,) in self._db.execute(
+                'SELECT key FROM suppressed')))
+            _Index.write(self.index_path, generation, keys)
+            index = _Index(self.index_path)
+        self._index = index
+
+    def rebuild_index(self):
+        """Folds everything added or removed since opening into the index file"""
+        with self._lock:
+            self._flush_locked()
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+            self._open_index()
+            self._added.clear()
+            self._removed.clear()
+
+    def __contains__(self, address):
+        key = address_key(address)
+        if key in self._added:
+            return True
+        if key in self._removed:
+            return False
+        return key in self._index
+
+    def __len__(self):
+        self.flush()
+        return self._db.execute('SELECT COUNT(*) FROM suppressed').fetchone()[0]
+
+    def add(self, address, reason=MANUAL, detail=''):
+        """Suppresses address; written to disk with the next batch"""
+        address = normalize_address(address)
+        key = address_key(address)
+        with self._lock:
+            self._added.add(key)
+            self._removed.discard(key)
+            self._pending.append((address.lower(), key, reason, detail, time.time()))
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+
+    def remove(self, address):
+        """Takes address off the list (e.g. it subscribed again)"""
+        key = address_key(address)
+        with self._lock:
+            self._flush_locked()
+            self._added.discard(key)
+            self._removed.add(key)
+            self._write(['DELETE FROM suppressed WHERE key = ?'], [(key,)])
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._write(['INSERT OR REPLACE INTO suppressed (address, key, reason, detail, added)'
+                     ' VALUES (?, ?, ?, ?, ?)'], batch)
+
+    def _write(self, statements, rows):
+        """Runs statements over rows in one transaction that also bumps the generation"""
+        self._db.execute('BEGIN')
+        try:
+            for statement in statements:
+                self._db.executemany(statement, rows)
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def add_many(self, entries):
+        """Bulk insert of (address, reason, detail) tuples; returns the count written
+
+        Entries go to the database in batches of IMPORT_BATCH rows, one
+        transaction each; call rebuild_index() afterwards (import_addresses
+        does) so that lookups see them without holding them in memory.
+        """
+        now = time.time()
+        written = 0
+        it = iter(entries)
+        with self._lock:
+            self._flush_locked()
+            while True:
+                batch = [(address.lower(), address_key(address), reason, detail or '', now)
+                         for address, reason, detail in itertools.islice(it, IMPORT_BATCH)]
+                if not batch:
+                    break
+                self._write(['INSERT OR REPLACE INTO suppressed (address, key, reason, detail, added)'
+                             ' VALUES (?, ?, ?, ?, ?)'], batch)
+                written += len(batch)
+        return written
+
+    def import_addresses(self, addresses, reason=MANUAL, detail=''):
+        """Suppresses every valid address of an iterable; returns how many were valid
+
+        A Recipient from a CSV file with a "reason" column keeps that reason.
+        """
+        def entries():
+            for value in addresses:
+                address = normalize_address(value)
+                if len(address) <= 254 and EMAIL_RE.fullmatch(address):
+                    fields = getattr(value, 'fields', None) or {}
+                    yield (address, fields.get('reason') or reason,
+                           fields.get('detail') or detail)
+        count = self.add_many(entries())
+        self.rebuild_index()
+        return count
+
+    def import_file(self, path, reason=MANUAL, column=None):
+        """Imports a TXT (one address per line) or CSV file, see RecipientFile"""
+        return self.import_addresses(RecipientFile(path, column=column), reason)
+
+    def export(self, path):
+        """Writes every entry to a CSV file (address, reason, detail, added)"""
+        self.flush()
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('address', 'reason', 'detail', 'added'))
+            for address, reason, detail, added in self._db.execute(
+                    'SELECT address, reason, detail, added FROM suppressed ORDER BY address'):
+                writer.writerow((address, reason, detail,
+                                 time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(added))))
+
+    def counts(self):
+        """{reason: number of entries}"""
+        self.flush()
+        return dict(self._db.execute('SELECT reason, COUNT(*) FROM suppressed GROUP BY reason'))
+
+    def close(self):
+        self.flush()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        self._db.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Manage the suppression list.')
+    parser.add_argument('--file', default=DEFAULT_SUPPRESSION,
+                        help='suppression database (default: %(default)s)')
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+    p = sub.add_parser('import', help='add the addresses of a TXT or CSV file')
+    p.add_argument('path')
+    p.add_argument('--reason', choices=REASONS, default=MANUAL)
+    p.add_argument('--column', help='CSV address column (default: first "mail" column)')
+    p = sub.add_parser('export', help='write every entry to a CSV file')
+    p.add_argument('path')
+    p = sub.add_parser('add', help='suppress single addresses')
+    p.add_argument('addresses', nargs='+')
+    p.add_argument('--reason', choices=REASONS, default=MANUAL)
+    p = sub.add_parser('remove', help='take addresses off the list')
+    p.add_argument('addresses', nargs='+')
+    p = sub.add_parser('check', help='print whether addresses are suppressed')
+    p.add_argument('addresses', nargs='+')
+    sub.add_parser('stats', help='entries per reason')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    suppression = SuppressionList(args.file)
+    try:
+        if args.command == 'import':
+            count = suppression.import_file(args.path, args.reason, args.column)
+            print('imported %d addresses' % count)
+        elif args.command == 'export':
+            suppression.export(args.path)
+        elif args.command == 'add':
+            for address in args.addresses:
+                suppression.add(address, args.reason)
+        elif args.command == 'remove':
+            for address in args.addresses:
+                suppression.remove(address)
+        elif args.command == 'check':
+            found = [address in suppression for address in args.addresses]
+            for address, suppressed in zip(args.addresses, found):
+                print('%s\t%s' % (address, 'suppressed' if suppressed else 'ok'))
+            return 0 if not any(found) else 1
+        else:
+            for reason, count in sorted(suppression.counts().items()):
+                print('%-14s %d' % (reason, count))
+    except (OSError, ValueError) as e:
+        print('mail_suppression: %s' % e, file=sys.stderr)
+        return 2
+    finally:
+        suppression.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
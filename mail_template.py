@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Merge-field templates ({{name}}, {{company|there}}) compiled once per campaign"""
+import html
+import re
+
+FIELD_RE = re.compile(r'\{\{\s*([A-Za-z_][\w.-]*)\s*(?:\|([^}]*))?\}\}')
+
+
+class CompiledTemplate:
+    """A template parsed once into literal segments and field slots
+
+    render() only joins the pre-split literals with the recipient's values,
+    so no regex runs per recipient. "{{field|fallback}}" uses fallback when
+    the value is missing or blank. Values are HTML-escaped unless escape is
+    False (e.g. for the subject line).
+    """
+
+    def __init__(self, text, escape=True):
+        self.text = text
+        self.escape = escape
+        self.literals = []
+        self.fields = []
+        pos = 0
+        for m in FIELD_RE.finditer(text):
+            self.literals.append(text[pos:m.start()])
+            self.fields.append((m.group(1).lower(), (m.group(2) or '').strip()))
+            pos = m.end()
+        self.literals.append(text[pos:])
+
+    @property
+    def is_static(self):
+        """True when the template has no merge fields at all"""
+        return not self.fields
+
+    def field_names(self):
+        return sorted(set(name for name, _ in self.fields))
+
+    def render(self, values):
+        """Fills the fields from values (a dict keyed by lower-case field name)"""
+        literals = self.literals
+        if not self.fields:
+            return literals[0]
+        escape = html.escape if self.escape else str
+        parts = [literals[0]]
+        get = values.get
+        for i, (name, fallback) in enumerate(self.fields):
+            value = get(name) or fallback
+            parts.append(escape(value))
+            parts.append(literals[i + 1])
+        return ''.join(parts)
+
+
+def recipient_values(recipient):
+    """Merge values for one recipient: its CSV columns plus {{email}}"""
+    values = dict(getattr(recipient, 'fields', None) or {})
+    values['email'] = str(recipient)
+    return values
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Per-phase timing of the send loop: cheap histograms plus an optional trace"""
+import json
+import os
+import threading
+import time
+
+# Gönderim döngüsünün ölçülen aşamaları, raporlama sırasıyla
+PHASES = ('compile', 'enqueue', 'render_wait', 'rate_wait', 'session', 'render', 'smtp',
+          'reconnect', 'journal')
+# Histogram kovaları: her ikinin kuvveti dört alt kovaya bölünür (1 us .. ~18 dakika)
+OCTAVES = 31
+BUCKETS = OCTAVES * 4
+MAX_TRACE_EVENTS = 500000
+
+
+def _bucket(us):
+    bits = us.bit_length()
+    if bits < 3:
+        return bits * 4
+    if bits > OCTAVES - 1:
+        return BUCKETS - 1
+    return bits * 4 + ((us >> (bits - 3)) & 3)
+
+
+def _upper_bound(bucket):
+    """Largest microsecond value that falls into bucket"""
+    bits, sub = divmod(bucket, 4)
+    if bits < 3:
+        return (1 << bits) - 1 if bits else 0
+    return ((5 + sub) << (bits - 3)) - 1
+
+
+class _Histogram:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[_bucket(int(seconds * 1e6))] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(self.max, _upper_bound(i) / 1e6)
+        return self.max
+
+
+class PhaseTimings:
+    """Histogram of the time spent in each phase of a campaign
+
+    Recording is a perf_counter() pair and an update of a per-thread
+    histogram, so worker threads never contend on a lock. While enabled is
+    False start() returns None and stop() returns at once; the flag can be
+    flipped at any time during a run. With trace=True every measured span
+    is also kept (up to MAX_TRACE_EVENTS) for write_trace(), which writes
+    Chrome trace JSON (open it in chrome://tracing or ui.perfetto.dev).
+    """
+
+    def __init__(self, enabled=False, trace=False):
+        self.enabled = enabled
+        self.trace = trace
+        self._local = threading.local()
+        self._threads = []
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def start(self):
+        """Returns a start mark for stop(), or None while disabled"""
+        if not self.enabled:
+            return None
+        return time.perf_counter()
+
+    def stop(self, phase, started):
+        if started is None:
+            return
+        now = time.perf_counter()
+        histograms = getattr(self._local, 'histograms', None)
+        if histograms is None:
+            histograms = self._local.histograms = {}
+            with self._lock:
+                self._threads.append(histograms)
+        histogram = histograms.get(phase)
+        if histogram is None:
+            histogram = histograms[phase] = _Histogram()
+        histogram.add(now - started)
+        if self.trace and len(self._events) < MAX_TRACE_EVENTS:
+            # list.append atomiktir, kilit gerekmez
+            self._events.append((phase, started, now - started, threading.get_ident()))
+
+    def histograms(self):
+        """{phase: merged _Histogram} over every thread that recorded something"""
+        merged = {}
+        with self._lock:
+            threads = list(self._threads)
+        for histograms in threads:
+            for phase, histogram in list(histograms.items()):
+                merged.setdefault(phase, _Histogram()).merge(histogram)
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._threads = []
+            self._events = []
+            self._local = threading.local()
+            self._origin = time.perf_counter()
+
+    def summary(self):
+        """One line per phase: calls, total, mean and p50/p99/max in ms"""
+        merged = self.histograms()
+        if not merged:
+            return ''
+        order = [p for p in PHASES if p in merged] + sorted(set(merged) - set(PHASES))
+        lines = ['%-10s %8s %9s %8s %8s %8s %8s'
+                 % ('phase', 'calls', 'total s', 'mean ms', 'p50 ms', 'p99 ms', 'max ms')]
+        for phase in order:
+            h = merged[phase]
+            lines.append('%-10s %8d %9.2f %8.2f %8.2f %8.2f %8.2f'
+                         % (phase, h.count, h.total, h.total / h.count * 1e3,
+                            h.percentile(50) * 1e3, h.percentile(99) * 1e3, h.max * 1e3))
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        return dict((phase, {'calls': h.count, 'total': h.total, 'p50': h.percentile(50),
+                             'p99': h.percentile(99), 'max': h.max})
+                    for phase, h in self.histograms().items())
+
+    def write_trace(self, path):
+        """Writes the recorded spans as Chrome trace JSON"""
+        pid = os.getpid()
+        origin = self._origin
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"traceEvents": [\n')
+            for i, (phase, started, duration, tid) in enumerate(list(self._events)):
+                if i:
+                    f.write(',\n')
+                f.write(json.dumps({'name': phase, 'ph': 'X', 'pid': pid, 'tid': tid,
+                                    'ts': round((started - origin) * 1e6, 1),
+                                    'dur': round(duration * 1e6, 1)}))
+            f.write('\n], "displayTimeUnit": "ms"}\n')
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""DSN ingestion from the fixture mailboxes in tests/fixtures"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from mail_bounces import Bounce, BounceProcessor, mbox_messages, parse_dsn
+from mail_journal import CampaignJournal, BOUNCED, SENT
+from mail_suppression import SuppressionList
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MBOX = os.path.join(FIXTURES, 'bounces.mbox')
+MAILDIR = os.path.join(FIXTURES, 'maildir')
+
+# Fixture kutularındaki kalıcı hatalar (gecikme bildirimi ve otomatik yanıt hariç)
+FAILED = [
+    ('Nobody@example.org', '5.1.1'),
+    ('full@example.com', '5.2.2'),
+    ('gone@example.com', '5.2.1'),
+    ('absent@contoso.example', '5.1.10'),
+]
+HARD = {'nobody@example.org', 'gone@example.com', 'absent@contoso.example'}
+
+
+def failures(processor, path):
+    failed = []
+    processor.on_bounce = failed.append
+    stats = processor.run(path)
+    return stats, sorted((b.recipient, b.status) for b in failed)
+
+
+class ParseDSNTest(unittest.TestCase):
+
+    def test_mbox_messages_split_on_from_lines(self):
+        messages = list(mbox_messages(MBOX))
+        self.assertEqual(len(messages), 4)
+        # ">From" kaçışlı satır ayırıcı sayılmaz
+        self.assertIn(b'>From Monday', messages[1])
+
+    def test_parse_reports(self):
+        postfix, autoreply, multi, exchange = [parse_dsn(m) for m in mbox_messages(MBOX)]
+        self.assertEqual(postfix, [Bounce(
+            'Nobody@example.org', 'failed', '5.1.1',
+            '550 5.1.1 <nobody@example.org>: Recipient address rejected: User unknown')])
+        self.assertIsNone(autoreply)
+        self.assertEqual([(b.recipient, b.action, b.status) for b in multi],
+                         [('full@example.com', 'failed', '5.2.2'),
+                          ('gone@example.com', 'failed', '5.2.1'),
+                          ('slow@example.com', 'delayed', '4.4.7')])
+        # Base64 kodlu delivery-status parçası
+        self.assertEqual([(b.recipient, b.status) for b in exchange],
+                         [('absent@contoso.example', '5.1.10')])
+        self.assertTrue(exchange[0].diagnostic.startswith('550 5.1.10 RESOLVER.ADR'))
+
+    def test_not_a_report(self):
+        self.assertIsNone(parse_dsn(b'Subject: hi\nContent-Type: text/plain\n\nhello\n'))
+        self.assertIsNone(parse_dsn(b'Content-Type: multipart/report\n\nno boundary\n'))
+
+
+class BounceProcessorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_mbox_and_maildir_give_the_same_failures(self):
+        for path in (MBOX, MAILDIR):
+            stats, failed = failures(BounceProcessor(processes=0), path)
+            self.assertEqual(failed, sorted(FAILED), path)
+            self.assertEqual((stats['messages'], stats['dsn'], stats['failed']), (4, 3, 4))
+
+    def test_process_pool_matches_in_process(self):
+        for path in (MBOX, MAILDIR):
+            expected = failures(BounceProcessor(processes=0), path)
+            # Küçük parçalar mesajları birden fazla işçiye böler
+            pooled = failures(BounceProcessor(processes=2, chunk_bytes=512, chunk_files=1),
+                              path)
+            self.assertEqual(pooled, expected, path)
+
+    def test_updates_journal_and_suppression(self):
+        journal = CampaignJournal(os.path.join(self.tmp, 'journal.db'), 'campaign')
+        for recipient in ('nobody@example.org', 'full@example.com', 'slow@example.com',
+                          'absent@contoso.example', 'fine@example.com'):
+            journal.record(recipient, SENT)
+        suppression = SuppressionList(os.path.join(self.tmp, 'suppression.db'))
+        try:
+            stats = BounceProcessor(journal, suppression, processes=0, batch_size=2).run(MBOX)
+            statuses = dict(journal._db.execute('SELECT recipient, status FROM deliveries'))
+            self.assertEqual(statuses, {
+                'nobody@example.org': BOUNCED, 'full@example.com': BOUNCED,
+                'absent@contoso.example': BOUNCED, 'slow@example.com': SENT,
+                'fine@example.com': SENT})
+            self.assertEqual(stats['journal'], 3)
+            self.assertEqual({a for a in HARD if a in suppression}, HARD)
+            self.assertNotIn('full@example.com', suppression)
+            self.assertNotIn('slow@example.com', suppression)
+            self.assertEqual(len(suppression), len(HARD))
+        finally:
+            journal.close()
+            suppression.close()
+        # Geri dönen alıcılar devam ederken yine atlanır
+        journal = CampaignJournal(os.path.join(self.tmp, 'journal.db'), 'campaign')
+        self.assertTrue(journal.is_done('nobody@example.org'))
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
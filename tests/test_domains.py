@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""DomainScheduler caps, driven by a fake clock and by the local SMTP sink"""
+import collections
+import unittest
+
+from mail_core import MailCampaign
+from mail_domains import DomainScheduler, parse_domain_limits, recipient_domain
+from mail_ratelimit import NoRateLimit
+from mail_retry import RetryQueue
+from mail_sink import SMTPSink
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def drain(scheduler):
+    """Takes recipients until the scheduler has nothing ready; returns them"""
+    taken = []
+    while True:
+        recipient, _ = scheduler.take()
+        if recipient is None:
+            return taken
+        taken.append(recipient)
+
+
+class DomainSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def scheduler(self, **kwargs):
+        return DomainScheduler(clock=self.clock, **kwargs)
+
+    def test_concurrency_cap_per_domain(self):
+        scheduler = self.scheduler(concurrency=2)
+        for i in range(5):
+            scheduler.add('u%d@big.example' % i)
+        scheduler.add('a@small.example')
+        taken = drain(scheduler)
+        domains = collections.Counter(recipient_domain(r) for r in taken)
+        self.assertEqual(domains, {'big.example': 2, 'small.example': 1})
+        # Sadece eşzamanlılık sınırı bekletiyorsa gecikme yoktur
+        self.assertEqual(scheduler.take(), (None, None))
+        self.assertEqual(scheduler.snapshot()['big.example'], (2, 3))
+
+        scheduler.release(taken[:1])
+        recipient, _ = scheduler.take()
+        self.assertEqual(recipient_domain(recipient), 'big.example')
+        self.assertEqual(scheduler.take(), (None, None))
+
+    def test_domains_are_interleaved(self):
+        scheduler = self.scheduler(concurrency=10)
+        for i in range(3):
+            scheduler.add('u%d@one.example' % i)
+        for i in range(3):
+            scheduler.add('u%d@two.example' % i)
+        order = [recipient_domain(r) for r in drain(scheduler)]
+        self.assertEqual(order, ['one.example', 'two.example'] * 3)
+
+    def test_rate_cap_per_domain(self):
+        scheduler = self.scheduler(concurrency=2, per_minute=60)
+        for i in range(200):
+            scheduler.add('u%d@big.example' % i)
+        sent = 0
+        # Bir dakika boyunca her gönderim hemen bitirilir: yalnızca hız sınırı kalır
+        for _ in range(600):
+            taken = drain(scheduler)
+            scheduler.release(taken)
+            sent += len(taken)
+            self.clock.advance(0.1)
+        # 60/dk ve 2'lik başlangıç kovası
+        self.assertLessEqual(sent, 62)
+        self.assertGreaterEqual(sent, 60)
+
+        recipient, delay = scheduler.take()
+        if recipient is None:
+            self.assertGreater(delay, 0)
+            self.assertLessEqual(delay, 1.0)
+
+    def test_domain_limits_override_defaults(self):
+        scheduler = self.scheduler(concurrency=3,
+                                   limits=parse_domain_limits('slow.example=1'))
+        for i in range(4):
+            scheduler.add('u%d@slow.example' % i)
+            scheduler.add('u%d@fast.example' % i)
+        domains = collections.Counter(recipient_domain(r) for r in drain(scheduler))
+        self.assertEqual(domains, {'slow.example': 1, 'fast.example': 3})
+        self.assertEqual(scheduler.limit('slow.example'), (1, None))
+
+    def test_throttle_pauses_only_that_domain(self):
+        scheduler = self.scheduler(concurrency=10, backoff=30.0)
+        for i in range(3):
+            scheduler.add('u%d@big.example' % i)
+            scheduler.add('u%d@other.example' % i)
+        scheduler.record_throttle('x@big.example', 451)
+        taken = drain(scheduler)
+        self.assertEqual({recipient_domain(r) for r in taken}, {'other.example'})
+        recipient, delay = scheduler.take()
+        self.assertIsNone(recipient)
+        self.assertAlmostEqual(delay, 30.0)
+
+        self.clock.advance(30.0)
+        self.assertEqual({recipient_domain(r) for r in drain(scheduler)}, {'big.example'})
+
+    def test_permanent_errors_do_not_throttle(self):
+        scheduler = self.scheduler(concurrency=10)
+        scheduler.add('a@big.example')
+        scheduler.record_throttle('x@big.example', 550)
+        self.assertEqual(drain(scheduler), ['a@big.example'])
+
+    def test_parse_domain_limits(self):
+        self.assertEqual(parse_domain_limits('Gmail.com=4/600, outlook.com=2'),
+                         {'gmail.com': (4, 600.0), 'outlook.com': (2, None)})
+        for spec in ('gmail.com', '=4', 'gmail.com=x', 'gmail.com=4/y'):
+            with self.assertRaises(ValueError):
+                parse_domain_limits(spec)
+
+
+class DomainSchedulerSinkTest(unittest.TestCase):
+    """A sink that throttles above 2 transactions per domain sees no throttling"""
+
+    def run_campaign(self, domains):
+        recipients = ['u%d@%s' % (i, 'big.example' if i % 3 else 'd%d.example' % (i % 7))
+                      for i in range(90)]
+        result = {}
+        with SMTPSink(delivery_delay=0.01, domain_concurrency=2) as sink:
+            host, port = sink.address
+            campaign = MailCampaign(
+                'sender@example.com', '', recipients, 'Subject', '<p>Hello</p>',
+                connections=6, host=host, port=port, rate_limiter=NoRateLimit(),
+                retry_queue=RetryQueue(0.01, max_attempts=100), domains=domains,
+                on_finished=lambda sent, failed, errors: result.update(sent=sent, failed=failed),
+                on_error=lambda message: result.update(error=message))
+            campaign.run()
+            return result, sink.stats()
+
+    def test_scheduler_keeps_within_sink_limit(self):
+        result, stats = self.run_campaign(DomainScheduler(2, backoff=0.05))
+        self.assertEqual(result, {'sent': 90, 'failed': 0})
+        self.assertEqual(stats['domain_throttled'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()